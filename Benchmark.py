@@ -0,0 +1,258 @@
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+try:
+    # not on Windows
+    import resource
+except ImportError:
+    resource = None
+
+import VisualManagementArea as vma
+import MediaIndex
+import MediaProbe
+import PlayerSession
+import Daemon
+from ConfigStore import ConfigStore, write_json_atomic
+
+FILES = 10000
+SEED = 1
+MEAN_AGE_DAYS = 90 # ages of the files follow an exponential distribution
+REPEAT = 20 # runs of every select measurement
+BASE_PORT = 16200
+DAEMON_PORT = 18900
+STARTUP_DELAY = 0.3 # seconds the fake player takes to start, about what VLC takes on the wall PC
+
+# category folder attribute of VisualManagementArea: (share of the files, share of them that are PNG)
+TREE = {"SAFETY": (0.3, 0.5), "QUALITY": (0.2, 0.0), "PROJECTS": (0.3, 0.0), "OE": (0.2, 1.0)}
+
+
+def _box(kind, payload) -> bytes:
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+
+def _mp4(seconds=30, width=1920, height=1080) -> bytes:
+    '''
+    Smallest mp4 that passes MediaProbe: ftyp, moov with mvhd and a video tkhd, mdat.
+    '''
+    mvhd = _box(b"mvhd", b"\0\0\0\0" + struct.pack(">IIII", 0, 0, 1000, seconds * 1000) + b"\0" * 80)
+    tkhd = _box(b"tkhd", b"\0\0\0\0" + b"\0" * 72 + struct.pack(">II", width << 16, height << 16))
+    return _box(b"ftyp", b"isom\0\0\0\0isom") + _box(b"moov", mvhd + _box(b"trak", tkhd)) + _box(b"mdat", b"\0" * 64)
+
+
+def _png(width=16, height=9) -> bytes:
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    pixels = b"".join(b"\0" + b"\0\0\0" * width for _ in range(height))
+    return (MediaProbe.PNG_SIGNATURE + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(pixels)) + chunk(b"IEND", b""))
+
+
+def make_tree(root, files=FILES, seed=SEED) -> dict:
+    '''
+    Creates files synthetic media files in the category folders of root. The files are
+    uploaded during working hours, with ages following an exponential distribution of mean
+    MEAN_AGE_DAYS, so a few files are recent and most are old. Returns folder: file count.
+    '''
+    rng = random.Random(seed)
+    now = time.time()
+    mp4, png = _mp4(), _png()
+
+    counts = {}
+    for attribute, (share, png_share) in TREE.items():
+        folder = root + getattr(vma, attribute)
+        os.makedirs(folder, exist_ok=True)
+        count = int(files * share)
+        for i in range(count):
+            is_png = rng.random() < png_share
+            path = os.path.join(folder, f"media_{i:07d}.{'png' if is_png else 'mp4'}")
+            with open(path, "wb") as f:
+                f.write(png if is_png else mp4)
+
+            day = now - rng.expovariate(1 / MEAN_AGE_DAYS) * 86400
+            hour = min(18, max(6, rng.gauss(11, 2.5)))
+            mtime = day - day % 86400 + hour * 3600
+            os.utime(path, (mtime, mtime))
+        counts[folder] = count
+
+    return counts
+
+
+def _reset_indexes() -> None:
+    with MediaIndex.indexes_lock:
+        for index in MediaIndex.indexes.values():
+            index.stop()
+        MediaIndex.indexes.clear()
+    for cache in MediaProbe.caches.values():
+        cache.close()
+    MediaProbe.caches.clear()
+    pass
+
+
+def _timings(samples) -> dict:
+    return {"min": min(samples), "median": statistics.median(samples), "max": max(samples), "runs": len(samples)}
+
+
+def bench_scan(counts) -> dict:
+    '''
+    Builds the index of every category folder from a cold start.
+    '''
+    _reset_indexes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for folder in counts:
+        MediaIndex.get_index(folder)
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": seconds, "files": sum(counts.values()), "index_bytes": current, "peak_bytes": peak}
+
+
+def bench_select(repeat=REPEAT) -> dict:
+    '''
+    Runs every selector once with a cold probe cache, then repeat times with a warm one.
+    '''
+    selectors = Daemon.SELECTORS
+    results = {}
+    for category, selector in selectors.items():
+        start = time.perf_counter()
+        selector(3)
+        cold = time.perf_counter() - start
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            selector(3)
+            samples.append(time.perf_counter() - start)
+        results[category] = {"cold": cold, "warm": _timings(samples)}
+
+    return results
+
+
+def _service(root, base_port, daemon_port) -> Daemon.WallService:
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "options.json")) as f:
+        options = json.load(f)
+
+    options["PLAYER"] = {"BACKEND": "fake", "RC_BASE_PORT": base_port}
+    options["DAEMON"] = {"EMBEDDED": False, "PORT": daemon_port, "RELOAD": False, "SNAPSHOT": ""}
+    for name in ("WATCHDOG", "VARIANTS", "PREFETCH"):
+        options[name] = {"ENABLED": False}
+    options["METRICS"] = {"PLAY_LOG": ""}
+
+    path = os.path.join(root, "benchmark_options.json")
+    write_json_atomic(path, options)
+    return Daemon.WallService(ConfigStore(path))
+
+
+def bench_wall(root, base_port=BASE_PORT, daemon_port=DAEMON_PORT) -> dict:
+    '''
+    Restarts the wall on fake players, refreshes it without and with a changed file and turns
+    it off.
+    '''
+    service = _service(root, base_port, daemon_port)
+    results = {}
+    try:
+        start = time.perf_counter()
+        service.list_files()
+        results["list_files"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        launched = service.restart(force=True)
+        results["restart"] = {"seconds": time.perf_counter() - start, "displays": len(launched),
+                              "launch": _timings([result["latency"] for result in launched])}
+
+        start = time.perf_counter()
+        launched = service.refresh()
+        results["refresh_unchanged"] = {"seconds": time.perf_counter() - start, "displays": len(launched)}
+
+        # a new QA file, only the QA displays are relaunched
+        folder = root + vma.QUALITY
+        path = os.path.join(folder, "media_new.mp4")
+        with open(path, "wb") as f:
+            f.write(_mp4())
+        MediaIndex.get_index(folder).update(path)
+
+        start = time.perf_counter()
+        launched = service.refresh()
+        results["refresh_changed"] = {"seconds": time.perf_counter() - start, "displays": len(launched)}
+
+        off = service.turn_off()
+        results["shutdown"] = {"seconds": off["seconds"], "displays": len(off["stopped"])}
+    finally:
+        service.sessions.stop_all()
+        service.config.flush()
+
+    return results
+
+
+def _version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(files=FILES, root=None, seed=SEED, startup_delay=STARTUP_DELAY, repeat=REPEAT, keep=False) -> dict:
+    '''
+    Runs every benchmark on a synthetic tree of files media files and returns the results.
+    The tree is created in root, or in a temporary folder that is removed afterwards.
+    '''
+    created = root is None
+    root = root or tempfile.mkdtemp(prefix="vma-benchmark-")
+    root = os.path.join(root, "")
+
+    previous_root, previous_delay = vma.ROOT, PlayerSession.FAKE_STARTUP_DELAY
+    vma.ROOT, PlayerSession.FAKE_STARTUP_DELAY = root, startup_delay
+    try:
+        start = time.perf_counter()
+        counts = make_tree(root, files, seed)
+        results = {"version": _version(), "python": platform.python_version(), "platform": platform.platform(),
+                   "files": sum(counts.values()), "seed": seed, "startup_delay": startup_delay,
+                   "generate_seconds": time.perf_counter() - start}
+
+        results["scan"] = bench_scan(counts)
+        results["select"] = bench_select(repeat)
+        results["wall"] = bench_wall(root)
+        if resource is not None:
+            results["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    finally:
+        _reset_indexes()
+        vma.ROOT, PlayerSession.FAKE_STARTUP_DELAY = previous_root, previous_delay
+        if created and not keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return results
+
+
+def main(argv) -> None:
+    '''
+    python Benchmark.py [--files=10000] [--root=DIR] [--seed=1] [--startup-delay=0.3]
+                        [--repeat=20] [--output=benchmark.json] [--keep]
+    '''
+    options = dict(arg[2:].partition("=")[::2] for arg in argv if arg.startswith("--"))
+    results = run(int(options.get("files") or FILES), options.get("root") or None, int(options.get("seed") or SEED),
+                  float(options.get("startup-delay") or STARTUP_DELAY), int(options.get("repeat") or REPEAT),
+                  "keep" in options)
+
+    output = options.get("output") or "benchmark.json"
+    write_json_atomic(output, results)
+    print(json.dumps(results, indent=4))
+    print(f"written to {output}")
+    pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,132 @@
+import glob
+import hashlib
+import os
+
+from PlayerSession import Geometry
+
+try:
+    # optional: without it every display plays its own image
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+FOLDER_NAME = ".vma_composites"
+WIDTH, HEIGHT = 1920, 1080
+COMPRESS_LEVEL = 1 # the composite is written once and read once by the player, speed over size
+
+
+def grid(slots) -> dict:
+    '''
+    Returns key: (row, column) of the slots relative to their top left tile. Raises ValueError
+    if their tiles do not fill a rectangle of the layout, as one window cannot cover them then.
+    '''
+    top = min(slot.row for slot in slots)
+    left = min(slot.column for slot in slots)
+    cells = {slot.key: (slot.row - top, slot.column - left) for slot in slots}
+
+    rows = max(row for row, column in cells.values()) + 1
+    columns = max(column for row, column in cells.values()) + 1
+    if len(set(cells.values())) != len(cells) or len(cells) != rows*columns:
+        raise ValueError(f"displays {', '.join(cells)} do not fill a rectangle of the layout")
+
+    return cells
+
+
+def _stamp(path):
+    if not path:
+        return None
+    stat = os.stat(path)
+    return (path, stat.st_size, stat.st_mtime)
+
+
+class WallCompositor():
+    '''
+    Tiles the still images of the displays of one category into one canvas laid out like
+    their tiles, so a single player window spanning their screens shows all of them. The
+    canvas and the rendered tiles are kept between two compositions: only the cells whose
+    file changed are pasted again, and only files that were not on the canvas are decoded, so
+    images moving one display down are not. A composition where no cell changed returns the
+    same file, which the wall controller then does not reload.
+
+    Needs Pillow, check Image before creating one.
+
+        - folder (str): folder of the composites
+        - name (str): prefix of the composite files, unique per wall and category
+        - slots (list): Layout.Slot of the displays, see grid()
+        - x, y (int): desktop position of the screen of the top left display
+        - width, height (int): resolution of one screen
+    '''
+    def __init__(self, folder, name, slots, x=0, y=0, width=WIDTH, height=HEIGHT) -> None:
+        self.folder = folder
+        self.name = name
+        self.cells = grid(slots)
+        self.width = width
+        self.height = height
+
+        rows = max(row for row, column in self.cells.values()) + 1
+        columns = max(column for row, column in self.cells.values()) + 1
+        self.geometry = Geometry(x, y, columns*width, rows*height)
+
+        self.path = "" # last composite
+        self._canvas = None
+        self._stamps = {} # key: (path, size, mtime) of the image pasted in its cell
+        self._tiles = {} # (path, size, mtime): rendered tile of the images on the canvas
+        pass
+
+    def owns(self, file) -> bool:
+        return isinstance(file, str) and os.path.dirname(file) == self.folder and os.path.basename(file).startswith(self.name + "-")
+
+    def compose(self, files) -> str:
+        '''
+        Returns the composite of files, key: image file ("" for a black tile), writing it if
+        a tile changed. Raises OSError if an image cannot be read.
+        '''
+        stamps = {key: _stamp(files.get(key, "")) for key in self.cells}
+        if self.path and stamps == self._stamps and os.path.exists(self.path):
+            return self.path
+
+        if self._canvas is None:
+            self._canvas = Image.new("RGB", self.geometry[2:])
+            self._stamps = dict.fromkeys(self.cells)
+        tiles = {stamp: self._tiles[stamp] for stamp in stamps.values() if stamp in self._tiles}
+        for key, stamp in stamps.items():
+            if self._stamps[key] == stamp:
+                continue
+            if stamp is None:
+                tile = Image.new("RGB", (self.width, self.height))
+            elif stamp in tiles:
+                tile = tiles[stamp]
+            else:
+                with Image.open(stamp[0]) as image:
+                    # scales to cover the screen and crops the overflow, like the variants
+                    tile = tiles[stamp] = ImageOps.fit(image.convert("RGB"), (self.width, self.height), Image.LANCZOS)
+            row, column = self.cells[key]
+            self._canvas.paste(tile, (column*self.width, row*self.height))
+            self._stamps[key] = stamp
+        self._tiles = tiles
+
+        digest = hashlib.sha1(repr(sorted(stamps.items())).encode()).hexdigest()[:16]
+        path = os.path.join(self.folder, f"{self.name}-{digest}.png")
+        if not os.path.exists(path):
+            os.makedirs(self.folder, exist_ok=True)
+            temp = os.path.join(self.folder, f".{self.name}-{digest}.png")
+            try:
+                self._canvas.save(temp, "PNG", compress_level=COMPRESS_LEVEL)
+                os.replace(temp, path)
+            except BaseException:
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+                raise
+
+        # the previous composite stays until the player has loaded the new one
+        for old in glob.glob(os.path.join(glob.escape(self.folder), glob.escape(self.name) + "-*.png")):
+            if old not in (path, self.path):
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+        self.path = path
+        return path
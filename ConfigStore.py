@@ -0,0 +1,164 @@
+import atexit
+import os
+import tempfile
+import threading
+from json import load, dump
+
+WRITE_DELAY = 2.0 # seconds of quiet before the pending changes are written
+
+
+def write_json_atomic(path, data) -> None:
+    '''
+    Writes data as indented JSON to a temporary file next to path and renames it over path,
+    so the file is either the old or the new version and never a truncated one.
+    '''
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    pass
+
+
+class ConfigStore():
+    '''
+    Holds the options of options.json in memory and writes them back behind the callers. Changes
+    made through set() mark their top level key as dirty and (re)start a timer, so every change
+    made within write_delay seconds of each other ends up in a single write. The write is
+    atomic (see write_json_atomic) and pending changes are flushed when the program exits.
+
+    stamp is the (mtime, size) of the file as last read or written by the store, so an edit
+    made by someone else can be told apart from the store's own writes (see HotReload).
+
+        - path (str): path of the JSON file
+        - write_delay (float): seconds to wait for more changes before writing
+    '''
+    def __init__(self, path, write_delay=WRITE_DELAY) -> None:
+        self.path = path
+        self.write_delay = write_delay
+
+        self.stamp, self.options = self.read()
+
+        self.dirty = set()
+        self._pending = {} # keys: value of the changes made since the last write
+        self.writes = 0
+        self._lock = threading.RLock()
+        self._timer = None
+
+        atexit.register(self.flush)
+        pass
+
+    def file_stamp(self):
+        '''
+        Returns the (mtime, size) of the file, or None if it cannot be read.
+        '''
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def read(self) -> tuple:
+        '''
+        Reads the file as it is on disk now. Returns (stamp, options), raises OSError or
+        ValueError if it cannot be read or parsed.
+        '''
+        stamp = self.file_stamp()
+        with open(self.path, 'r') as options_file:
+            return stamp, load(options_file)
+
+    def replace(self, options, stamp) -> None:
+        '''
+        Replaces the options in memory with options read from the file with stamp, keeping the
+        changes that were made but not written yet. The options dictionary is updated in place,
+        so references to it stay valid.
+        '''
+        with self._lock:
+            self.options.clear()
+            self.options.update(options)
+            for keys, value in self._pending.items():
+                self._assign(keys, value)
+            self.stamp = stamp
+        pass
+
+    def __getitem__(self, key):
+        return self.options[key]
+
+    def get(self, key, default=None):
+        return self.options.get(key, default)
+
+    def lookup(self, keys, default=None):
+        '''
+        Returns a nested option, e.g. lookup(("DISPLAY_LAYOUT", "hss", "7", "last_file")), or
+        default if any of the keys is missing.
+        '''
+        node = self.options
+        for key in keys:
+            if not isinstance(node, dict) or key not in node:
+                return default
+            node = node[key]
+
+        return node
+
+    def set(self, keys, value) -> bool:
+        '''
+        Sets a nested option, e.g. set(("DISPLAY_LAYOUT", "hss", "7", "last_file"), file).
+        Missing intermediate dictionaries are created. Returns True if the value changed, a
+        value that did not change does not cause a write.
+        '''
+        with self._lock:
+            if not self._assign(keys, value):
+                return False
+
+            self._pending[tuple(keys)] = value
+            self.dirty.add(keys[0])
+            self._schedule()
+
+        return True
+
+    def _assign(self, keys, value) -> bool:
+        node = self.options
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+
+        if keys[-1] in node and node[keys[-1]] == value:
+            return False
+
+        node[keys[-1]] = value
+        return True
+
+    def _schedule(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.write_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+        pass
+
+    def flush(self) -> None:
+        '''
+        Writes the pending changes now, if there are any.
+        '''
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+            if not self.dirty:
+                return
+
+            write_json_atomic(self.path, self.options)
+            self.stamp = self.file_stamp()
+            self.dirty.clear()
+            self._pending.clear()
+            self.writes += 1
+        pass
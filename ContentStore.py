@@ -0,0 +1,172 @@
+import glob
+import hashlib
+import os
+import shutil
+import stat
+import threading
+
+FOLDER_NAME = ".vma_store"
+HASH_CHUNK = 1024*1024
+TEMP_SUFFIX = ".vma-part" # does not match any media pattern, so a half written file is never selected
+READ_ONLY = ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _make_writable(path) -> None:
+    '''
+    Clears the read-only flag of path if it has one: Windows neither replaces nor removes a
+    read-only file.
+    '''
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not mode & stat.S_IWUSR:
+        os.chmod(path, stat.S_IMODE(mode) | stat.S_IWUSR)
+    pass
+
+
+class ContentStore():
+    '''
+    Keeps one blob per unique media content in a hidden folder of the media root, named by
+    its sha256 and mtime, and puts the files of the category folders there as hard links of
+    the blobs. A clip dropped into several categories is then written and stored once, and the
+    players, the prefetcher and the OS file cache share that copy, since a hard link is the
+    same file. The links are ordinary files to the media indexes and the selectors.
+
+    A hard link shares the metadata of its blob, and the selectors order the files by mtime,
+    so only copies with the same mtime, as Explorer and xcopy make, share a blob. A copy saved
+    again later gets a blob of its own and keeps its place in the selection.
+
+    Editing one link in place would change every category file of that content, so the blobs
+    are read-only. A file is updated by syncing a new version, which gets its own blob and
+    link; collect() then removes the blobs no file links to.
+
+    The root must be on one volume that supports hard links (NTFS does). Where it does not,
+    the store is disabled and the files are copied as without it.
+
+        - root (str): media root, usually VisualManagementArea.ROOT
+    '''
+    def __init__(self, root) -> None:
+        self.folder = os.path.join(root, FOLDER_NAME)
+        self.enabled = self._can_link()
+        if not self.enabled:
+            print(f"content store {self.folder} disabled: the media root does not support hard links")
+        pass
+
+    def _can_link(self) -> bool:
+        probe = os.path.join(self.folder, f".link-{os.getpid()}-{threading.get_ident()}{TEMP_SUFFIX}")
+        link = probe + TEMP_SUFFIX
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(probe, 'wb'):
+                pass
+            os.link(probe, link)
+            return os.stat(probe).st_nlink == 2
+        except OSError:
+            return False
+        finally:
+            for path in (link, probe):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def blob(self, digest, mtime) -> str:
+        '''
+        Returns the path of the blob of the content with sha256 digest and mtime (ns).
+        '''
+        return os.path.join(self.folder, digest[:2], f"{digest}-{mtime}")
+
+    def _write_blob(self, source) -> tuple:
+        '''
+        Copies source into the store, hashing it on the way so it is read once. Returns
+        (digest, blob, bytes written), 0 bytes if the store already had the content with the
+        mtime of source.
+        '''
+        os.makedirs(self.folder, exist_ok=True)
+        temp = os.path.join(self.folder, f".{os.getpid()}-{threading.get_ident()}{TEMP_SUFFIX}")
+        digest = hashlib.sha256()
+        try:
+            with open(source, 'rb') as f, open(temp, 'wb') as out:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                    digest.update(chunk)
+                    out.write(chunk)
+            shutil.copystat(source, temp)
+            status = os.stat(temp)
+            os.chmod(temp, stat.S_IMODE(status.st_mode) & READ_ONLY)
+
+            # the mtime the copy got, which may be coarser than the one of source
+            blob = self.blob(digest.hexdigest(), status.st_mtime_ns)
+            if os.path.exists(blob):
+                _make_writable(temp)
+                os.remove(temp)
+                return digest.hexdigest(), blob, 0
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(temp, blob)
+        except BaseException:
+            try:
+                _make_writable(temp)
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+
+        return digest.hexdigest(), blob, os.path.getsize(blob)
+
+    def put(self, source, path, digest=None) -> tuple:
+        '''
+        Stores the content of source and puts it at path as a hard link of its blob, replacing
+        the file there at once. path gets the mtime of source.
+            - digest (str): sha256 of source if it is already known, the content is not read
+              from source then if the store has it with the same mtime
+
+        Returns (digest, bytes written to the store), 0 bytes for a content and mtime it
+        already had. Raises OSError if the link cannot be made, the file is not copied instead.
+        '''
+        written = 0
+        blob = digest and self.blob(digest, os.stat(source).st_mtime_ns)
+        if not blob or not os.path.exists(blob):
+            digest, blob, written = self._write_blob(source)
+
+        try:
+            if os.path.samefile(blob, path):
+                return digest, written
+        except OSError:
+            pass
+
+        folder, name = os.path.split(path)
+        os.makedirs(folder, exist_ok=True)
+        temp = os.path.join(folder, "." + name + TEMP_SUFFIX)
+        try:
+            os.link(blob, temp)
+            # the old version is read-only if it is a link of the store, collect() protects it again
+            _make_writable(path)
+            os.replace(temp, path)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+
+        return digest, written
+
+    def collect(self) -> int:
+        '''
+        Removes the blobs no category file links to any more, e.g. after their files were
+        replaced, and makes the others read-only again. Returns the number of bytes freed.
+        '''
+        freed = 0
+        for blob in glob.glob(os.path.join(glob.escape(self.folder), "*", "*")):
+            try:
+                status = os.stat(blob)
+                if status.st_nlink <= 1:
+                    _make_writable(blob)
+                    os.remove(blob)
+                    freed += status.st_size
+                elif status.st_mode & stat.S_IWUSR:
+                    os.chmod(blob, stat.S_IMODE(status.st_mode) & READ_ONLY)
+            except OSError:
+                continue
+
+        return freed
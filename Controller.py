@@ -0,0 +1,106 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import Launcher
+
+
+def diff(playing, selection) -> tuple:
+    '''
+    Compares the files playing on the displays with a new selection.
+        - playing (dict): display key: file that is playing on it
+        - selection (dict): display key: file that should play on it. An empty file means the
+          display should be off.
+
+    Returns (launch, stop): a dict of display key: file for the displays that need a new file
+    and a list of the display keys that need to be stopped. Displays that already play their
+    selected file are in neither.
+    '''
+    launch = {key: file for key, file in selection.items() if file and playing.get(key) != file}
+    stop = [key for key, file in selection.items() if not file and key in playing]
+
+    return launch, stop
+
+
+class WallController():
+    '''
+    Remembers which file plays on each display key and turns a new selection into launch and
+    stop commands for the displays that changed only, so a refresh that selects the same files
+    does no process work at all.
+    '''
+    def __init__(self) -> None:
+        self.playing = {}
+        self._lock = threading.Lock()
+        pass
+
+    def refresh(self, selection, start, stop=None, force=False,
+                max_concurrent=Launcher.MAX_CONCURRENT, stagger=Launcher.STAGGER) -> list:
+        '''
+        Applies selection to the wall.
+            - selection (dict): display key: file, see diff()
+            - start: callable(key) that starts the selected file on the display and returns True
+              if it plays
+            - stop: callable(key) that stops the display. Displays are only forgotten if None.
+            - force (bool): launches every selected display, even the ones that did not change
+
+        Returns the Launcher.LaunchResult list of the displays that were launched.
+        '''
+        with self._lock:
+            launch, stopped = self._changes(selection, force)
+
+            if stop and stopped:
+                # in parallel, so turning off a category takes the time of its slowest player
+                with ThreadPoolExecutor(max_workers=len(stopped)) as executor:
+                    list(executor.map(stop, stopped))
+            for key in stopped:
+                del self.playing[key]
+
+            results = Launcher.launch_all([(key, partial(start, key)) for key in launch],
+                                          max_concurrent=max_concurrent, stagger=stagger)
+            self._record(launch, results)
+
+        return results
+
+    def refresh_batch(self, selection, send, force=False) -> list:
+        '''
+        Like refresh(), but hands every change to send(launch, stopped) at once, e.g. to send
+        it to a fleet agent in one message. send returns the Launcher.LaunchResult list of the
+        displays of launch. It is called even if no display changed, so the other end can
+        tell it lost what was playing.
+        '''
+        with self._lock:
+            launch, stopped = self._changes(selection, force)
+            results = send(launch, stopped)
+            for key in stopped:
+                del self.playing[key]
+            self._record(launch, results)
+
+        return results
+
+    def _changes(self, selection, force) -> tuple:
+        if force:
+            launch = {key: file for key, file in selection.items() if file}
+            stopped = [key for key, file in selection.items() if not file and key in self.playing]
+            return launch, stopped
+        return diff(self.playing, selection)
+
+    def _record(self, launch, results) -> None:
+        for result in results:
+            if result.launched:
+                self.playing[result.key] = launch[result.key]
+            else:
+                self.playing.pop(result.key, None)
+        pass
+
+    def forget(self, keys=None) -> None:
+        '''
+        Marks the displays (all of them if keys is None) as not playing, e.g. after turning
+        the wall off.
+        '''
+        with self._lock:
+            if keys is None:
+                self.playing.clear()
+            else:
+                for key in keys:
+                    self.playing.pop(key, None)
+        pass
@@ -0,0 +1,1061 @@
+import asyncio
+import hmac
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from functools import partial
+from urllib import request as urlrequest
+from urllib.error import HTTPError
+
+import VisualManagementArea as vma
+import Launcher
+import Controller
+import Scheduler
+import PlayerSession
+import HotReload
+import Watchdog
+import MediaProbe
+import Prefetch
+import Playlists
+import MediaIndex
+import Metrics
+import Snapshot
+from Metrics import metrics
+from ConfigStore import ConfigStore
+from Layout import compile_layout
+
+HSS = "hss"
+OPEX = "opex"
+QA = "qa"
+PROJ = "proj"
+
+SELECTORS = {HSS: vma.safety_files, OPEX: vma.oe_files, QA: vma.quality_files, PROJ: vma.projects_files}
+
+HOST = "127.0.0.1"
+PORT = 8765
+CLIENT_TIMEOUT = 120 # seconds, a restart or a sync can take a while
+PLAYLIST_DELAY = 2 # seconds of quiet in the media folders before the playlists are rebuilt
+
+TEXT_ROUTES = {"/metrics"} # answered as text/plain instead of JSON
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "[::1]") # Host headers of a request made on this PC
+
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 409: "Conflict",
+           415: "Unsupported Media Type", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    '''
+    Error of an API request, answered with its HTTP status. Any other exception of an
+    operation is a 500.
+    '''
+    status = 400
+
+
+class BadRequest(RequestError):
+    status = 400
+
+
+class Forbidden(RequestError):
+    status = 403
+
+
+class NotFound(RequestError):
+    status = 404
+
+
+class Conflict(RequestError):
+    status = 409
+
+
+class UnsupportedMediaType(RequestError):
+    status = 415
+
+
+def agent_token(options) -> str:
+    '''
+    Returns the token of the agent of a wall: AGENT.TOKEN, or the FLEET.TOKEN shared by the
+    agents of the options file.
+    '''
+    return options.get("AGENT", {}).get("TOKEN") or options.get("FLEET", {}).get("TOKEN", "")
+
+
+def _head(file) -> str:
+    '''
+    Returns the file, or the first file of a Playlist.
+    '''
+    if isinstance(file, Playlists.Playlist):
+        return file[0].path if file else ""
+    return file
+
+
+class WallService():
+    '''
+    Headless controller of one wall. It owns the layout, the file selection of every display,
+    the on/off scheduler and the players, and serves them on a local HTTP API:
+
+        GET  /status                                    layout, modes, files and playing state
+        GET  /metrics                                   timings and counters, Prometheus text format
+        POST /files                                     selects the newest files of the auto categories
+        POST /refresh                                   /files, then launches the changed displays
+        POST /restart   {"force": true}                 launches the displays, all of them with force
+        POST /off       {"category": "hss"}             turns the wall or one category off
+        POST /set-file  {"key": "7", "file": "..."}     sets the file of a display in manual mode
+        POST /mode      {"category": "hss", "mode": "manual"}
+        POST /auto      {"enabled": false}              starts or cancels the on/off scheduler
+        POST /sync                                      syncs the media folders
+
+    Requests and responses are JSON. The operations are plain methods that can be called from
+    any thread, they are serialised by a lock, and the HTTP handlers run them in the default
+    executor so the event loop keeps serving /status while the wall restarts. They raise a
+    RequestError for an unknown display or category (404), bad arguments (400) or a request
+    the state of the wall does not allow (409); anything else is answered with a 500.
+
+    A POST must have the Content-Type application/json, which a web page cannot send to
+    another site without its consent (415). Without DAEMON.TOKEN only requests to localhost,
+    127.0.0.1 or DAEMON.HOST are answered, so a web page cannot reach the API by pointing a
+    name of its own at this PC (403). With DAEMON.TOKEN every request must carry it as
+    "Authorization: Bearer <token>" instead, which a service listening on the network needs.
+
+        - config (ConfigStore): options file of the wall
+        - wall (str): name of the wall in the options file, the first wall if None
+    '''
+    def __init__(self, config, wall=None) -> None:
+        self.config = config
+        self.wall = compile_layout(config.options).wall(wall)
+        self.options = self.wall.options
+
+        daemon_options = self.options.get("DAEMON", {})
+        self.host = daemon_options.get("HOST", HOST)
+        self.port = daemon_options.get("PORT", PORT)
+        self.token = daemon_options.get("TOKEN", "")
+
+        # the players of a wall with an AGENT run on the PC of that agent
+        agent_options = self.options.get("AGENT")
+        self.agent = None
+        if agent_options:
+            import Fleet
+            self.agent = Fleet.AgentClient(agent_options.get("HOST", Fleet.AGENT_HOST), agent_options.get("PORT", Fleet.AGENT_PORT),
+                                           agent_token(self.options))
+
+        player_options = self.options.get("PLAYER", {})
+        self.backend = "agent" if self.agent else player_options.get("BACKEND", "batch")
+        self.sessions = PlayerSession.SessionManager(self.backend, player_options.get("RC_BASE_PORT", PlayerSession.RC_BASE_PORT))
+
+        unknown = set(self.wall.by_category) - set(SELECTORS)
+        if unknown:
+            raise ValueError(f"unknown categories {', '.join(sorted(unknown))} in wall {self.wall.name}")
+
+        # category: [display key, ...] and display key: Qt screen number
+        self.layout = {category: self.wall.keys(category) for category in self.wall.by_category}
+        self.displays = {slot.key: slot.display for slot in self.wall.slots}
+
+        self.modes = {category: "auto" for category in self.layout}
+        self.files = {key: "" for key in self.displays}
+        self.playlists = {} # key: Playlists.Playlist of the displays of the PLAYLISTS categories
+        self.screens_on = False
+
+        self.controller = Controller.WallController()
+        prefetch_options = self.options.get("PREFETCH", {})
+        self.prefetcher = None
+        if prefetch_options.get("ENABLED", True) and not self.agent:
+            self.prefetcher = Prefetch.Prefetcher(prefetch_options.get("RATE_MB", Prefetch.RATE // 1024**2) * 1024**2)
+
+        schedule = Scheduler.Schedule(self.options["AUTO"], list(self.layout))
+        self.scheduler = Scheduler.OnOffScheduler(schedule, self.apply_schedule, self.prepare_schedule,
+                                                  prefetch_options.get("LEAD_MINUTES", 10) * 60)
+
+        watchdog_options = self.options.get("WATCHDOG", {})
+        self.watchdog = Watchdog.Watchdog(self.sessions, lambda: list(self.controller.playing), self._respawn, self.wall.name,
+                                          interval=watchdog_options.get("INTERVAL", Watchdog.INTERVAL),
+                                          stall_timeout=watchdog_options.get("STALL_TIMEOUT", Watchdog.STALL_TIMEOUT),
+                                          backoff=watchdog_options.get("BACKOFF", Watchdog.BACKOFF),
+                                          max_backoff=watchdog_options.get("MAX_BACKOFF", Watchdog.MAX_BACKOFF),
+                                          crash_limit=watchdog_options.get("CRASH_LIMIT", Watchdog.CRASH_LIMIT),
+                                          crash_window=watchdog_options.get("CRASH_WINDOW", Watchdog.CRASH_WINDOW))
+
+        variant_options = self.options.get("VARIANTS", {})
+        self.variants = None
+        if variant_options.get("ENABLED", True) and not self.agent:
+            import MediaVariants
+            self.variants = MediaVariants.VariantCache(os.path.join(vma.ROOT, MediaVariants.FOLDER_NAME),
+                                                       MediaProbe.get_cache(vma.ROOT),
+                                                       variant_options.get("WIDTH", MediaVariants.WIDTH),
+                                                       variant_options.get("HEIGHT", MediaVariants.HEIGHT),
+                                                       variant_options.get("MAX_MB", MediaVariants.MAX_BYTES // 1024**2) * 1024**2,
+                                                       variant_options.get("FFMPEG") or None,
+                                                       self._playing_variants)
+
+        self.compositors = self._compositors()
+
+        metrics_options = self.options.get("METRICS", {})
+        self.play_log = None
+        if metrics_options.get("PLAY_LOG", "proof_of_play.log"):
+            # relative to the options file
+            self.play_log = Metrics.PlayLog(os.path.join(os.path.dirname(os.path.abspath(config.path)),
+                                                         metrics_options.get("PLAY_LOG", "proof_of_play.log")),
+                                            metrics_options.get("PLAY_LOG_MB", Metrics.PLAY_LOG_BYTES // 1024**2) * 1024**2,
+                                            metrics_options.get("PLAY_LOG_BACKUPS", Metrics.PLAY_LOG_BACKUPS))
+
+        # what the wall shows, relaunched at start before the folders are scanned
+        self.snapshot = None
+        if daemon_options.get("SNAPSHOT", Snapshot.FILE_NAME):
+            self.snapshot = Snapshot.WallSnapshot(Snapshot.snapshot_path(config.path, daemon_options.get("SNAPSHOT", Snapshot.FILE_NAME),
+                                                                         self.wall.name))
+
+        self._lock = threading.RLock()
+        self._server = None
+        self._rebuild = None
+        pass
+
+    # operations
+
+    def status(self) -> dict:
+        health = self._agent_health() if self.agent else self.watchdog.status()
+        return {"wall": self.wall.name,
+                "modes": dict(self.modes),
+                "auto": self.scheduler.is_running(),
+                "screens_on": self.screens_on,
+                "displays": [{"key": slot.key, "category": slot.category, "display": slot.display,
+                              "row": slot.row, "column": slot.column,
+                              "file": self.files[slot.key], "playing": _head(self.controller.playing.get(slot.key, "")),
+                              "playlist": self.playlists[slot.key].paths() if slot.key in self.playlists else [],
+                              "health": health.get(slot.key)}
+                             for slot in self.wall.slots]}
+
+    def _playlist_options(self, category):
+        '''
+        Returns the PLAYLISTS options of the category, or None if its displays show a single
+        file.
+        '''
+        options = self.options.get("PLAYLISTS", {}).get(category)
+        if not options or options.get("POLICY", Playlists.SINGLE) == Playlists.SINGLE:
+            return None
+        return options
+
+    def _compositors(self) -> dict:
+        '''
+        Returns category: Compositor.WallCompositor of the COMPOSITOR categories, whose still
+        images are shown by one player window spanning their screens. Needs Pillow and a
+        player backend this service starts. A category whose displays do not fill a rectangle
+        of the layout keeps a player per display.
+        '''
+        compositor_options = self.options.get("COMPOSITOR", {})
+        if not compositor_options or self.backend in ("batch", "agent"):
+            return {}
+        import Compositor
+        if Compositor.Image is None:
+            return {}
+
+        compositors = {}
+        for category, entry in compositor_options.items():
+            if category not in self.layout:
+                continue
+            try:
+                compositors[category] = Compositor.WallCompositor(
+                    os.path.join(vma.ROOT, Compositor.FOLDER_NAME), f"{self.wall.name}-{category}",
+                    self.wall.by_category[category], entry.get("X", 0), entry.get("Y", 0),
+                    entry.get("WIDTH", Compositor.WIDTH), entry.get("HEIGHT", Compositor.HEIGHT))
+            except ValueError as e:
+                print(f"wall {self.wall.name}: {category} is played one display at a time, {e}")
+        return compositors
+
+    def _composite(self, selection) -> None:
+        '''
+        Replaces the images of the displays of the COMPOSITOR categories in selection by their
+        composite, played on the first display of the category while the others are stopped.
+        A category showing a video, a playlist or an image that cannot be read is played one
+        display at a time.
+        '''
+        for category, compositor in self.compositors.items():
+            keys = self.layout[category]
+            files = [selection.get(key) for key in keys]
+            if None in files or not any(files):
+                # not refreshed, or off
+                continue
+            if not all(isinstance(file, str) and (not file or Playlists.is_image(file)) for file in files):
+                continue
+
+            try:
+                composite = compositor.compose(dict(zip(keys, files)))
+            except OSError as e:
+                print(f"{category} not composited: {e}")
+                continue
+            selection.update(dict.fromkeys(keys, ""))
+            selection[keys[0]] = composite
+        pass
+
+    def _display(self, key, file):
+        '''
+        Returns the Qt screen number of the display, or the PlayerSession.Geometry of the
+        window spanning the screens of its category if file is their composite.
+        '''
+        compositor = self.compositors.get(self.wall.by_key[key].category)
+        if compositor and compositor.owns(file):
+            return compositor.geometry
+        return self.displays[key]
+
+    def _save_snapshot(self) -> None:
+        if not self.snapshot:
+            return
+        with self._lock:
+            on = {self.wall.by_key[key].category for key in self.controller.playing if key in self.wall.by_key}
+            self.snapshot.save({"screens_on": self.screens_on, "on": sorted(on), "auto": self.scheduler.is_running(),
+                                "modes": dict(self.modes), "files": dict(self.files),
+                                "playlists": {key: Snapshot.encode(playlist) for key, playlist in self.playlists.items()}})
+        pass
+
+    def resume(self, state, auto=True) -> list:
+        '''
+        Relaunches what the wall showed when the snapshot state was written, without scanning
+        any folder, so the screens light up right after a power cut or a reboot. Files that are
+        gone are left out and the modes are restored; the selection is reconciled with a fresh
+        scan afterwards by the scheduler or a refresh. With auto, the categories the schedule
+        has off now stay off. Returns the launch results like restart().
+        '''
+        if not state.get("screens_on"):
+            return []
+
+        with self._lock:
+            for category, mode in state.get("modes", {}).items():
+                if category in self.modes and mode in ("auto", "manual"):
+                    self.modes[category] = mode
+            for key, file in state.get("files", {}).items():
+                if key in self.files and file and os.path.exists(file):
+                    self.files[key] = file
+            for key, items in state.get("playlists", {}).items():
+                playlist = Snapshot.decode(items)
+                if key in self.files and playlist:
+                    self.playlists[key] = playlist
+                    self.files[key] = playlist[0].path
+
+            on = set(state.get("on", [])) & set(self.layout)
+            if auto:
+                states = self.scheduler.schedule.states(self.scheduler.clock.now())
+                on = {category for category in on if states.get(category)}
+            if not on:
+                return []
+
+            print(f"wall {self.wall.name}: resuming {', '.join(sorted(on))}")
+            return self.restart(off=[category for category in self.layout if category not in on])
+
+    def _select(self, category) -> None:
+        keys = self.layout[category]
+        options = self._playlist_options(category)
+        if options is None:
+            files = SELECTORS[category](len(keys))
+            for key, file in zip(keys, files):
+                self.files[key] = file
+                self.playlists.pop(key, None)
+            return
+
+        # the selectors return the oldest first
+        files = SELECTORS[category](options.get("SIZE", Playlists.SIZE))[::-1]
+        playlists = Playlists.build(options["POLICY"], files, len(keys), options.get("DWELL", Playlists.DWELL))
+        for key, playlist in zip(keys, playlists):
+            self.playlists[key] = playlist
+            self.files[key] = playlist[0].path if playlist else ""
+        pass
+
+    def list_files(self) -> dict:
+        '''
+        Selects the newest files of the categories in auto mode, or builds the playlists of
+        their displays for the categories of PLAYLISTS. Displays of manual categories without
+        a file get the last file chosen for them. Returns the status.
+        '''
+        with self._lock:
+            for category, keys in self.layout.items():
+                if self.modes[category] == "auto":
+                    self._select(category)
+                else:
+                    for key in keys:
+                        if not self.files[key]:
+                            self.files[key] = self.config.lookup(self.wall.by_key[key].options_path + ("last_file",), "")
+
+            paths = set(self.files.values())
+            for playlist in self.playlists.values():
+                paths.update(playlist.paths())
+            if self.variants:
+                # rendered in the background, the displays use them once they are ready
+                for path in paths:
+                    self.variants.submit(path)
+            if self.prefetcher:
+                self.prefetcher.prefetch([self._media(path) for path in paths])
+
+        return self.status()
+
+    def _media(self, file):
+        '''
+        Returns the file, or every file of a Playlist, replaced by its rendered variant.
+        '''
+        if not self.variants or any(compositor.owns(file) for compositor in self.compositors.values()):
+            return file
+        if isinstance(file, Playlists.Playlist):
+            return file.map(self.variants.prefer)
+        return self.variants.prefer(file)
+
+    def _playing_variants(self) -> list:
+        '''
+        Returns the variants of the files playing, which the variant cache must not evict.
+        '''
+        with self._lock:
+            files = list(self.controller.playing.values())
+
+        paths = set()
+        for file in files:
+            paths.update(file.paths() if isinstance(file, Playlists.Playlist) else [file])
+        return [self.variants.lookup(path) for path in paths]
+
+    def _selection(self, key):
+        return self.playlists.get(key) or self.files[key]
+
+    def _played(self, key, event, file) -> None:
+        if self.play_log and file:
+            self.play_log.record(self.wall.name, key, event,
+                                 "|".join(file.paths()) if isinstance(file, Playlists.Playlist) else file)
+        pass
+
+    def _start(self, key, selection, force=False) -> bool:
+        file, display = self._media(selection), self._display(key, selection)
+        if self.backend == "batch":
+            # the batch file plays one file, the first of the playlist
+            started = vma.turnon_screen(_head(file), display)
+        else:
+            # only touches the player if its file changed, or reloads it with force
+            self.watchdog.reset(key)
+            self.sessions.play(key, display, file, force)
+            started = True
+
+        if started:
+            self._played(key, "start", selection)
+        return started
+
+    def _respawn(self, key) -> None:
+        '''
+        Called by the watchdog: replaces the player of one display with a new one playing the
+        same file. The other displays are not touched.
+        '''
+        with self._lock:
+            file = self.controller.playing.get(key)
+            if not file:
+                # stopped since the watchdog looked at it
+                return
+            self.sessions.stop(key)
+            self.sessions.play(key, self._display(key, file), self._media(file))
+            self._played(key, "respawn", file)
+        pass
+
+    def _stop(self, key) -> None:
+        if self.agent:
+            self._played(key, "stop", self.controller.playing.get(key))
+            self.agent.off([key])
+        # batch launched players cannot be stopped one by one
+        elif self.backend != "batch":
+            self.sessions.stop(key)
+            self._played(key, "stop", self.controller.playing.get(key))
+        pass
+
+    def restart(self, force=False, off=(), categories=None) -> list:
+        '''
+        Launches the displays whose file differs from what they are playing, or every display
+        with force, and stops the displays without a file and those of the categories in off.
+        Only the displays of categories are touched if it is not None.
+        Returns one {"key", "launched", "latency", "error"} per launched display.
+        '''
+        launch_options = self.options.get("LAUNCH", {})
+        with self._lock:
+            selection = {key: "" if category in off else self._selection(key)
+                         for category, keys in self.layout.items() for key in keys
+                         if categories is None or category in categories}
+            self._composite(selection)
+
+            with metrics.timer("vma_restart_seconds", wall=self.wall.name):
+                if self.agent:
+                    results = self._refresh_agent(selection, force)
+                else:
+                    # the displays stopped here are no crashes for the watchdog
+                    with self.watchdog.stopping([key for key, file in selection.items() if not file]):
+                        results = self.controller.refresh(selection, lambda key: self._start(key, selection[key], force), self._stop, force=force,
+                                                          max_concurrent=launch_options.get("MAX_CONCURRENT", Launcher.MAX_CONCURRENT),
+                                                          stagger=launch_options.get("STAGGER", Launcher.STAGGER))
+            for result in results:
+                metrics.observe("vma_launch_seconds", result.latency, wall=self.wall.name, display=result.key)
+                if not result.launched:
+                    metrics.inc("vma_launch_failures_total", wall=self.wall.name, display=result.key)
+            if results:
+                self.screens_on = True
+                print(Launcher.report(results))
+            self._save_snapshot()
+
+        return [{"key": result.key, "launched": result.launched, "latency": result.latency,
+                 "error": str(result.error) if result.error else None} for result in results]
+
+    def _refresh_agent(self, selection, force) -> list:
+        '''
+        Sends the displays that changed to the agent of the wall in one batch.
+        '''
+        import Fleet
+        send = partial(self._send, force=force)
+        try:
+            return self.controller.refresh_batch(selection, send, force)
+        except Fleet.AgentReset:
+            # the agent was restarted and lost its players, the whole selection is sent again
+            self.controller.forget()
+            return self.controller.refresh_batch(selection, send, force)
+
+    def _send(self, launch, stopped, force=False) -> list:
+        for key in stopped:
+            self._played(key, "stop", self.controller.playing.get(key))
+
+        launch_options = self.options.get("LAUNCH", {})
+        results = self.agent.play({key: (self.displays[key], file) for key, file in launch.items()}, stopped,
+                                  launch_options.get("MAX_CONCURRENT", Launcher.MAX_CONCURRENT),
+                                  launch_options.get("STAGGER", Launcher.STAGGER), force)
+        for result in results:
+            if result.launched:
+                self._played(result.key, "start", launch[result.key])
+        return results
+
+    def _agent_health(self) -> dict:
+        '''
+        Returns the health of the displays reported by the agent of the wall, like
+        Watchdog.status().
+        '''
+        import Fleet
+        try:
+            return self.agent.health()["displays"]
+        except Fleet.AgentReset:
+            # the agent was restarted, none of its players is left
+            self.controller.forget()
+            return {}
+        except (OSError, RuntimeError) as e:
+            return {key: {"pid": None, "state": "unreachable", "respawns": 0, "error": str(e)} for key in self.controller.playing}
+
+    def refresh(self) -> list:
+        with self._lock:
+            self.list_files()
+            return self.restart()
+
+    def turn_off(self, category=None) -> dict:
+        '''
+        Turns the wall off, or only the displays of category. Only the players this service
+        started are stopped, in parallel. Returns {"stopped": {key: how it ended}, "seconds"}.
+        '''
+        if category is not None and category not in self.layout:
+            raise NotFound(f"unknown category {category}")
+        if category is not None and self.backend == "batch":
+            raise Conflict("batch launched players cannot be stopped one by one")
+
+        with self._lock:
+            keys = self.layout[category] if category is not None else list(self.displays)
+            for key in keys:
+                self._played(key, "stop", self.controller.playing.get(key))
+
+            # until they are forgotten, the watchdog would take the stopped players for crashed ones
+            with self.watchdog.stopping(None if category is None else keys):
+                if self.backend == "batch":
+                    start = time.monotonic()
+                    vma.turnoff_screens()
+                    result = PlayerSession.StopResult({}, time.monotonic() - start)
+                elif self.agent:
+                    result = self.agent.off(keys)
+                    self.controller.forget(keys)
+                elif category is None:
+                    result = self.sessions.stop_all()
+                else:
+                    result = self.sessions.stop_many(keys)
+                    self.controller.forget(keys)
+
+                if category is None:
+                    self.controller.forget()
+                    self.screens_on = False
+            self._save_snapshot()
+
+        metrics.observe("vma_off_seconds", result.seconds, wall=self.wall.name)
+        print(f"{category or 'wall'} off in {result.seconds*1000:.0f} ms",
+              *(f"{key}: {how}" for key, how in result.stopped.items() if how), sep="\n")
+        return {"stopped": result.stopped, "seconds": result.seconds}
+
+    def set_file(self, key, file) -> dict:
+        '''
+        Sets the file of a display of a category in manual mode and remembers it as the
+        display's last file.
+        '''
+        slot = self.wall.by_key.get(str(key))
+        if slot is None:
+            raise NotFound(f"unknown display {key}")
+
+        if self.modes[slot.category] != "manual":
+            raise Conflict(f"{slot.category} is in auto mode")
+
+        with self._lock:
+            self.files[slot.key] = file
+            self.playlists.pop(slot.key, None)
+            self.config.set(slot.options_path + ("last_file",), file)
+            self._save_snapshot()
+
+        return self.status()
+
+    def set_mode(self, category, mode) -> dict:
+        '''
+        Switches a category between "auto" and "manual". Switching to auto selects the newest
+        files again, switching to manual keeps the files that are shown.
+        '''
+        if category not in self.layout:
+            raise NotFound(f"unknown category {category}")
+        if mode not in ("auto", "manual"):
+            raise BadRequest(f"unknown mode {mode}")
+
+        with self._lock:
+            self.modes[category] = mode
+            if mode == "auto":
+                for key in self.layout[category]:
+                    self.files[key] = ""
+
+        status = self.list_files()
+        self._save_snapshot()
+        return status
+
+    def set_auto(self, enabled) -> dict:
+        if enabled:
+            self.scheduler.start()
+        else:
+            self.scheduler.cancel()
+        self._save_snapshot()
+
+        return self.status()
+
+    def apply_schedule(self, states) -> None:
+        '''
+        Called by the on/off scheduler when it starts and at every transition.
+            - states (dict): category: True if its screens should be on
+
+        Switches the wall off if every category is off, otherwise lists the files and refreshes
+        the displays, stopping the displays of the categories that are off.
+        '''
+        with self._lock:
+            if not any(states.values()):
+                self.turn_off()
+                return
+
+            off = [category for category, on in states.items() if not on]
+            if off and self.backend == "batch":
+                # batch launched players cannot be stopped one by one, so the wall is restarted
+                if any(key in self.controller.playing for category in off for key in self.layout[category]):
+                    self.turn_off()
+
+            self.list_files()
+            self.restart(off=off)
+        pass
+
+    def prepare_schedule(self, states) -> None:
+        '''
+        Called by the on/off scheduler LEAD_MINUTES before a transition: reads ahead the files
+        the categories that will be on would show now, without changing the selection.
+        '''
+        if not self.prefetcher:
+            return
+
+        files = []
+        with self._lock:
+            for category, keys in self.layout.items():
+                if not states.get(category):
+                    continue
+                options = self._playlist_options(category)
+                if self.modes[category] != "auto":
+                    files.extend(self.files[key] for key in keys)
+                elif options is None:
+                    files.extend(SELECTORS[category](len(keys)))
+                else:
+                    files.extend(SELECTORS[category](options.get("SIZE", Playlists.SIZE)))
+
+        self.prefetcher.prefetch([self._media(file) for file in files])
+        pass
+
+    def _folder_changed(self, folder, changed, removed) -> None:
+        '''
+        Called by the media indexes when a folder changed. The playlists are rebuilt once the
+        folders were quiet for PLAYLIST_DELAY, so a sync of many files rebuilds them once.
+        '''
+        if not any(self._playlist_options(category) for category in self.layout):
+            return
+
+        with self._lock:
+            if self._rebuild:
+                self._rebuild.cancel()
+            self._rebuild = threading.Timer(PLAYLIST_DELAY, self.rebuild_playlists)
+            self._rebuild.daemon = True
+            self._rebuild.start()
+        pass
+
+    def rebuild_playlists(self) -> list:
+        '''
+        Rebuilds the playlists of the auto categories of PLAYLISTS and, on the displays that
+        are playing, reloads only the playlists that changed. The players are not restarted.
+        Returns the launch results like restart().
+        '''
+        with self._lock:
+            categories = [category for category in self.layout
+                          if self.modes[category] == "auto" and self._playlist_options(category)]
+            for category in categories:
+                self._select(category)
+
+            # categories switched off by the schedule stay off
+            playing = [category for category in categories
+                       if any(key in self.controller.playing for key in self.layout[category])]
+            if not playing:
+                return []
+            return self.restart(categories=playing)
+
+    def apply_options(self) -> HotReload.WallChanges:
+        '''
+        Applies the options of the store after they were reloaded, touching only what changed:
+        removed displays are stopped, added and moved displays get their files selected, remapped
+        displays are relaunched on their new screen and a new AUTO schedule is rescheduled. The
+        other displays keep playing. Returns the HotReload.WallChanges.
+        '''
+        new_wall = compile_layout(self.config.options).wall(self.wall.name)
+        changes = HotReload.diff_walls(self.wall, new_wall)
+        playlists_changed = self.options.get("PLAYLISTS") != new_wall.options.get("PLAYLISTS")
+        compositor_changed = self.options.get("COMPOSITOR") != new_wall.options.get("COMPOSITOR")
+
+        unknown = set(new_wall.by_category) - set(SELECTORS)
+        if unknown:
+            raise ValueError(f"unknown categories {', '.join(sorted(unknown))} in wall {new_wall.name}")
+
+        with self._lock:
+            self.wall = new_wall
+            self.options = new_wall.options
+            self.layout = {category: self.wall.keys(category) for category in self.wall.by_category}
+            self.displays = {slot.key: slot.display for slot in self.wall.slots}
+            self.modes = {category: self.modes.get(category, "auto") for category in self.layout}
+            if changes.layout_changed() or compositor_changed:
+                self.compositors = self._compositors()
+
+            with self.watchdog.stopping(changes.removed):
+                for key in changes.removed:
+                    if key in self.controller.playing:
+                        self._stop(key)
+                    self.controller.forget([key])
+                    self.files.pop(key, None)
+                    self.playlists.pop(key, None)
+            for key in changes.added + changes.moved:
+                self.files[key] = ""
+                self.playlists.pop(key, None)
+            # relaunched on the new screen by the refresh below
+            self.controller.forget(changes.remapped)
+
+            if changes.layout_changed() or playlists_changed or compositor_changed:
+                self.list_files()
+                if self.screens_on:
+                    self.restart()
+
+        if changes.schedule:
+            self.scheduler.reschedule(Scheduler.Schedule(self.options["AUTO"], list(self.layout)))
+        if changes.needs_restart:
+            print(f"wall {self.wall.name}: {', '.join(changes.needs_restart)} changes apply after a restart")
+
+        return changes
+
+    def sync(self) -> dict:
+        '''
+        Syncs the media with the built-in sync engine when SYNC.SOURCE is set, otherwise runs
+        the SYNC.SCRIPT sync script.
+        '''
+        sync_options = self.options.get("SYNC", {})
+        if sync_options.get("SOURCE"):
+            result = vma.sync_media(sync_options["SOURCE"], sync_options.get("WORKERS", 4), sync_options.get("HASH", False),
+                                    sync_options.get("STORE", False))
+            metrics.observe("vma_sync_seconds", result.seconds, method="engine")
+            metrics.inc("vma_sync_bytes_total", result.bytes)
+            metrics.inc("vma_sync_failures_total", len(result.failed))
+            metrics.inc("vma_sync_deduplicated_total", result.deduplicated)
+            return {"files": result.files, "bytes": result.bytes, "unchanged": result.unchanged, "deduplicated": result.deduplicated,
+                    "failed": [relative for relative, error in result.failed], "seconds": result.seconds}
+
+        with metrics.timer("vma_sync_seconds", method="script"):
+            vma.sync_files(sync_options.get("SCRIPT", "C:\\VM_Tasks\\xcopy_VM.cmd"))
+        return {}
+
+    def metrics_text(self) -> str:
+        return metrics.render()
+
+    # HTTP API
+
+    def _routes(self) -> dict:
+        return {("GET", "/status"): self.status,
+                ("GET", "/metrics"): self.metrics_text,
+                ("POST", "/files"): self.list_files,
+                ("POST", "/refresh"): self.refresh,
+                ("POST", "/restart"): self.restart,
+                ("POST", "/off"): self.turn_off,
+                ("POST", "/set-file"): self.set_file,
+                ("POST", "/mode"): self.set_mode,
+                ("POST", "/auto"): self.set_auto,
+                ("POST", "/sync"): self.sync}
+
+    def _check_origin(self, method, headers) -> None:
+        '''
+        Raises Forbidden if a request lacks the token of the service, or without a token, is
+        not addressed to this PC by a local name, and UnsupportedMediaType for a POST that is not
+        JSON.
+        '''
+        if self.token:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), self.token.encode()):
+                raise Forbidden("missing or wrong token")
+        else:
+            host = headers.get("host", "")
+            # the port follows the name, or the brackets of an IPv6 address
+            name = host[:host.find("]") + 1] if host.startswith("[") else host.partition(":")[0]
+            if name.lower() not in LOCAL_HOSTS + (self.host,):
+                raise Forbidden(f"requests to {host or 'no host'} are not answered, set DAEMON.TOKEN to serve the network")
+
+        if method == "POST" and headers.get("content-type", "").partition(";")[0].strip().lower() != "application/json":
+            raise UnsupportedMediaType("the body must be application/json")
+        pass
+
+    async def _read_request(self, reader) -> tuple:
+        '''
+        Reads one request and returns (method, path, arguments). Raises BadRequest if it is
+        malformed, Forbidden or UnsupportedMediaType if it is refused (see _check_origin).
+        '''
+        try:
+            method, path, _ = (await reader.readline()).decode().split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            raise BadRequest(f"malformed request: {e}") from None
+
+        self._check_origin(method, headers)
+        try:
+            arguments = json.loads(body) if body else {}
+        except ValueError as e:
+            raise BadRequest(f"malformed request: {e}") from None
+
+        if not isinstance(arguments, dict):
+            raise BadRequest("the body must be a JSON object")
+        return method, path, arguments
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            method, path, arguments = await self._read_request(reader)
+            operation = self._routes().get((method, path))
+            if operation is None:
+                raise NotFound(f"no route {method} {path}")
+            try:
+                inspect.signature(operation).bind(**arguments)
+            except TypeError as e:
+                raise BadRequest(str(e)) from None
+
+            result = await asyncio.get_running_loop().run_in_executor(None, lambda: operation(**arguments))
+            status, reply = 200, {"result": result}
+        except RequestError as e:
+            status, reply = e.status, {"error": str(e)}
+        except Exception as e:
+            print(f"request failed: {e!r}")
+            status, reply = 500, {"error": repr(e)}
+
+        if status == 200 and path in TEXT_ROUTES:
+            payload, content_type = reply["result"].encode(), "text/plain; version=0.0.4"
+        else:
+            payload, content_type = json.dumps(reply).encode(), "application/json"
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+        pass
+
+    async def start(self, auto=True) -> None:
+        '''
+        Starts serving the API, relaunches what the snapshot of the wall shows, selects the
+        files and starts the on/off scheduler if auto. The scheduler is not started if it was
+        off when the snapshot was written.
+        '''
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        loop = asyncio.get_running_loop()
+
+        state = self.snapshot.load() if self.snapshot else None
+        resumed = []
+        if state:
+            auto = auto and state.get("auto", True)
+            # before any folder is scanned, the API answers meanwhile
+            resumed = await loop.run_in_executor(None, self.resume, state, auto)
+
+        # not awaited, the API answers while the folders are scanned. The scheduler reconciles
+        # a resumed wall with the scan, otherwise a refresh does
+        scan = loop.run_in_executor(None, self.refresh if resumed and not auto else self.list_files)
+        scan.add_done_callback(_report_failure)
+        if auto:
+            self.scheduler.start()
+        metrics_options = self.options.get("METRICS", {})
+        if metrics_options.get("FILE"):
+            metrics.start_writer(metrics_options["FILE"], metrics_options.get("INTERVAL", Metrics.WRITE_INTERVAL))
+        MediaIndex.listeners.append(self._folder_changed)
+        # batch launched players have no known process to watch, an agent watches its own players
+        if self.backend not in ("batch", "agent") and self.options.get("WATCHDOG", {}).get("ENABLED", True):
+            self.watchdog.start()
+        pass
+
+    async def stop(self) -> None:
+        self.scheduler.cancel()
+        self.watchdog.stop()
+        if self._folder_changed in MediaIndex.listeners:
+            MediaIndex.listeners.remove(self._folder_changed)
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        pass
+
+
+def _report_failure(future) -> None:
+    '''
+    Done callback of the initial scan, which start() does not await: prints its exception,
+    which would be lost otherwise.
+    '''
+    if not future.cancelled() and future.exception() is not None:
+        print(f"initial scan failed: {future.exception()!r}")
+    pass
+
+
+def start_in_thread(config, wall=None, auto=True) -> WallService:
+    '''
+    Runs a WallService on its own event loop in a daemon thread of the current process, as the
+    Tk interface does when DAEMON.EMBEDDED is true. Returns once the API is being served.
+    '''
+    service = WallService(config, wall)
+    started = threading.Event()
+    errors = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(service.start(auto))
+        except Exception as e:
+            errors.append(e)
+            started.set()
+            return
+        started.set()
+        loop.run_forever()
+        pass
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    if errors:
+        raise errors[0]
+
+    if service.options.get("DAEMON", {}).get("RELOAD", True):
+        HotReload.ConfigWatcher(config, [service], list(SELECTORS)).start()
+
+    return service
+
+
+class DaemonClient():
+    '''
+    Client of the WallService HTTP API with one method per route. Errors of the service are
+    raised as RuntimeError with the service's message.
+    '''
+    def __init__(self, host=HOST, port=PORT, timeout=CLIENT_TIMEOUT, token="") -> None:
+        self.url = f"http://{host}:{port}"
+        self.timeout = timeout
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        pass
+
+    def _call(self, method, path, **arguments):
+        data = json.dumps(arguments).encode() if method == "POST" else None
+        req = urlrequest.Request(self.url + path, data=data, method=method,
+                                 headers={"Content-Type": "application/json", **self.headers})
+        try:
+            with urlrequest.urlopen(req, timeout=self.timeout) as response:
+                return json.load(response)["result"]
+        except HTTPError as e:
+            raise RuntimeError(json.load(e).get("error", str(e))) from None
+
+    def status(self) -> dict:
+        return self._call("GET", "/status")
+
+    def list_files(self) -> dict:
+        return self._call("POST", "/files")
+
+    def refresh(self) -> list:
+        return self._call("POST", "/refresh")
+
+    def restart(self, force=False) -> list:
+        return self._call("POST", "/restart", force=force)
+
+    def turn_off(self, category=None) -> dict:
+        return self._call("POST", "/off", category=category)
+
+    def set_file(self, key, file) -> dict:
+        return self._call("POST", "/set-file", key=str(key), file=file)
+
+    def set_mode(self, category, mode) -> dict:
+        return self._call("POST", "/mode", category=category, mode=mode)
+
+    def set_auto(self, enabled) -> dict:
+        return self._call("POST", "/auto", enabled=enabled)
+
+    def sync(self) -> dict:
+        return self._call("POST", "/sync")
+
+    def metrics(self) -> str:
+        req = urlrequest.Request(self.url + "/metrics", headers=self.headers)
+        with urlrequest.urlopen(req, timeout=self.timeout) as response:
+            return response.read().decode()
+
+
+async def serve(config_paths) -> None:
+    services, watchers = [], []
+    for path in config_paths:
+        config = ConfigStore(path)
+        walls = [WallService(config, wall) for wall in compile_layout(config.options).walls]
+        services.extend(walls)
+        if config.get("DAEMON", {}).get("RELOAD", True):
+            watchers.append(HotReload.ConfigWatcher(config, walls, list(SELECTORS)))
+
+    ports = [(service.host, service.port) for service in services]
+    if len(set(ports)) != len(ports):
+        raise ValueError("every wall needs its own DAEMON.PORT")
+    # the walls of every options file share this PC and its RC ports
+    conflicts = HotReload.port_conflicts([service.wall for service in services])
+    if conflicts:
+        raise ValueError("\n".join(conflicts))
+
+    for service in services:
+        await service.start()
+        print(f"serving wall {service.wall.name} of {service.config.path} on http://{service.host}:{service.port}")
+    for watcher in watchers:
+        watcher.start()
+
+    await asyncio.Event().wait()
+    pass
+
+
+def main(argv) -> None:
+    '''
+    Runs one WallService per wall of every options file, all in this process:
+        python Daemon.py [options.json ...]
+    Every wall needs its own DAEMON.PORT and a PLAYER.RC_BASE_PORT range of its own.
+    '''
+    try:
+        asyncio.run(serve(argv or ["options.json"]))
+    except KeyboardInterrupt:
+        pass
+    pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,443 @@
+import asyncio
+import hmac
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import VisualManagementArea as vma
+import Daemon
+import Launcher
+import PlayerSession
+import Playlists
+import Watchdog
+from Layout import compile_layout
+
+AGENT_HOST = "127.0.0.1"
+AGENT_PORT = 8790
+CONNECT_TIMEOUT = 5
+TIMEOUT = 120 # seconds to wait for the reply of a batch, launching a whole wall can take a while
+LINE_LIMIT = 16 * 1024**2 # bytes of one request, a batch of playlists can be long
+
+OPERATIONS = ("play", "off", "health")
+
+
+def encode(file):
+    '''
+    Media of a display as it is sent to an agent: the path relative to the media root, or
+    [[path, dwell], ...] for a Playlist. Every site keeps the same folders under its own root.
+    '''
+    if isinstance(file, Playlists.Playlist):
+        return [[_relative(item.path), item.dwell] for item in file]
+    return _relative(file)
+
+
+def decode(media, root):
+    '''
+    Returns the file or Playlist of media sent by the coordinator, under the media root of this PC.
+    '''
+    if isinstance(media, list):
+        return Playlists.Playlist(Playlists.PlaylistItem(_absolute(path, root), dwell) for path, dwell in media)
+    return _absolute(media, root)
+
+
+def _relative(path) -> str:
+    return path[len(vma.ROOT):] if vma.ROOT and path.startswith(vma.ROOT) else path
+
+
+def _absolute(path, root) -> str:
+    return path if not path or os.path.isabs(path) else root + path
+
+
+class AgentReset(Exception):
+    '''
+    The agent was restarted since the last batch, so the players it had are gone. The batch
+    was not run: the coordinator forgets what was playing and sends the whole selection again.
+    '''
+
+
+class FleetAgent():
+    '''
+    Lightweight player host of one signage PC, driven by a coordinator over TCP. It plays what
+    it is told on its displays, respawns crashed players with a Watchdog and reports their
+    health. Layouts, selection and schedules stay on the coordinator, a WallService whose wall
+    has an AGENT option.
+
+    One JSON object per line, over a connection the coordinator keeps open:
+
+        -> {"token": shared secret, "agent": id of the agent the coordinator last talked to, or null,
+            "commands": [{"op": "play", "launch": {key: [display, media]}, "stop": [key],
+                          "max_concurrent": 4, "stagger": 0.25, "force": false},
+                         {"op": "off", "keys": [key] or null},
+                         {"op": "health"}]}
+        <- {"agent": id, "results": [{"result": ...} or {"error": "..."}, ...]}
+
+    The commands of a batch run in order. A batch for another agent id, sent before this agent
+    was restarted, is answered without running it. A request without the token of the agent
+    is refused and its connection closed.
+
+        - options (dict): options of this PC, for PLAYER, WATCHDOG and the FLEET.TOKEN every
+          request must carry. A PLAYER.BACKEND that is not one of PlayerSession.BACKENDS falls
+          back to vlc
+        - host, port: address the agent listens on
+        - root (str): media root of this PC, VisualManagementArea.ROOT if None
+    '''
+    def __init__(self, options, host=AGENT_HOST, port=AGENT_PORT, root=None) -> None:
+        self.token = options.get("FLEET", {}).get("TOKEN")
+        if not self.token:
+            raise ValueError("an agent needs a FLEET.TOKEN, the coordinator sends it with every request")
+
+        self.id = uuid.uuid4().hex
+        self.host = host
+        self.port = port
+        self.root = vma.ROOT if root is None else root
+
+        player_options = options.get("PLAYER", {})
+        backend = player_options.get("BACKEND", "vlc")
+        if backend not in PlayerSession.BACKENDS:
+            # e.g. the batch file of the shipped options, which cannot play one display at a time
+            print(f"agent: PLAYER.BACKEND {backend} is not a player backend, using vlc")
+            backend = "vlc"
+        self.sessions = PlayerSession.SessionManager(backend,
+                                                     player_options.get("RC_BASE_PORT", PlayerSession.RC_BASE_PORT))
+        self.playing = {} # key: (display, file or Playlist)
+
+        self.watchdog_options = options.get("WATCHDOG", {})
+        self.watchdog = Watchdog.Watchdog(self.sessions, lambda: list(self.playing), self._respawn, f"agent {port}",
+                                          interval=self.watchdog_options.get("INTERVAL", Watchdog.INTERVAL),
+                                          stall_timeout=self.watchdog_options.get("STALL_TIMEOUT", Watchdog.STALL_TIMEOUT),
+                                          backoff=self.watchdog_options.get("BACKOFF", Watchdog.BACKOFF),
+                                          max_backoff=self.watchdog_options.get("MAX_BACKOFF", Watchdog.MAX_BACKOFF),
+                                          crash_limit=self.watchdog_options.get("CRASH_LIMIT", Watchdog.CRASH_LIMIT),
+                                          crash_window=self.watchdog_options.get("CRASH_WINDOW", Watchdog.CRASH_WINDOW))
+        self._lock = threading.RLock()
+        pass
+
+    # operations
+
+    def _play(self, key, display, file, force=False) -> bool:
+        self.watchdog.reset(key)
+        self.sessions.play(key, display, file, force)
+        return True
+
+    def _respawn(self, key) -> None:
+        with self._lock:
+            entry = self.playing.get(key)
+            if not entry:
+                return
+            self.sessions.stop(key)
+            self.sessions.play(key, *entry)
+        pass
+
+    def play(self, launch, stop=(), max_concurrent=Launcher.MAX_CONCURRENT, stagger=Launcher.STAGGER, force=False) -> list:
+        '''
+        Stops the displays of stop in parallel, then launches the displays of launch,
+        {key: [display, media]}, loading their media again with force even if it plays
+        already. Returns one {"key", "launched", "latency", "error"} per launched display.
+        '''
+        with self._lock:
+            with self.watchdog.stopping(stop):
+                self.sessions.stop_many(stop)
+                for key in stop:
+                    self.playing.pop(key, None)
+
+            media = {key: (display, decode(file, self.root)) for key, (display, file) in launch.items()}
+            results = Launcher.launch_all([(key, partial(self._play, key, *entry, force)) for key, entry in media.items()],
+                                          max_concurrent=max_concurrent, stagger=stagger)
+            for result in results:
+                if result.launched:
+                    self.playing[result.key] = media[result.key]
+                else:
+                    self.playing.pop(result.key, None)
+
+        return [{"key": result.key, "launched": result.launched, "latency": result.latency,
+                 "error": str(result.error) if result.error else None} for result in results]
+
+    def off(self, keys=None) -> dict:
+        '''
+        Stops the players of keys, or every player, in parallel. Returns {"stopped", "seconds"}.
+        '''
+        with self._lock, self.watchdog.stopping(keys):
+            result = self.sessions.stop_all() if keys is None else self.sessions.stop_many(keys)
+            for key in list(self.playing) if keys is None else keys:
+                self.playing.pop(key, None)
+
+        return {"stopped": result.stopped, "seconds": result.seconds}
+
+    def health(self) -> dict:
+        '''
+        Returns {"displays": {key: watchdog status}, "playing": {key: file}} of the displays
+        playing on this PC, with the first file of a playlist.
+        '''
+        with self._lock:
+            playing = {key: file.paths()[0] if isinstance(file, Playlists.Playlist) and file else file
+                       for key, (display, file) in self.playing.items()}
+        health = self.watchdog.status()
+        pids = self.sessions.pids()
+
+        return {"displays": {key: health.get(key) or {"pid": pids.get(key), "state": "ok" if key in pids else "stopped",
+                                                      "respawns": 0, "error": None}
+                             for key in playing},
+                "playing": playing}
+
+    def execute(self, request) -> dict:
+        if request.get("agent") not in (None, self.id):
+            return {"agent": self.id, "results": []}
+
+        results = []
+        for command in request.get("commands", []):
+            arguments = dict(command)
+            operation = arguments.pop("op", None)
+            try:
+                if operation not in OPERATIONS:
+                    raise KeyError(f"unknown operation {operation}")
+                results.append({"result": getattr(self, operation)(**arguments)})
+            except Exception as e:
+                results.append({"error": repr(e)})
+
+        return {"agent": self.id, "results": results}
+
+    # TCP server
+
+    def _authorized(self, request) -> bool:
+        token = request.get("token") if isinstance(request, dict) else None
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    async def _handle(self, reader, writer) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    request, reply = None, {"agent": self.id, "error": f"bad request: {e}"}
+                if request is not None and not self._authorized(request):
+                    writer.write(json.dumps({"agent": None, "error": "unauthorized"}).encode() + b"\n")
+                    await writer.drain()
+                    break
+                if request is not None:
+                    reply = await loop.run_in_executor(None, self.execute, request)
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        pass
+
+    async def serve(self) -> None:
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=LINE_LIMIT)
+        if self.watchdog_options.get("ENABLED", True):
+            self.watchdog.start()
+        print(f"agent {self.id} serving on {self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+        pass
+
+
+class AgentClient():
+    '''
+    Connection of a coordinator to one FleetAgent. Commands are sent in batches, one request
+    and one reply per batch, over a connection kept open between batches and reopened once if
+    it broke.
+
+        - host, port: address of the agent
+        - token (str): FLEET.TOKEN of the agent
+        - timeout (float): seconds to wait for the reply of a batch
+    '''
+    def __init__(self, host=AGENT_HOST, port=AGENT_PORT, token="", timeout=TIMEOUT) -> None:
+        self.host = host
+        self.port = port
+        self.token = token
+        self.timeout = timeout
+        self.agent = None # id of the agent the last batch was run by
+
+        self._socket = None
+        self._file = None
+        self._lock = threading.Lock()
+        pass
+
+    def _exchange(self, request) -> dict:
+        if self._file is None:
+            self._socket = socket.create_connection((self.host, self.port), CONNECT_TIMEOUT)
+            self._socket.settimeout(self.timeout)
+            self._file = self._socket.makefile("rwb")
+
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError(f"agent {self.host}:{self.port} closed the connection")
+        return json.loads(line)
+
+    def call(self, *commands) -> list:
+        '''
+        Runs the commands, {"op": ..., arguments}, on the agent as one batch and returns their
+        results in order. Raises AgentReset if the agent was restarted since the last batch,
+        RuntimeError with the error of the first command that failed and OSError if the agent
+        cannot be reached.
+        '''
+        request = {"token": self.token, "agent": self.agent, "commands": list(commands)}
+        with self._lock:
+            reconnected = self._file is None
+            try:
+                reply = self._exchange(request)
+            except OSError:
+                self.close()
+                if reconnected:
+                    raise
+                # the agent or the network dropped the connection since the last batch
+                reply = self._exchange(request)
+
+            if "error" in reply:
+                raise RuntimeError(reply["error"])
+            restarted = self.agent is not None and reply["agent"] != self.agent
+            self.agent = reply["agent"]
+
+        if restarted:
+            raise AgentReset(f"agent {self.host}:{self.port} was restarted")
+        results = []
+        for entry in reply["results"]:
+            if "error" in entry:
+                raise RuntimeError(entry["error"])
+            results.append(entry["result"])
+        return results
+
+    def play(self, launch, stop, max_concurrent=Launcher.MAX_CONCURRENT, stagger=Launcher.STAGGER, force=False) -> list:
+        '''
+        Sends the displays to launch, {key: (display, file or Playlist)}, and the keys to stop
+        in one batch, see FleetAgent.play(). Returns a Launcher.LaunchResult per display of
+        launch, all of them failed if the agent cannot be reached.
+        '''
+        start = time.monotonic()
+        try:
+            results, = self.call({"op": "play", "launch": {key: [display, encode(file)] for key, (display, file) in launch.items()},
+                                  "stop": list(stop), "max_concurrent": max_concurrent, "stagger": stagger, "force": force})
+        except (OSError, RuntimeError) as e:
+            return [Launcher.LaunchResult(key, False, time.monotonic() - start, e) for key in launch]
+
+        return [Launcher.LaunchResult(result["key"], result["launched"], result["latency"],
+                                      RuntimeError(result["error"]) if result["error"] else None)
+                for result in results]
+
+    def off(self, keys) -> PlayerSession.StopResult:
+        '''
+        Stops the players of keys. Returns a PlayerSession.StopResult, "unreachable" for every
+        key if the agent cannot be reached.
+        '''
+        start = time.monotonic()
+        keys = list(keys)
+        try:
+            result, = self.call({"op": "off", "keys": keys})
+        except AgentReset:
+            # a restarted agent has no players left
+            return PlayerSession.StopResult(dict.fromkeys(keys, "exited"), time.monotonic() - start)
+        except (OSError, RuntimeError) as e:
+            print(f"agent {self.host}:{self.port} not turned off: {e}")
+            return PlayerSession.StopResult(dict.fromkeys(keys, "unreachable"), time.monotonic() - start)
+
+        return PlayerSession.StopResult(result["stopped"], result["seconds"])
+
+    def health(self) -> dict:
+        '''
+        Returns the health of the agent's displays, see FleetAgent.health(). Raises like call().
+        '''
+        return self.call({"op": "health"})[0]
+
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._file = None
+        pass
+
+
+def walls(config_paths) -> list:
+    '''
+    Returns (options file, wall name, host, port, token) of the API of every wall of the options
+    files.
+    '''
+    addresses = []
+    for path in config_paths:
+        with open(path) as f:
+            layout = compile_layout(json.load(f))
+        for wall in layout.walls.values():
+            daemon_options = wall.options.get("DAEMON", {})
+            addresses.append((path, wall.name, daemon_options.get("HOST", Daemon.HOST), daemon_options.get("PORT", Daemon.PORT),
+                              daemon_options.get("TOKEN", "")))
+
+    return addresses
+
+
+def fan_out(addresses, operation) -> dict:
+    '''
+    Calls operation(client) with a Daemon.DaemonClient of every wall at the same time, so a
+    fleet-wide refresh takes the time of the slowest wall. Returns {"file:wall": result}, with
+    {"error": ...} for the walls that failed.
+    '''
+    def call(address):
+        path, name, host, port, token = address
+        try:
+            return operation(Daemon.DaemonClient(host, port, token=token))
+        except (OSError, RuntimeError) as e:
+            return {"error": str(e)}
+
+    if not addresses:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(addresses)) as executor:
+        results = list(executor.map(call, addresses))
+
+    return {f"{path}:{name}": result for (path, name, *_), result in zip(addresses, results)}
+
+
+COMMANDS = {"status": lambda client: client.status(),
+            "files": lambda client: client.list_files(),
+            "refresh": lambda client: client.refresh(),
+            "restart": lambda client: client.restart(force=True),
+            "off": lambda client: client.turn_off()}
+
+
+def main(argv) -> None:
+    '''
+    Runs an agent on this PC:
+        python Fleet.py agent [options.json] [--host=127.0.0.1] [--port=8790] [--root=DIR]
+    The options file of the agent needs the FLEET.TOKEN of its coordinator.
+
+    or runs one command on every wall of the coordinators' options files at once:
+        python Fleet.py status|files|refresh|restart|off [options.json ...]
+    '''
+    options = dict(arg[2:].partition("=")[::2] for arg in argv if arg.startswith("--"))
+    arguments = [arg for arg in argv if not arg.startswith("--")]
+    if not arguments or (arguments[0] != "agent" and arguments[0] not in COMMANDS):
+        print(main.__doc__)
+        sys.exit(1)
+
+    command, paths = arguments[0], arguments[1:] or ["options.json"]
+    if command != "agent":
+        print(json.dumps(fan_out(walls(paths), COMMANDS[command]), indent=4))
+        return
+
+    with open(paths[0]) as f:
+        agent = FleetAgent(json.load(f), options.get("host") or AGENT_HOST, int(options.get("port") or AGENT_PORT),
+                           options.get("root"))
+    try:
+        asyncio.run(agent.serve())
+    except KeyboardInterrupt:
+        agent.off()
+    pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
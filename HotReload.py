@@ -0,0 +1,270 @@
+import threading
+
+import PlayerSession
+import Playlists
+import Scheduler
+from Layout import compile_layout
+
+RELOAD_INTERVAL = 2 # seconds between two checks of the options file
+
+# the backends a WallService runs: the batch file, an AGENT on another PC or a PlayerSession backend
+BACKENDS = ("batch", "agent") + tuple(PlayerSession.BACKENDS)
+
+# the sections of a wall that must be JSON objects
+SECTIONS = ("DAEMON", "PLAYER", "AGENT", "FLEET", "LAUNCH", "PLAYLISTS", "COMPOSITOR", "WATCHDOG", "VARIANTS",
+            "PREFETCH", "METRICS", "SYNC")
+
+
+def _check_type(errors, options, key, kind, required=True) -> bool:
+    if key not in options:
+        if required:
+            errors.append(f"{key} is missing")
+        return False
+    if not isinstance(options[key], kind):
+        errors.append(f"{key} must be a {kind.__name__}")
+        return False
+    return True
+
+
+def rc_ports(wall) -> dict:
+    '''
+    Returns RC port: display key of the players the wall starts on this PC, none for the
+    batch file and for a wall whose players run on an agent. Raises ValueError if a display
+    key is not a number.
+    '''
+    player_options = wall.options.get("PLAYER", {})
+    if wall.options.get("AGENT") or player_options.get("BACKEND", "batch") not in PlayerSession.BACKENDS:
+        return {}
+    base_port = player_options.get("RC_BASE_PORT", PlayerSession.RC_BASE_PORT)
+    return {base_port + int(slot.key): slot.key for slot in wall.slots}
+
+
+def port_conflicts(walls) -> list:
+    '''
+    Returns a problem for every two of walls, run in one process, whose players would share
+    RC ports and so talk to each other's players.
+    '''
+    errors, used = [], {} # port: name of the wall using it
+    for wall in walls:
+        try:
+            ports = rc_ports(wall)
+        except ValueError:
+            errors.append(f"wall {wall.name}: display keys must be numbers, they give the RC ports")
+            continue
+        shared = {}
+        for port in ports:
+            if port in used:
+                shared.setdefault(used[port], []).append(port)
+            else:
+                used[port] = wall.name
+        for other, conflicting in shared.items():
+            errors.append(f"wall {wall.name}: RC ports {min(conflicting)}-{max(conflicting)} are used by wall {other} too, "
+                          f"give the walls PLAYER.RC_BASE_PORT ranges that do not overlap")
+    return errors
+
+
+def validate(options, categories) -> list:
+    '''
+    Checks new options before they are applied to a running wall. Returns the list of problems,
+    an empty list means the options can be applied.
+        - categories: the categories a display can belong to
+    '''
+    errors = []
+    if not isinstance(options, dict):
+        return ["the options must be a JSON object"]
+
+    _check_type(errors, options, "DISPLAY_LAYOUT", dict, required="WALLS" not in options)
+    _check_type(errors, options, "HARDWARE_QT_MAP", dict)
+    _check_type(errors, options, "AUTO", dict)
+    _check_type(errors, options, "WALLS", dict, required=False)
+    if errors:
+        return errors
+
+    try:
+        layout = compile_layout(options)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return [f"layout: {e!r}"]
+
+    checked = [] # the walls whose sections can be read
+    for wall in layout.walls.values():
+        wrong = [key for key in SECTIONS if not isinstance(wall.options.get(key, {}), dict)]
+        for key in wrong:
+            errors.append(f"wall {wall.name}: {key} must be a dict")
+        if wrong:
+            continue
+        if isinstance(wall.options.get("PLAYER", {}).get("RC_BASE_PORT", 0), int):
+            checked.append(wall)
+        else:
+            errors.append(f"wall {wall.name}: PLAYER.RC_BASE_PORT must be an int")
+
+        unknown = set(wall.by_category) - set(categories)
+        if unknown:
+            errors.append(f"wall {wall.name}: unknown categories {', '.join(sorted(unknown))}")
+
+        try:
+            Scheduler.Schedule(wall.options["AUTO"], list(wall.by_category))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            errors.append(f"wall {wall.name}: AUTO {e!r}")
+
+        if wall.options.get("AGENT") and not (wall.options["AGENT"].get("TOKEN") or wall.options.get("FLEET", {}).get("TOKEN")):
+            errors.append(f"wall {wall.name}: AGENT needs a TOKEN, or FLEET.TOKEN, the agent refuses requests without it")
+
+        backend = wall.options.get("PLAYER", {}).get("BACKEND", "batch")
+        if backend not in BACKENDS:
+            errors.append(f"wall {wall.name}: unknown PLAYER.BACKEND {backend}")
+        elif backend == "agent" and not wall.options.get("AGENT"):
+            errors.append(f"wall {wall.name}: PLAYER.BACKEND agent needs an AGENT to send the displays to")
+
+        for category, entry in wall.options.get("PLAYLISTS", {}).items():
+            policy = entry.get("POLICY", Playlists.SINGLE) if isinstance(entry, dict) else None
+            if policy != Playlists.SINGLE and policy not in Playlists.POLICIES:
+                errors.append(f"wall {wall.name}: unknown PLAYLISTS.{category}.POLICY {policy}")
+
+        for category in wall.options.get("COMPOSITOR", {}):
+            if category not in wall.by_category:
+                errors.append(f"wall {wall.name}: COMPOSITOR.{category} is not a category of the wall")
+                continue
+            import Compositor
+            try:
+                Compositor.grid(wall.by_category[category])
+            except ValueError as e:
+                errors.append(f"wall {wall.name}: COMPOSITOR.{category}: {e}")
+
+        for key in ("MAX_CONCURRENT", "STAGGER"):
+            value = wall.options.get("LAUNCH", {}).get(key, 0)
+            if not isinstance(value, (int, float)) or value < 0:
+                errors.append(f"wall {wall.name}: LAUNCH.{key} must be a positive number")
+
+    errors.extend(port_conflicts(checked))
+    return errors
+
+
+class WallChanges():
+    '''
+    Structural difference between the active and the new layout of a wall.
+        - added, removed (list): keys of the displays that appear or disappear
+        - moved (list): keys of the displays whose category changed
+        - remapped (list): keys of the displays whose Qt screen number changed
+        - repositioned (list): keys of the displays whose tile moved in the UI
+        - schedule (bool): the AUTO options changed
+        - needs_restart (list): options that only take effect after a restart of the service
+    '''
+    __slots__ = ("added", "removed", "moved", "remapped", "repositioned", "schedule", "needs_restart")
+
+    def __init__(self) -> None:
+        self.added, self.removed, self.moved, self.remapped, self.repositioned = [], [], [], [], []
+        self.schedule = False
+        self.needs_restart = []
+        pass
+
+    def layout_changed(self) -> bool:
+        return bool(self.added or self.removed or self.moved or self.remapped)
+
+    def __bool__(self) -> bool:
+        return self.layout_changed() or bool(self.repositioned or self.schedule or self.needs_restart)
+
+    def __repr__(self) -> str:
+        fields = {name: getattr(self, name) for name in self.__slots__ if getattr(self, name)}
+        return f"WallChanges({', '.join(f'{name}={value!r}' for name, value in fields.items())})"
+
+
+def diff_walls(old, new) -> WallChanges:
+    '''
+    Compares two WallLayout of the same wall.
+    '''
+    changes = WallChanges()
+    for key, slot in new.by_key.items():
+        previous = old.by_key.get(key)
+        if previous is None:
+            changes.added.append(key)
+            continue
+        if previous.category != slot.category:
+            changes.moved.append(key)
+        if previous.display != slot.display:
+            changes.remapped.append(key)
+        if (previous.row, previous.column) != (slot.row, slot.column):
+            changes.repositioned.append(key)
+
+    changes.removed = [key for key in old.by_key if key not in new.by_key]
+    changes.schedule = old.options.get("AUTO") != new.options.get("AUTO")
+
+    for option in ("DAEMON", "PLAYER", "WATCHDOG", "VARIANTS", "PREFETCH", "AGENT", "FLEET"):
+        if old.options.get(option) != new.options.get(option):
+            changes.needs_restart.append(option)
+
+    return changes
+
+
+class ConfigWatcher():
+    '''
+    Watches the options file of a ConfigStore and applies outside edits to running walls. A new
+    version is only applied if it parses and passes validate(); otherwise it is reported and
+    the walls keep running on the active options. The store's own writes are recognised by
+    their stamp and ignored.
+
+        - config (ConfigStore): store of the options file
+        - services (list): the WallService of every wall of the file
+        - interval (float): seconds between two checks of the file
+    '''
+    def __init__(self, config, services, categories, interval=RELOAD_INTERVAL) -> None:
+        self.config = config
+        self.services = services
+        self.categories = categories
+        self.interval = interval
+
+        self.rejected = None # stamp of the last version that failed, it is not read again
+        self._stop = threading.Event()
+        pass
+
+    def check(self) -> bool:
+        '''
+        Applies the options file if it changed since it was last read or written. Returns True
+        if a new version was applied.
+        '''
+        stamp = self.config.file_stamp()
+        if stamp is None or stamp == self.config.stamp or stamp == self.rejected:
+            return False
+
+        try:
+            stamp, options = self.config.read()
+        except (OSError, ValueError) as e:
+            print(f"{self.config.path} not reloaded: {e}")
+            self.rejected = stamp
+            return False
+
+        errors = validate(options, self.categories)
+        if errors:
+            print(f"{self.config.path} not reloaded:", *errors, sep="\n    ")
+            self.rejected = stamp
+            return False
+
+        self.config.replace(options, stamp)
+        for service in self.services:
+            try:
+                changes = service.apply_options()
+            except Exception as e:
+                # the wall keeps the state it had, the next edit gets another try
+                print(f"wall {service.wall.name} could not apply the new options: {e!r}")
+                continue
+            if changes:
+                print(f"wall {service.wall.name} reloaded: {changes}")
+
+        return True
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, daemon=True).start()
+        pass
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # the watcher must outlive a bad edit, that version is not read again
+                print(f"{self.config.path} not reloaded: {e!r}")
+                self.rejected = self.config.file_stamp()
+        pass
+
+    def stop(self) -> None:
+        self._stop.set()
+        pass
@@ -1,30 +1,41 @@
 
-from json import load, dump
+import base64
+import os
 from os.path import basename
 from tkinter import *
 from tkinter import ttk, filedialog
+import Daemon
 import VisualManagementArea as vma
-import time
-from threading import Thread
+from ConfigStore import ConfigStore
+from Daemon import HSS, OPEX, QA, PROJ
+from Worker import Worker
+from Layout import compile_layout, wall_options
 
 options_path = "options.json"
 
-screens_on = False
+# options.json is held in memory and changes are written behind, atomically and at most once per burst
+config = ConfigStore(options_path)
 
-HSS = "hss"
-OPEX = "opex"
-QA = "qa"
-PROJ = "proj"
 
-def update_options(new_options) -> None:
+def start_service():
     '''
-    Updates the options.json file with new information with proper formatting.
-
-    new_options: dictionary with similar format as options.json
+    Starts the controller of the wall in this process when DAEMON.EMBEDDED is true and returns
+    it, or None if the controller runs on its own. It relaunches what the wall showed last
+    before it returns, so starting it before the window is built lights the screens first.
     '''
-    with open(options_path, 'w') as f:
-        dump(new_options, f, indent=4)
-    pass
+    name = config.options.get("DAEMON", {}).get("WALL")
+    if name is None and config.options.get("WALLS"):
+        name = next(iter(config.options["WALLS"]))
+
+    if wall_options(config.options, name).get("DAEMON", {}).get("EMBEDDED", True):
+        return Daemon.start_in_thread(config, name)
+    return None
+
+
+STATUS_INTERVAL = 2000 # ms between two status updates from the controller
+
+# text of the status label while an action runs in the background
+BUSY_TEXT = {"files": "Listing files...", "restart": "Starting displays...", "off": "Turning off...", "sync": "Syncing files..."}
 
 
 class EllipsedLabel(ttk.Label):
@@ -44,9 +55,11 @@ class EllipsedLabel(ttk.Label):
 class Display():
     '''
     Display is basically the 8 squares the represent a single TV/Monitor in the 
-    arrangement. Each display instance is recorded in the class' "instances" object.
+    arrangement. Each display instance is recorded in the class' "instances" object and
+    indexed by its key in "by_key".
 
-    Each display is a ttk.Frame which has two children:
+    Each display is a ttk.Frame which has three children:
+        - ttk.Label: Shows a thumbnail of the file, once it has been rendered
         - ttk.Label: Shows the name of the file that is going to be displayed
         - ttk.Button: A browse button to manually select files that will be displayed
 
@@ -64,6 +77,10 @@ class Display():
           be accessed outside the class scope.
         - displayButton (ttk.Button): the browse button attached to each display. It
           also needs to be accessed outside the class scope.
+        - on_browse: callable(display, filename) called when a file is browsed. If it is
+          None the file is only shown on the label.
+        - thumbnail (tk.PhotoImage): image the preview label shows, kept here because Tk
+          drops an image nothing in Python refers to.
 
 
     The intention is to create a UI element that has the information required to run the
@@ -71,6 +88,8 @@ class Display():
 
     '''
     instances = []
+    by_key = {}
+    on_browse = None
     def __init__(self, master=None, file=None, key=None, display=None) -> None:
 
         # appends the new instance of the class to the "instances" list
@@ -79,6 +98,7 @@ class Display():
         self.textvariable = StringVar()
 
         self.__file = ''
+        self.thumbnail = None
 
         if file:
             self.__file = file
@@ -88,36 +108,41 @@ class Display():
             self.display = display
         
         if key:
-            self.key = key
+            self.set_key(key)
 
 
         self.displayFrame = ttk.Frame(master, borderwidth=5, relief="ridge")
 
+        self.previewLabel = ttk.Label(self.displayFrame, anchor='center')
         displayLabel = EllipsedLabel(self.displayFrame, textvariable=self.textvariable, width=12, anchor='center')
         self.displayButton = ttk.Button(self.displayFrame, text="Browse", command=self.browse_button)
 
         # aligns the UI elements in proper way
-        self.__fix_display_frame(self.displayFrame, displayLabel, self.displayButton)
+        self.__fix_display_frame(self.displayFrame, self.previewLabel, displayLabel, self.displayButton)
 
         pass
 
-    def __fix_display_frame(self, displayFrame: ttk.Frame, displayLabel: ttk.Label, displayButton: ttk.Button) -> None:
+    def __fix_display_frame(self, displayFrame: ttk.Frame, previewLabel: ttk.Label, displayLabel: ttk.Label, displayButton: ttk.Button) -> None:
         '''
         The function is only called internally to align the UI elements of Display inside the displayFrame properly
-        such that the label and button are centered and the label is above the button.
+        such that the thumbnail, label and button are centered and stacked in that order.
         '''
         # configures the rows and the columns of the displayFrame
         displayFrame.rowconfigure(0, weight=1)
         displayFrame.rowconfigure(1, weight=1)
+        displayFrame.rowconfigure(2, weight=1)
         displayFrame.columnconfigure(0, weight=1)
         displayFrame.columnconfigure(1, weight=1)
         displayFrame.columnconfigure(2, weight=1)
 
+        #Places thumbnail on top
+        previewLabel.grid(column=0, row=0, columnspan=3)
+
         #Places label in middle
-        displayLabel.grid(column=0, row=0, columnspan=3, sticky=(W,E,S))
+        displayLabel.grid(column=0, row=1, columnspan=3, sticky=(W,E,S))
 
         #Places button in middle and below the label
-        displayButton.grid(column=1, row=1, sticky=(W,E,N))
+        displayButton.grid(column=1, row=2, sticky=(W,E,N))
 
         pass
 
@@ -131,6 +156,15 @@ class Display():
         self.textvariable.set(basename(self.__file))
         pass
 
+    def set_thumbnail(self, data) -> None:
+        '''
+        Shows a thumbnail above the file name.
+            - data (bytes): PNG image, None to clear the thumbnail
+        '''
+        self.thumbnail = PhotoImage(data=base64.b64encode(data)) if data else None
+        self.previewLabel.configure(image=self.thumbnail or '')
+        pass
+
     def browse_button(self) -> None:
         '''
         The displayButton command function which is called when the button is pressed. It opens
@@ -141,7 +175,10 @@ class Display():
         filename = filename.replace("/", "\\")
 
         if len(filename)>0:
-            self.update_file(filename)
+            if self.on_browse:
+                self.on_browse(self, filename)
+            else:
+                self.update_file(filename)
         pass
 
     def browse_button_state(self, trigger) -> None:
@@ -172,7 +209,8 @@ class Display():
         '''
         The key is used to find the Display object that is operated on. Should be a unique identifier 
         '''
-        self.key = key
+        self.key = str(key)
+        Display.by_key[self.key] = self
 
     def get_file(self) -> str:
         '''
@@ -180,25 +218,34 @@ class Display():
         '''
         return self.__file
 
-    def turn_on(self) -> None:
-        '''
-        turns on the screens and sets the global screens_on variable to True
-        '''
-        if self.__file and self.display:
-            vma.turnon_screen(self.__file, self.display)
-
-            global screens_on 
-            screens_on = True
-
-        pass
-
     @classmethod
     def get_display_by_key(cls, find_key) -> list:
         '''
-        class method that returns a list of files paths based on provided key. It can return
+        class method that returns a list with the Display of the provided key. It can return
         an empty list
         '''
-        return [inst for inst in cls.instances if inst.key==int(find_key)]
+        display = cls.by_key.get(str(find_key))
+        return [display] if display else []
+
+
+class LayoutItem():
+    '''
+    One Display of the layout map generated by TV_map.map_display.
+        - display (Display): the UI element of the display
+        - item (str): VLC Qt screen number of the display
+        - trigger (tk.StringVar): variable of the category's Auto checkbox
+        - category (str): category of the display
+        - key (str): key of the display
+    '''
+    __slots__ = ("display", "item", "trigger", "category", "key")
+
+    def __init__(self, display, item, trigger, category, key) -> None:
+        self.display = display
+        self.item = item
+        self.trigger = trigger
+        self.category = category
+        self.key = key
+        pass
 
 
 class MainInterface():
@@ -209,7 +256,7 @@ class MainInterface():
     class TV_map():
         '''
         This class uses the options.json file to establish a link between display-specific UI components
-        and VLC screen numbers. It also updates the options.json file with new manually selected files.
+        and VLC screen numbers.
         
         The map searches for 4 subcategories: HSS, OPEX, QA and PROJ
 
@@ -220,10 +267,13 @@ class MainInterface():
         If accessing TV_Map() inside MainInterface, use self.TV_Map().
         '''
 
-        with open(options_path, 'r') as options_file:
-            options = load(options_file)
+        options = config.options
+        wall = None # compiled by the first TV_map(), once the screens are lit
 
         def __init__(self) -> None:
+            if MainInterface.TV_map.wall is None:
+                # WALL in the DAEMON options picks the wall of an options file with several
+                MainInterface.TV_map.wall = compile_layout(self.options).wall(self.options.get("DAEMON", {}).get("WALL"))
             pass
 
         def map_display(self, trigger_vars: list) -> dict:
@@ -231,8 +281,8 @@ class MainInterface():
             Generates a dictionary which represents the Display array. The dictionary is
             in the following format:
 
-                {HSS: [UI: Display, VLC-disp: (int or str), trigger: str from checkbox, category: str, key: int]
-                OPEX: [UI, VLC-disp, trigger, category, key], ...}
+                {HSS: [LayoutItem(display, item, trigger, category, key), ...],
+                OPEX: [LayoutItem, ...], ...}
 
                 -trigger_vars: list of tk.StringVar() which are associated to the Auto checkboxes.
 
@@ -241,43 +291,39 @@ class MainInterface():
             layout_map = {HSS: [], OPEX: [], QA: [], PROJ: []}
             vars = self.trigger_variables_dict(trigger_vars)
 
-            displays = self.options["DISPLAY_LAYOUT"]
-            qt_map = self.options["HARDWARE_QT_MAP"]
-            primary_disp = self.options["PRIMARY_DISPLAY"]
-
-            for category in layout_map:
-                for key in displays[category]:
-                    item = qt_map[primary_disp][key]
-
-                    disp = Display.get_display_by_key(key)[0]
-                    disp.set_display(item)
-                    layout_map[category].append([disp, item, vars[category], category, key])
+            for slot in self.wall.slots:
+                disp = Display.by_key[slot.key]
+                disp.set_display(slot.display)
+                layout_map[slot.category].append(LayoutItem(disp, slot.display, vars[slot.category], slot.category, slot.key))
 
             return layout_map
 
         def trigger_variables_dict(self, trigger_vars):
             return {HSS: trigger_vars[0], OPEX: trigger_vars[1], QA: trigger_vars[2], PROJ: trigger_vars[3]}
 
-        def manage_files(self, layout_items) -> None:
-            for layout_item in layout_items:
-                if layout_item[2].get() == "manual":
-                    self.options["DISPLAY_LAYOUT"][layout_item[3]][layout_item[4]]["last_file"] = layout_item[0].get_file()
-
-            update_options(self.options)
-            pass
-
-        def get_last_files(self, layout_items):
-            for layout_item in layout_items:
-                if layout_item[2].get() == "manual":
-                    layout_item[0].get_file()
 
+    def __init__(self, root, service=None) -> None:
 
-    def __init__(self, root) -> None:
+        # the wall is driven by the controller service, this window is only a client of its API
+        wall = self.TV_map().wall
+        daemon_options = wall.options.get("DAEMON", {})
+        self.service = service or start_service()
+        self.client = Daemon.DaemonClient(daemon_options.get("HOST", Daemon.HOST), daemon_options.get("PORT", Daemon.PORT),
+                                          token=daemon_options.get("TOKEN", ""))
 
         # root
         root.title("Visual Management Area") # options.json
         root.geometry('1280x480')
 
+        # runs the blocking actions in the background and hands their results back to the Tk thread
+        self.buttons = {}
+        self.worker = Worker(root, on_busy=self.busy_update, on_error=self.action_failed)
+        self.statusText = StringVar(value='Ready')
+
+        # previews of the displayed files, rendered in the background
+        import Thumbnails
+        self.thumbnails = Thumbnails.ThumbnailCache(os.path.join(vma.ROOT, Thumbnails.CACHE_NAME))
+
         root.columnconfigure(0, weight=1)
         root.rowconfigure(0, weight=1)
 
@@ -299,21 +345,18 @@ class MainInterface():
         # widgets
         #   Frames:
 
-        disp10 = Display(displayFrame, key=7)
-        disp11 = Display(displayFrame, key=8)
-        disp4 = Display(displayFrame, key=5)
-        disp5 = Display(displayFrame, key=3)
-        disp6 = Display(displayFrame, key=4)
-        disp7 = Display(displayFrame, key=1)
-        disp8 = Display(displayFrame, key=2)
-        disp9 = Display(displayFrame, key=6)
+        for slot in wall.slots:
+            Display(displayFrame, key=slot.key)
 
         #       Initiate UI LAYOUT
+        self.trigger_vars = self.TV_map().trigger_variables_dict([self.HS_CB_Value, self.OpEx_CB_Value, self.QA_CB_Value, self.Projects_CB_Value])
         layout = self.TV_map()
         layout = layout.map_display([self.HS_CB_Value, self.OpEx_CB_Value, self.QA_CB_Value, self.Projects_CB_Value])
 
-        [self.button_state_update(i, layout) for i in [HSS, OPEX, QA, PROJ]]
-        self.list_files_button(layout)
+        for group in layout:
+            for groupitem in layout[group]:
+                groupitem.display.browse_button_state(groupitem.trigger.get())
+                groupitem.display.on_browse = lambda display, filename: self.browse_file(layout, display, filename)
 
 
         #   Labels:
@@ -327,11 +370,16 @@ class MainInterface():
         projectsCheckbox = ttk.Checkbutton(AutoFrame, text='Projects', variable=self.Projects_CB_Value, onvalue='auto', offvalue='manual', command=lambda: self.button_state_update(PROJ, layout))
 
         #   Buttons:
-        resetButton = ttk.Button(mainframe, text='Restart', command= lambda: self.restart_button(layout))
+        resetButton = ttk.Button(mainframe, text='Restart', command= lambda: self.restart_button(layout, force=True))
         listfilesButton = ttk.Button(mainframe, text='Update Listed Files', command= lambda: self.list_files_button(layout))
         turnoffButton = ttk.Button(mainframe, text='Turn Off', command=self.turnoff_button)
-        autoButton = ttk.Checkbutton(mainframe, text='Auto On/Off', onvalue=True, offvalue=False, variable=self.Auto_CB_Value, command=None)
+        autoButton = ttk.Checkbutton(mainframe, text='Auto On/Off', onvalue=True, offvalue=False, variable=self.Auto_CB_Value, command=lambda: self.auto_button(layout))
         syncButton = ttk.Button(mainframe, text='Sync Files', command=self.sync_files)
+        self.buttons = {"restart": resetButton, "files": listfilesButton, "off": turnoffButton, "sync": syncButton}
+
+        #   Busy indicators:
+        statusLabel = ttk.Label(mainframe, textvariable=self.statusText, anchor='w')
+        self.progressBar = ttk.Progressbar(mainframe, mode='indeterminate')
 
         # grid sizing
         root.columnconfigure(0, weight=1)
@@ -351,9 +399,9 @@ class MainInterface():
             mainframe.rowconfigure(i, weight=8)
 
             #diplayframe sizing
-        for i in range(0,4):
+        for i in range(0, max(slot.column for slot in wall.slots) + 1):
             displayFrame.columnconfigure(i, weight=1)
-        for i in range(0,2):
+        for i in range(0, max(slot.row for slot in wall.slots) + 1):
             displayFrame.rowconfigure(i, weight=1)
 
 
@@ -371,113 +419,184 @@ class MainInterface():
         turnoffButton.grid(column=1, row=5, columnspan=1, sticky=(W,S))
         syncButton.grid(column=7, row=5, sticky=(W, S))
         autoButton.grid(column=6, row=5, sticky=(E,S))
+        statusLabel.grid(column=2, row=5, columnspan=2, sticky=(W,E,S))
+        self.progressBar.grid(column=4, row=5, columnspan=2, sticky=(W,E,S))
 
             #Display frames needed fixing
-        disp10.displayFrame.grid(column=0, row=0, sticky=(W,E,S,N))
-        disp11.displayFrame.grid(column=1, row=0, sticky=(W,E,S,N))
-        disp4.displayFrame.grid(column=2, row=0, sticky=(W,E,S,N))
-        disp5.displayFrame.grid(column=0, row=1, sticky=(W,E,S,N))
-        disp6.displayFrame.grid(column=1, row=1, sticky=(W,E,S,N))
-        disp7.displayFrame.grid(column=2, row=1, sticky=(W,E,S,N))
-        disp8.displayFrame.grid(column=3, row=1, sticky=(W,E,S,N))
-        disp9.displayFrame.grid(column=3, row=0, sticky=(W,E,S,N))
+        for slot in wall.slots:
+            Display.by_key[slot.key].displayFrame.grid(column=slot.column, row=slot.row, sticky=(W,E,S,N))
+
+
 
+        self.poll_status(root, layout)
 
+        # any busy state is shown now that the indicators exist
+        for name in BUSY_TEXT:
+            self.busy_update(name, self.worker.is_busy(name))
+
+    def busy_update(self, name, busy) -> None:
+        '''
+        Called by the worker when an action starts or finishes. Disables the button of a running
+        action and shows the status text and progress bar while anything runs.
+        '''
+        if name in self.buttons:
+            self.buttons[name].state(["disabled"] if busy else ["!disabled"])
 
-        AutoFunction = Thread(target=self.auto_on_off, args=(layout,))
-        AutoFunction.start()
+        if not hasattr(self, "progressBar"):
+            return
+
+        running = [running for running in self.worker.running if running in BUSY_TEXT]
+        if running:
+            self.statusText.set(" ".join(BUSY_TEXT[name] for name in running))
+            self.progressBar.start(10)
+        else:
+            self.progressBar.stop()
+            # keeps the result message of the last action
+            if self.statusText.get().endswith("..."):
+                self.statusText.set("Ready")
+        pass
+
+    def action_failed(self, name, error) -> None:
+        '''
+        Called by the worker on the Tk thread when a background action raises.
+        '''
+        print(f"{name} failed: {error!r}")
+        self.statusText.set(f"{BUSY_TEXT.get(name, name).rstrip('.')} failed: {error}")
+        pass
 
     def button_state_update(self, group, layout) -> None:
+        '''
+        Enables the browse buttons of the group in manual mode and sends the new mode of the
+        group to the controller, which selects its files again.
+        '''
+        mode = self.trigger_vars[group].get()
         for groupitem in layout[group]:
-            groupitem[0].browse_button_state(groupitem[2].get())
-            if groupitem[2].get() == "auto":
-                self.TV_map().manage_files(layout[group])
-                groupitem[0].update_file("")
-        self.list_files_button(layout)
+            groupitem.display.browse_button_state(mode)
+
+        self.worker.submit("files", self.client.set_mode, group, mode, on_done=lambda status: self.show_status(layout, status))
         pass
 
     def turnoff_button(self) -> None:
-        vma.turnoff_screens()
-        global screens_on
-        screens_on = False
+        def done(result):
+            self.statusText.set("Turned off")
+            pass
+
+        self.worker.submit("off", self.client.turn_off, on_done=done)
         pass
 
     def list_files_button(self, layout) -> None:
+        '''
+        Asks the controller to select the newest files of the categories in auto mode and shows
+        them when done.
+        '''
+        self.worker.submit("files", self.client.list_files, on_done=lambda status: self.show_status(layout, status))
+        pass
 
-        for group in layout:
-            if layout[group][0][2].get() == "auto":
-                n_files = len(layout[group])
-                if group == HSS:
-                    files = vma.safety_files(n_files)
-                elif group == OPEX:
-                    files = vma.oe_files(n_files)
-                elif group == QA:
-                    files = vma.quality_files(n_files)
-                elif group == PROJ:
-                    files = vma.projects_files(n_files)
-                else:
-                    quit()
-
-                for i in range(len(files)):
-                    layout[group][i][0].update_file(files[i])
-            
-            elif layout[group][0][2].get() == "manual":
-                if layout[group][0][0].get_file():
-                    self.TV_map().manage_files(layout[group])
-                else:
-                    self.TV_map().get_last_files(layout[group])
+    def restart_button(self, layout, force=False) -> None:
+        '''
+        Asks the controller to launch the displays whose file changed, or every display with
+        force as the Restart button does.
+        '''
+        def done(results):
+            failed = sum(1 for result in results if not result["launched"])
+            self.statusText.set(f"{len(results)} displays started, {failed} failed" if failed else f"{len(results)} displays started")
+            self.update_status(layout)
+            pass
 
+        self.worker.submit("restart", self.client.restart, force, on_done=done)
         pass
 
-    def restart_button(self, layout) -> None:
-        for group in layout:
-            for groupitem in layout[group]:
-                groupitem[0].turn_on()
-            self.TV_map().manage_files(layout[group])
+    def browse_file(self, layout, display, filename) -> None:
+        '''
+        Called when a file is browsed on a Display. Sends it to the controller as the display's
+        manual file.
+        '''
+        self.worker.submit("files", self.client.set_file, display.key, filename, on_done=lambda status: self.show_status(layout, status))
+        pass
+
+    def auto_button(self, layout) -> None:
+        '''
+        Starts the on/off scheduler of the controller when the "Auto On/Off" checkbox is checked
+        and cancels it when it is unchecked.
+        '''
+        self.worker.submit("auto", self.client.set_auto, self.Auto_CB_Value.get(), on_done=lambda status: self.show_status(layout, status))
+        pass
 
-    def auto_on_off(self, layout) -> None:
-        onTime = self.TV_map().options["AUTO"]["On"].split(':') #[0]: hours, [1]: minutes
-        offTime = self.TV_map().options["AUTO"]["Off"].split(':')
+    def sync_files(self):
+        def done(result):
+            if result:
+                self.statusText.set(f"{result['files']} files ({result['bytes']} bytes) synced in {result['seconds']:.1f} s, {len(result['failed'])} failed")
+            else:
+                self.statusText.set("Sync finished")
+            pass
+
+        self.worker.submit("sync", self.client.sync, lane="sync", on_done=done)
+        pass
+
+    def update_status(self, layout) -> None:
+        self.worker.submit("status", self.client.status, lane="status", on_done=lambda status: self.show_status(layout, status))
+        pass
 
-        if onTime[0]==0 and onTime[1]==0 and offTime[0]==0 and offTime[1]==0:
+    def poll_status(self, root, layout) -> None:
+        '''
+        Keeps the window in line with the controller, which also changes the wall on its own
+        (on/off scheduler) or through other clients.
+        '''
+        if not self.worker.is_busy("status"):
+            self.update_status(layout)
+        root.after(STATUS_INTERVAL, self.poll_status, root, layout)
+        pass
+
+    def show_status(self, layout, status) -> None:
+        '''
+        Shows a controller status: the file of every display, the mode of every category and
+        whether the on/off scheduler runs.
+        '''
+        for display in status["displays"]:
+            for disp in Display.get_display_by_key(display["key"]):
+                if disp.get_file() != display["file"]:
+                    disp.update_file(display["file"])
+                    self.request_thumbnail(disp)
+
+        # a mode or auto change still on its way to the controller wins over the status
+        if self.worker.is_busy("files") or self.worker.is_busy("auto"):
             return
 
+        for group, mode in status["modes"].items():
+            if group in self.trigger_vars and self.trigger_vars[group].get() != mode:
+                self.trigger_vars[group].set(mode)
+                for groupitem in layout[group]:
+                    groupitem.display.browse_button_state(mode)
 
-        global screens_on
-
-        while True:
-            while self.Auto_CB_Value.get():
-                currentTime = time.localtime() # [3]: hours, [4]: minutes
-                if screens_on:
-                    if int(currentTime[3]) > int(offTime[0]) or int(currentTime[3]) < int(onTime[0]):
-                        self.turnoff_button()
-                    elif int(currentTime[3]) == int(offTime[0]) and int(currentTime[4]) >= int(offTime[1]):
-                        self.turnoff_button()
-                    elif int(currentTime[3]) == int(onTime[0]) and int(currentTime[4]) <= int(offTime[1]):
-                        self.turnoff_button()
-                else:
-                    if int(currentTime[3]) > int(onTime[0]) and int(currentTime[3]) < int(offTime[0]):
-                        self.list_files_button(layout)
-                        self.restart_button(layout)
-                    elif int(currentTime[3]) == int(onTime[0]) and int(currentTime[4]) > int(onTime[1]):
-                        self.list_files_button(layout)
-                        self.restart_button(layout)
-                    elif int(currentTime[3]) == int(offTime[0]) and int(currentTime[4]) < int(offTime[1]):
-                        self.list_files_button(layout)                        
-                        self.restart_button(layout)
-                time.sleep(120)
-            time.sleep(10)
-
-    
-    def sync_files(self):
-        vma.sync_files("C:\\VM_Tasks\\xcopy_VM.cmd")
+        self.Auto_CB_Value.set(status["auto"])
         pass
 
-if __name__ == "__main__":
+    def request_thumbnail(self, display) -> None:
+        '''
+        Clears the thumbnail of a display whose file changed and has the new one rendered in
+        the background, it is shown when it is ready.
+        '''
+        display.set_thumbnail(None)
+        self.thumbnails.request(display.get_file(), lambda path, data: self.worker.call_in_ui(self.show_thumbnail, display, path, data))
+        pass
+
+    def show_thumbnail(self, display, path, data) -> None:
+        # the display may have moved on to another file while this one was rendered
+        if display.get_file() == path:
+            display.set_thumbnail(data)
+        pass
+
+def main() -> None:
+    # the screens come back before the window and the thumbnails are built
+    service = start_service()
 
     root = Tk()
     root.title("Visual Management Area")
 
-    interfa = MainInterface(root)
+    MainInterface(root, service)
 
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    pass
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENT = 4
+STAGGER = 0.25 # seconds between two launch starts
+
+LaunchResult = namedtuple('LaunchResult', ['key', 'launched', 'latency', 'error'])
+LaunchResult.__doc__ = '''
+Outcome of one display launch.
+    - key: key of the launched display
+    - launched (bool): True if the launch callable reported success
+    - latency (float): seconds the launch callable took
+    - error (Exception or None): exception raised by the launch callable, if any
+'''
+
+
+def _launch(key, launch, not_before) -> LaunchResult:
+    delay = not_before - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+    start = time.monotonic()
+    try:
+        launched = bool(launch())
+        error = None
+    except Exception as e:
+        launched = False
+        error = e
+
+    return LaunchResult(key, launched, time.monotonic() - start, error)
+
+
+def launch_all(launches, max_concurrent=MAX_CONCURRENT, stagger=STAGGER) -> list:
+    '''
+    Runs the launch callables in parallel and returns once every one of them has finished
+    or failed.
+
+        - launches: iterable of (key, callable) pairs. The callable starts one display and
+          returns True if it did.
+        - max_concurrent (int): maximum number of launches running at the same time.
+        - stagger (float): minimum seconds between the start of two consecutive launches so
+          the decoders do not all start in the same instant. 0 disables it.
+
+    Returns a list of LaunchResult in the same order as launches.
+    '''
+    launches = list(launches)
+    if not launches:
+        return []
+
+    first = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrent, len(launches)))) as executor:
+        futures = [executor.submit(_launch, key, launch, first + i*stagger)
+                   for i, (key, launch) in enumerate(launches)]
+
+        return [future.result() for future in futures]
+
+
+def report(results) -> str:
+    '''
+    Formats the launch results as one line per display with its latency.
+    '''
+    lines = []
+    for result in results:
+        if result.error:
+            status = f'failed ({result.error})'
+        elif result.launched:
+            status = 'launched'
+        else:
+            status = 'skipped'
+        lines.append(f'{result.key}: {status} in {result.latency*1000:.0f} ms')
+
+    return '\n'.join(lines)
@@ -0,0 +1,139 @@
+COLUMNS = 4 # tiles per row in the UI when a display has no Row/Column
+
+# options a wall entry of WALLS can override, the top level values are used otherwise
+WALL_OPTIONS = ("DISPLAY_LAYOUT", "HARDWARE_QT_MAP", "PRIMARY_DISPLAY", "AUTO", "DAEMON", "PLAYER", "LAUNCH", "SYNC", "WATCHDOG", "VARIANTS", "PREFETCH", "PLAYLISTS", "METRICS", "AGENT", "COMPOSITOR")
+
+MAIN_WALL = "main"
+
+
+class Slot():
+    '''
+    One display of a wall, compiled from its DISPLAY_LAYOUT entry.
+        - wall (str): name of the wall
+        - category (str): category of the display (hss, opex, ...)
+        - key (str): physical identifier of the display, unique within the wall
+        - display (str): Qt screen number used by VLC
+        - row, column (int): position of the display tile in the UI
+        - index (int): position of the slot in WallLayout.slots
+        - options_path (tuple): keys of the display's entry in options.json
+    '''
+    __slots__ = ("wall", "category", "key", "display", "row", "column", "index", "options_path")
+
+    def __init__(self, wall, category, key, display, row, column, index, options_path) -> None:
+        self.wall = wall
+        self.category = category
+        self.key = key
+        self.display = display
+        self.row = row
+        self.column = column
+        self.index = index
+        self.options_path = options_path
+        pass
+
+    def __repr__(self) -> str:
+        return f"Slot({self.wall!r}, {self.category!r}, {self.key!r}, display={self.display!r})"
+
+
+class WallLayout():
+    '''
+    Compiled layout of one wall with its slots indexed by key and category, so finding a
+    display costs the same on a 40 screen wall as on an 8 screen one.
+        - name (str): name of the wall
+        - slots (tuple): every Slot of the wall, in options order
+        - by_key (dict): key: Slot
+        - by_category (dict): category: tuple of Slot
+        - options (dict): options of the wall, the top level options merged with its WALLS entry
+    '''
+    __slots__ = ("name", "slots", "by_key", "by_category", "options")
+
+    def __init__(self, name, slots, options) -> None:
+        self.name = name
+        self.slots = tuple(slots)
+        self.options = options
+
+        self.by_key = {slot.key: slot for slot in self.slots}
+        if len(self.by_key) != len(self.slots):
+            raise ValueError(f"wall {name} uses a display key twice")
+
+        by_category = {}
+        for slot in self.slots:
+            by_category.setdefault(slot.category, []).append(slot)
+        self.by_category = {category: tuple(slots) for category, slots in by_category.items()}
+        pass
+
+    def keys(self, category) -> list:
+        return [slot.key for slot in self.by_category.get(category, ())]
+
+
+class Layout():
+    '''
+    Every wall of an options file, by name.
+    '''
+    __slots__ = ("walls",)
+
+    def __init__(self, walls) -> None:
+        self.walls = walls
+        pass
+
+    def wall(self, name=None) -> WallLayout:
+        '''
+        Returns the wall called name, or the first wall if name is None.
+        '''
+        if name is None:
+            return next(iter(self.walls.values()))
+        return self.walls[name]
+
+
+def wall_options(options, name) -> dict:
+    '''
+    Returns the options of the wall name: the top level options with the WALL_OPTIONS of its
+    WALLS entry. Without WALLS the top level options are the single MAIN_WALL.
+    '''
+    walls = options.get("WALLS")
+    if not walls:
+        return options
+
+    merged = dict(options)
+    merged.update({key: value for key, value in walls[name].items() if key in WALL_OPTIONS})
+    return merged
+
+
+def _compile_wall(name, options, options_prefix) -> WallLayout:
+    qt_map = options["HARDWARE_QT_MAP"][options["PRIMARY_DISPLAY"]]
+
+    slots = []
+    for category, displays in options["DISPLAY_LAYOUT"].items():
+        for key, entry in displays.items():
+            position = len(slots)
+            row = entry.get("Row", position // COLUMNS)
+            column = entry.get("Column", position % COLUMNS)
+            display = entry.get("Qt", qt_map.get(key))
+            if display is None:
+                raise ValueError(f"display {key} of wall {name} is not in HARDWARE_QT_MAP")
+
+            slots.append(Slot(name, category, str(key), str(display), int(row), int(column), position,
+                              options_prefix + ("DISPLAY_LAYOUT", category, key)))
+
+    return WallLayout(name, slots, options)
+
+
+def compile_layout(options) -> Layout:
+    '''
+    Compiles the walls of the options once, at start-up. An options file either describes one
+    wall with the top level DISPLAY_LAYOUT/HARDWARE_QT_MAP/PRIMARY_DISPLAY, or several under
+    WALLS, where each wall can override any of WALL_OPTIONS:
+
+        "WALLS": {
+            "canteen": {"DISPLAY_LAYOUT": {...}, "PRIMARY_DISPLAY": "1", "DAEMON": {"PORT": 8766}}
+        }
+
+    A display entry of DISPLAY_LAYOUT can give the tile position with "Row" and "Column" and
+    its Qt screen number with "Qt" instead of HARDWARE_QT_MAP.
+    '''
+    walls = options.get("WALLS")
+    if not walls:
+        # a copy, so the compiled wall keeps its options when the store replaces them in place
+        return Layout({MAIN_WALL: _compile_wall(MAIN_WALL, dict(options), ())})
+
+    return Layout({name: _compile_wall(name, wall_options(options, name), ("WALLS", name) if "DISPLAY_LAYOUT" in walls[name] else ())
+                   for name in walls})
@@ -0,0 +1,293 @@
+import os
+import threading
+from bisect import bisect_left, insort
+from fnmatch import fnmatch
+from heapq import merge, nlargest
+from itertools import chain
+
+from Metrics import metrics
+
+try:
+    # optional: native filesystem change notifications
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+MP4 = '*.mp4'
+PNG = '*.png'
+
+POLL_INTERVAL = 30 # seconds between rescans when watchdog is not available
+
+indexes = {}
+indexes_lock = threading.Lock()
+listeners = [] # callable(folder, changed, removed) called after an index changed
+
+
+class _IndexEventHandler(FileSystemEventHandler):
+    '''
+    Forwards watchdog events of a single folder to its MediaIndex.
+    '''
+    def __init__(self, index) -> None:
+        self.index = index
+        pass
+
+    def on_created(self, event) -> None:
+        if not event.is_directory:
+            self.index.update(event.src_path)
+        pass
+
+    def on_modified(self, event) -> None:
+        if not event.is_directory:
+            self.index.update(event.src_path)
+        pass
+
+    def on_deleted(self, event) -> None:
+        if not event.is_directory:
+            self.index.remove(event.src_path)
+        pass
+
+    def on_moved(self, event) -> None:
+        if not event.is_directory:
+            self.index.remove(event.src_path)
+            self.index.update(event.dest_path)
+        pass
+
+
+class MediaIndex():
+    '''
+    In-memory index of the media files of one category folder. The folder is listed once when
+    the index is built and after that it is kept up to date by filesystem change notifications
+    (watchdog) or, if watchdog is not installed, by a background thread that rescans the folder
+    every poll_interval seconds.
+
+    For every pattern (MP4, PNG, ...) the index keeps a list of (mtime, path) tuples sorted by
+    mtime, so newest() answers without touching the disk.
+
+        - folder (str): folder to index. Only files directly inside it are indexed, like glob.
+        - patterns (tuple): glob-style patterns of the files that are indexed.
+        - poll_interval (int): seconds between rescans for the polling fallback.
+    '''
+    def __init__(self, folder, patterns=(MP4, PNG), poll_interval=POLL_INTERVAL) -> None:
+        self.folder = folder
+        self.patterns = tuple(patterns)
+        self.poll_interval = poll_interval
+
+        self._lock = threading.RLock()
+        self._mtimes = {} # path: mtime
+        self._sorted = {pattern: [] for pattern in self.patterns} # pattern: [(mtime, path), ...]
+
+        self._observer = None
+        self._poller = None
+        self._stop = threading.Event()
+
+        self.rescan()
+        pass
+
+    def _matching_patterns(self, path) -> list:
+        name = os.path.basename(path)
+        # glob does not return hidden files
+        if name.startswith('.'):
+            return []
+        return [pattern for pattern in self.patterns if fnmatch(name, pattern)]
+
+    def _insert(self, path, mtime) -> None:
+        self._mtimes[path] = mtime
+        for pattern in self._matching_patterns(path):
+            insort(self._sorted[pattern], (mtime, path))
+        pass
+
+    def _discard(self, path) -> None:
+        mtime = self._mtimes.pop(path, None)
+        if mtime is None:
+            return
+
+        for pattern in self._matching_patterns(path):
+            entries = self._sorted[pattern]
+            i = bisect_left(entries, (mtime, path))
+            if i < len(entries) and entries[i] == (mtime, path):
+                del entries[i]
+        pass
+
+    def rescan(self) -> tuple:
+        '''
+        Lists the folder once and reconciles the index with it. os.scandir gets the mtimes
+        with the listing on Windows, so it does not cost one stat call per file like
+        sorted(..., key=os.path.getmtime) does.
+
+        Returns (changed, removed): the paths that were added or modified and the paths that
+        disappeared since the last scan.
+        '''
+        seen = {}
+        label = os.path.basename(os.path.normpath(self.folder))
+        with metrics.timer("vma_folder_scan_seconds", folder=label):
+            try:
+                with os.scandir(self.folder) as entries:
+                    for entry in entries:
+                        if not self._matching_patterns(entry.name):
+                            continue
+                        try:
+                            if entry.is_file():
+                                seen[os.path.join(self.folder, entry.name)] = entry.stat().st_mtime
+                        except OSError:
+                            # file removed while listing
+                            continue
+            except OSError:
+                # missing or unreachable folder behaves like an empty glob
+                pass
+        metrics.inc("vma_files_considered_total", len(seen), folder=label, stage="scan")
+
+        changed, removed = [], []
+        with self._lock:
+            for path in list(self._mtimes):
+                if path not in seen:
+                    self._discard(path)
+                    removed.append(path)
+
+            for path, mtime in seen.items():
+                if self._mtimes.get(path) != mtime:
+                    self._discard(path)
+                    self._insert(path, mtime)
+                    changed.append(path)
+
+        self._notify(changed, removed)
+        return changed, removed
+
+    def _notify(self, changed, removed) -> None:
+        if not changed and not removed:
+            return
+        for listener in list(listeners):
+            try:
+                listener(self.folder, changed, removed)
+            except Exception as e:
+                # a failing listener must not stop the index updates
+                print(f"index listener failed: {e!r}")
+        pass
+
+    def update(self, path) -> None:
+        '''
+        Adds or refreshes a single file in the index. Paths outside the folder or not matching
+        any pattern are ignored.
+        '''
+        path = os.path.join(self.folder, os.path.basename(path))
+        if not self._matching_patterns(path):
+            return
+
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self.remove(path)
+            return
+
+        with self._lock:
+            if self._mtimes.get(path) == mtime:
+                return
+            self._discard(path)
+            self._insert(path, mtime)
+        self._notify([path], [])
+        pass
+
+    def remove(self, path) -> None:
+        '''
+        Removes a single file from the index.
+        '''
+        path = os.path.join(self.folder, os.path.basename(path))
+        with self._lock:
+            if path not in self._mtimes:
+                return
+            self._discard(path)
+        self._notify([], [path])
+        pass
+
+    def newest(self, n, patterns=None, accept=None) -> list:
+        '''
+        Returns the paths of the n newest files matching any of the patterns, sorted from the
+        oldest to the newest, the same order as sorted(glob(...), key=os.path.getmtime)[-n:].
+            - accept: callable(path) that returns False for a file that must not be selected,
+              e.g. MediaProbe's is_valid. The next newest accepted file takes its place.
+        '''
+        if n <= 0:
+            return []
+
+        patterns = self.patterns if patterns is None else patterns
+        if accept is None:
+            with self._lock:
+                # the newest n of every pattern is enough to find the newest n overall
+                candidates = set(chain.from_iterable(self._sorted[pattern][-n:] for pattern in patterns))
+                newest = nlargest(n, candidates)
+            return [path for mtime, path in reversed(newest)]
+
+        with self._lock:
+            # a copy, accept may take a while and the index must keep taking updates
+            entries = [list(self._sorted[pattern]) for pattern in patterns]
+
+        newest, considered = [], 0
+        for mtime, path in merge(*(reversed(entry) for entry in entries), reverse=True):
+            considered += 1
+            if path not in newest and accept(path):
+                newest.append(path)
+                if len(newest) == n:
+                    break
+
+        metrics.inc("vma_files_considered_total", considered, folder=os.path.basename(os.path.normpath(self.folder)), stage="select")
+        return newest[::-1]
+
+    def __len__(self) -> int:
+        return len(self._mtimes)
+
+    def watch(self) -> None:
+        '''
+        Starts keeping the index up to date in the background. Uses watchdog when it is
+        installed and falls back to polling otherwise.
+        '''
+        if self._observer or self._poller:
+            return
+
+        self._stop.clear()
+        if Observer is not None and os.path.isdir(self.folder):
+            try:
+                self._observer = Observer()
+                self._observer.daemon = True
+                self._observer.schedule(_IndexEventHandler(self), self.folder, recursive=False)
+                self._observer.start()
+                # catches changes made between the first scan and the observer start
+                self.rescan()
+                return
+            except OSError:
+                self._observer = None
+
+        self._poller = threading.Thread(target=self._poll, daemon=True)
+        self._poller.start()
+        pass
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            self.rescan()
+        pass
+
+    def stop(self) -> None:
+        '''
+        Stops the background updates started by watch().
+        '''
+        self._stop.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer = None
+        self._poller = None
+        pass
+
+
+def get_index(folder, patterns=(MP4, PNG)) -> MediaIndex:
+    '''
+    Returns the shared MediaIndex of the folder. The index is built and starts watching the
+    folder on the first call, every other call answers from memory.
+    '''
+    with indexes_lock:
+        index = indexes.get(folder)
+        if index is None:
+            index = MediaIndex(folder, patterns)
+            index.watch()
+            indexes[folder] = index
+
+    return index
@@ -0,0 +1,268 @@
+import os
+import sqlite3
+import struct
+import threading
+from collections import namedtuple
+
+CACHE_NAME = ".vma_probe_cache.sqlite"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_END = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+caches = {}
+caches_lock = threading.Lock()
+
+ProbeResult = namedtuple('ProbeResult', ['valid', 'kind', 'duration', 'width', 'height', 'error'])
+ProbeResult.__doc__ = '''
+What the probe found out about a media file.
+    - valid (bool): True if the file can be sent to a display
+    - kind (str): "mp4", "png" or "" if the file is neither
+    - duration (float): seconds of the movie, None for an image and for a fragmented movie
+      that does not state its length
+    - width, height (int): resolution of the picture or of the video track
+    - error (str): why the file is not valid, None if it is
+'''
+
+
+def _invalid(kind, error) -> ProbeResult:
+    return ProbeResult(False, kind, None, 0, 0, error)
+
+
+def _boxes(f, start, end):
+    '''
+    Yields (type, payload start, box end) of the ISO media boxes between start and end.
+    Raises ValueError if a box runs past end, which is what a half uploaded file looks like.
+    '''
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            # the last box runs to the end of the file
+            size = end - offset
+        if size < header:
+            raise ValueError(f"box {kind.decode(errors='replace')} has a bad size")
+        if offset + size > end:
+            raise ValueError(f"box {kind.decode(errors='replace')} is truncated")
+
+        yield kind, offset + header, offset + size
+        offset += size
+    pass
+
+
+def _probe_mp4(f, size) -> ProbeResult:
+    top = {kind: (start, end) for kind, start, end in _boxes(f, 0, size)}
+    for required in (b"ftyp", b"moov", b"mdat"):
+        if required not in top:
+            return _invalid("mp4", f"no {required.decode()} box")
+
+    timescale, length, fragments_length, width, height = 0, 0, 0, 0, 0
+    for kind, start, end in _boxes(f, *top[b"moov"]):
+        if kind == b"mvhd":
+            f.seek(start)
+            version = f.read(4)[0]
+            if version == 1:
+                _, _, timescale, length = struct.unpack(">QQIQ", f.read(28))
+            else:
+                _, _, timescale, length = struct.unpack(">IIII", f.read(16))
+        elif kind == b"mvex":
+            # a fragmented movie has a zero mvhd duration, mehd has the length of its fragments
+            for extends_kind, extends_start, extends_end in _boxes(f, start, end):
+                if extends_kind == b"mehd":
+                    f.seek(extends_start)
+                    version = f.read(4)[0]
+                    fragments_length, = struct.unpack(">Q" if version == 1 else ">I", f.read(8 if version == 1 else 4))
+        elif kind == b"trak":
+            for track_kind, track_start, track_end in _boxes(f, start, end):
+                if track_kind == b"tkhd":
+                    # 16.16 fixed point width and height end the track header
+                    f.seek(track_end - 8)
+                    track_width, track_height = struct.unpack(">II", f.read(8))
+                    if track_width >> 16 > width:
+                        width, height = track_width >> 16, track_height >> 16
+
+    duration = (length or fragments_length) / timescale if timescale else None
+    if not duration and b"moof" not in top:
+        return _invalid("mp4", "no duration")
+    duration = duration or None
+    if not width or not height:
+        return ProbeResult(False, "mp4", duration, 0, 0, "no video track")
+
+    return ProbeResult(True, "mp4", duration, width, height, None)
+
+
+def _probe_png(f, size) -> ProbeResult:
+    header = f.read(24)
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b"IHDR":
+        return _invalid("png", "not a PNG file")
+
+    width, height = struct.unpack(">II", header[16:24])
+    if not width or not height:
+        return _invalid("png", "empty picture")
+
+    f.seek(max(0, size - len(PNG_END)))
+    if f.read() != PNG_END:
+        return ProbeResult(False, "png", None, width, height, "no IEND chunk, the file is truncated")
+
+    return ProbeResult(True, "png", None, width, height, None)
+
+
+def probe(path) -> ProbeResult:
+    '''
+    Checks the container or image headers of a media file without decoding it: the box
+    structure, duration and video resolution of an mp4, the signature, size and IEND chunk of
+    a PNG. Only the headers are read, never the media data. A fragmented mp4 has its duration
+    in mehd, or none at all, and is valid with moof boxes.
+    '''
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            start = f.read(12)
+            f.seek(0)
+            if start[:8] == PNG_SIGNATURE:
+                return _probe_png(f, size)
+            if start[4:8] == b"ftyp":
+                return _probe_mp4(f, size)
+    except (ValueError, struct.error, IndexError) as e:
+        return _invalid(os.path.splitext(path)[1].lstrip(".").lower(), str(e) or "bad header")
+    except OSError as e:
+        return _invalid("", str(e))
+
+    return _invalid("", "unknown file type")
+
+
+class ProbeCache():
+    '''
+    Persistent cache of probe() results keyed by (path, size, mtime), so every file is probed
+    once and again only after it changed. The results live in a sqlite file, with the results
+    of this run also kept in memory. If the sqlite file cannot be opened the cache only lives
+    in memory.
+
+    It also keeps the content hashes other caches compute, e.g. the one that names the media
+    variants, under the same key, so a file is not read in full again on every start.
+
+        - path (str): sqlite file of the cache
+    '''
+    def __init__(self, path) -> None:
+        self.path = path
+        self.probes = 0 # files probed since the cache was opened
+
+        self._memory = {} # path: (size, mtime, ProbeResult)
+        self._hashes = {} # path: (size, mtime, content hash)
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS probes (path TEXT PRIMARY KEY, size INTEGER, mtime REAL,"
+                             " valid INTEGER, kind TEXT, duration REAL, width INTEGER, height INTEGER, error TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, hash TEXT)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"probe cache {path} not available, probing in memory only: {e}")
+            self._db = None
+        pass
+
+    def _lookup(self, path, size, mtime) -> ProbeResult:
+        entry = self._memory.get(path)
+        if entry and entry[:2] == (size, mtime):
+            return entry[2]
+
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT size, mtime, valid, kind, duration, width, height, error FROM probes WHERE path = ?",
+                               (path,)).fetchone()
+        if row is None or tuple(row[:2]) != (size, mtime):
+            return None
+
+        result = ProbeResult(bool(row[2]), *row[3:])
+        self._memory[path] = (size, mtime, result)
+        return result
+
+    def check(self, path) -> ProbeResult:
+        '''
+        Returns the probe result of the file, probing it only if it is not in the cache with
+        its current size and mtime.
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            return _invalid("", str(e))
+
+        with self._lock:
+            result = self._lookup(path, stat.st_size, stat.st_mtime)
+        if result is not None:
+            return result
+
+        result = probe(path)
+        with self._lock:
+            self.probes += 1
+            self._memory[path] = (stat.st_size, stat.st_mtime, result)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     (path, stat.st_size, stat.st_mtime, *result))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"probe cache {self.path} not updated: {e}")
+
+        if not result.valid:
+            print(f"{path} skipped: {result.error}")
+        return result
+
+    def is_valid(self, path) -> bool:
+        return self.check(path).valid
+
+    def known_hash(self, path, size, mtime):
+        '''
+        Returns the content hash remembered for the file at this size and mtime, or None.
+        '''
+        with self._lock:
+            entry = self._hashes.get(path)
+            if entry and entry[:2] == (size, mtime):
+                return entry[2]
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT size, mtime, hash FROM hashes WHERE path = ?", (path,)).fetchone()
+            if row is None or tuple(row[:2]) != (size, mtime):
+                return None
+
+            self._hashes[path] = tuple(row)
+            return row[2]
+
+    def remember_hash(self, path, size, mtime, digest) -> None:
+        '''
+        Remembers the content hash of the file at this size and mtime, see known_hash().
+        '''
+        with self._lock:
+            self._hashes[path] = (size, mtime, digest)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", (path, size, mtime, digest))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"probe cache {self.path} not updated: {e}")
+        pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        pass
+
+
+def get_cache(folder) -> ProbeCache:
+    '''
+    Returns the shared ProbeCache stored in folder, usually the media root.
+    '''
+    path = os.path.join(folder, CACHE_NAME)
+    with caches_lock:
+        cache = caches.get(path)
+        if cache is None:
+            cache = ProbeCache(path)
+            caches[path] = cache
+
+    return cache
@@ -0,0 +1,226 @@
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from SyncEngine import file_hash
+
+try:
+    # optional: renders the image variants
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+FOLDER_NAME = ".vma_variants"
+WIDTH, HEIGHT = 1920, 1080
+MAX_BYTES = 2 * 1024**3
+FFMPEG_TIMEOUT = 3600
+
+IMAGES = (".png",)
+VIDEOS = (".mp4",)
+
+
+class VariantCache():
+    '''
+    On-disk cache of media variants rendered at the native size of the displays and already
+    cropped to their aspect ratio, so the players show them without scaling. Variants are
+    named after the content hash of their source, so a source that changes gets a new variant
+    and copies of a file share one. The hashes are kept in the probe cache under (path, size,
+    mtime), so a source is read in full once and not again after a restart. The least recently
+    used variants are evicted when the cache grows over max_bytes, except the ones playing.
+
+    Images are rendered with Pillow and videos with a local ffmpeg. A kind of media whose
+    renderer is not installed is simply played from the source.
+
+        - folder (str): folder of the variants
+        - probes (MediaProbe.ProbeCache): probe results giving the size of the sources, and
+          the content hashes of the sources
+        - width, height (int): native resolution of the displays
+        - max_bytes (int): size the cache is trimmed to after every render
+        - ffmpeg (str): ffmpeg executable, looked up on PATH if None
+        - playing (callable): returns the paths of the variants the players show, they are not
+          evicted
+    '''
+    def __init__(self, folder, probes, width=WIDTH, height=HEIGHT, max_bytes=MAX_BYTES, ffmpeg=None, playing=None) -> None:
+        self.folder = folder
+        self.probes = probes
+        self.width = width
+        self.height = height
+        self.max_bytes = max_bytes
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.playing = playing or (lambda: ())
+
+        self._hashes = {} # source path: (size, mtime, "") for the sources that need no variant
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="variants")
+        pass
+
+    def can_render(self, path) -> bool:
+        extension = os.path.splitext(path)[1].lower()
+        return (extension in IMAGES and Image is not None) or (extension in VIDEOS and self.ffmpeg is not None)
+
+    def _variant_path(self, digest, path) -> str:
+        return os.path.join(self.folder, f"{digest[:32]}-{self.width}x{self.height}{os.path.splitext(path)[1].lower()}")
+
+    def _known_hash(self, path):
+        '''
+        Returns the content hash of the source if it was computed for its current size and
+        mtime, "" if the source needs no variant and None if it is not known yet.
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._hashes.get(path)
+        if entry and entry[:2] == (stat.st_size, stat.st_mtime):
+            return entry[2]
+        return self.probes.known_hash(path, stat.st_size, stat.st_mtime)
+
+    def lookup(self, path):
+        '''
+        Returns the path of the fresh variant of the source, or None if there is none yet.
+        Does not read the source, so it is cheap enough for the launch path.
+        '''
+        digest = self._known_hash(path)
+        if not digest:
+            return None
+
+        variant = self._variant_path(digest, path)
+        try:
+            # the mtime of a variant is its last use, see _evict
+            os.utime(variant)
+        except OSError:
+            return None
+        return variant
+
+    def prefer(self, path) -> str:
+        '''
+        Returns the variant of the source if it is rendered, otherwise queues its rendering
+        and returns the source itself.
+        '''
+        if not path or not self.can_render(path):
+            return path
+
+        variant = self.lookup(path)
+        if variant or self._known_hash(path) == "":
+            return variant or path
+
+        self.submit(path)
+        return path
+
+    def submit(self, path) -> None:
+        '''
+        Queues the rendering of the variant of the source in the background.
+        '''
+        if not path or not self.can_render(path):
+            return
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+
+        self._executor.submit(self._render_queued, path)
+        pass
+
+    def _render_queued(self, path) -> None:
+        try:
+            self.render(path)
+        except Exception as e:
+            print(f"variant of {path} not rendered: {e!r}")
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+        pass
+
+    def render(self, path):
+        '''
+        Renders the variant of the source if it is missing. Returns the variant path, or None
+        if the source is already at the displays' size or its headers are not valid.
+        '''
+        stat = os.stat(path)
+        probe = self.probes.check(path)
+        if not probe.valid or (probe.width, probe.height) == (self.width, self.height):
+            with self._lock:
+                # nothing to render, the source is played as it is
+                self._hashes[path] = (stat.st_size, stat.st_mtime, "")
+            return None
+
+        digest = self._known_hash(path)
+        if not digest:
+            digest = file_hash(path)
+            self.probes.remember_hash(path, stat.st_size, stat.st_mtime, digest)
+
+        variant = self._variant_path(digest, path)
+        if os.path.exists(variant):
+            return variant
+
+        os.makedirs(self.folder, exist_ok=True)
+        folder, name = os.path.split(variant)
+        temp = os.path.join(folder, "." + name)
+        try:
+            if os.path.splitext(path)[1].lower() in IMAGES:
+                self._render_image(path, temp)
+            else:
+                self._render_video(path, temp)
+            os.replace(temp, variant)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+
+        self._evict()
+        return variant
+
+    def _render_image(self, source, destination) -> None:
+        with Image.open(source) as image:
+            # scales to cover the display and crops the overflow, like --crop does at play time
+            ImageOps.fit(image.convert("RGB"), (self.width, self.height), Image.LANCZOS).save(destination, "PNG")
+        pass
+
+    def _render_video(self, source, destination) -> None:
+        scale = (f"scale={self.width}:{self.height}:force_original_aspect_ratio=increase,"
+                 f"crop={self.width}:{self.height},setsar=1")
+        subprocess.run([self.ffmpeg, "-nostdin", "-y", "-loglevel", "error", "-i", source, "-vf", scale,
+                        "-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-c:a", "copy",
+                        "-movflags", "+faststart", "-f", "mp4", destination],
+                       check=True, timeout=FFMPEG_TIMEOUT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        pass
+
+    def _evict(self) -> None:
+        '''
+        Removes the least recently used variants until the cache fits in max_bytes. The
+        variants playing are kept even if the cache stays over max_bytes.
+        '''
+        playing = {os.path.normcase(os.path.abspath(path)) for path in self.playing() if path}
+        entries = []
+        try:
+            with os.scandir(self.folder) as scan:
+                for entry in scan:
+                    if entry.is_file() and not entry.name.startswith("."):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        # the variants playing count towards the size, they are only not removed
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if os.path.normcase(os.path.abspath(path)) in playing:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        pass
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        pass
@@ -0,0 +1,173 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+WRITE_INTERVAL = 15 # seconds between two writes of the metrics text file
+PLAY_LOG_BYTES = 10 * 1024**2
+PLAY_LOG_BACKUPS = 5
+
+# name: (Prometheus type, help)
+DEFINITIONS = {
+    "vma_folder_scan_seconds": ("summary", "Time to list a media folder."),
+    "vma_files_considered_total": ("counter", "Media files looked at by the folder scans and the selectors."),
+    "vma_launch_seconds": ("summary", "Time to start the media of a display."),
+    "vma_launch_failures_total": ("counter", "Display launches that failed."),
+    "vma_restart_seconds": ("summary", "Wall time of a restart of the wall."),
+    "vma_off_seconds": ("summary", "Wall time of turning the wall or a category off."),
+    "vma_sync_seconds": ("summary", "Wall time of a media sync."),
+    "vma_sync_bytes_total": ("counter", "Bytes copied by the media syncs."),
+    "vma_sync_failures_total": ("counter", "Files a media sync could not copy."),
+    "vma_sync_deduplicated_total": ("counter", "Files a media sync took from the content store instead of writing them."),
+    "vma_player_respawns_total": ("counter", "Players respawned by the watchdog, by reason."),
+    "vma_displays_given_up": ("gauge", "Displays the watchdog stopped respawning."),
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Metrics():
+    '''
+    Counters, gauges and summaries of the hot paths, rendered in the Prometheus text format.
+    Recording a value is a dict update under a lock, cheap enough for every scan and launch.
+    Every name must be in DEFINITIONS.
+    '''
+    def __init__(self) -> None:
+        self._values = {} # (name, labels): value, or [sum, count] for a summary
+        self._lock = threading.Lock()
+        self._writer = None
+        pass
+
+    def inc(self, name, value=1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+        pass
+
+    def set(self, name, value, **labels) -> None:
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+        pass
+
+    def observe(self, name, value, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            total = self._values.setdefault(key, [0.0, 0])
+            total[0] += value
+            total[1] += 1
+        pass
+
+    @contextmanager
+    def timer(self, name, **labels):
+        '''
+        Observes the seconds the with block took, also when it raises.
+        '''
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            values = sorted((key, value if not isinstance(value, list) else tuple(value)) for key, value in self._values.items())
+
+        lines, described = [], set()
+        for (name, labels), value in values:
+            kind, description = DEFINITIONS[name]
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+            if kind == "summary":
+                lines.append(f"{name}_sum{_labels(labels)} {value[0]:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {value[1]}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path) -> None:
+        '''
+        Writes the metrics to a text file, e.g. for the node_exporter textfile collector. The
+        file is replaced atomically so a reader never sees half of it.
+        '''
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, temp = tempfile.mkstemp(dir=folder, prefix=".metrics-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", newline="\n") as f:
+                f.write(self.render())
+            os.replace(temp, path)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        pass
+
+    def start_writer(self, path, interval=WRITE_INTERVAL) -> None:
+        '''
+        Writes the text file every interval seconds from a daemon thread. Only the first call
+        starts a writer, every wall of the process shares it.
+        '''
+        with self._lock:
+            if self._writer:
+                return
+            self._writer = threading.Thread(target=self._write_loop, args=(path, interval), daemon=True)
+        self._writer.start()
+        pass
+
+    def _write_loop(self, path, interval) -> None:
+        while True:
+            try:
+                self.write(path)
+            except OSError as e:
+                print(f"metrics not written to {path}: {e}")
+            time.sleep(interval)
+        pass
+
+
+metrics = Metrics()
+
+
+class PlayLog():
+    '''
+    Append-only proof-of-play log: one tab separated line per file started or stopped on a
+    display, with the local time. The file is rotated by size into numbered backups, so no
+    large file is ever rewritten.
+
+        - path (str): log file
+        - max_bytes (int): size at which the log is rotated
+        - backups (int): number of rotated files kept
+    '''
+    def __init__(self, path, max_bytes=PLAY_LOG_BYTES, backups=PLAY_LOG_BACKUPS) -> None:
+        self.path = path
+        self._logger = logging.getLogger(f"vma.play.{os.path.abspath(path)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if not self._logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(asctime)s\t%(message)s"))
+            self._logger.addHandler(handler)
+        pass
+
+    def record(self, wall, key, event, file) -> None:
+        '''
+        Appends one line to the log.
+            - event (str): "start", "respawn" or "stop"
+            - file (str): file of the display, the files of a playlist separated by |
+        '''
+        self._logger.info(f"{wall}\t{key}\t{event}\t{file}")
+        pass
@@ -0,0 +1,646 @@
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from Playlists import Playlist, is_image
+
+VLC = os.path.join(os.environ.get("PROGRAMFILES", "C:\\Program Files"), "VideoLAN", "VLC", "vlc.exe")
+
+RC_HOST = "127.0.0.1"
+RC_BASE_PORT = 4212 # display key is added to it
+CONNECT_TIMEOUT = 10 # seconds to wait for a new player to accept RC connections
+REPLY_TIMEOUT = 5
+QUIT_TIMEOUT = 3 # seconds to wait for a player to quit before terminating it
+FAKE_STARTUP_DELAY = 0.0 # seconds a fake player takes to start, to mimic VLC in benchmarks
+TERMINATE_TIMEOUT = 2 # seconds to wait for a terminated player before killing it
+
+PROMPT = b"> "
+
+Geometry = namedtuple('Geometry', ['x', 'y', 'width', 'height'])
+Geometry.__doc__ = '''
+Borderless window of a player spanning several screens, given instead of a screen number.
+    - x, y (int): desktop position of its top left corner
+    - width, height (int): size in pixels
+'''
+
+
+def _vlc_window(geometry) -> list:
+    return ["--no-fullscreen", "--no-embedded-video", "--no-video-deco", f"--video-x={geometry.x}",
+            f"--video-y={geometry.y}", f"--width={geometry.width}", f"--height={geometry.height}"]
+
+
+def vlc_command(display, port) -> list:
+    '''
+    Command line of a VLC player with the same options as "VLC Screen Arrangement.bat" plus the
+    RC control interface on RC_HOST:port.
+        - display: Qt screen number of the display, or the Geometry of a spanning window
+    '''
+    if isinstance(display, Geometry):
+        screen = _vlc_window(display)
+    else:
+        screen = ["--fullscreen", f"--qt-fullscreen-screennumber={display}", "--crop=16:9"]
+    return [VLC, *screen, "-R", "--no-qt-privacy-ask", "--video-on-top", "--video-title-timeout=500",
+            "--no-qt-fs-controller", "--qt-auto-raise=0", "--no-crashdump", "--extraintf=rc",
+            f"--rc-host={RC_HOST}:{port}", "--rc-quiet"]
+
+
+def cvlc_command(display, port) -> list:
+    '''
+    Command line of a Linux VLC player without interface. cvlc has no Qt screen number, the
+    video opens on the X display given as the display's "Qt" value, e.g. ":0.1".
+    '''
+    if isinstance(display, Geometry):
+        screen = _vlc_window(display)
+    else:
+        screen = ["--fullscreen", "--crop=16:9", f"--x11-display={display}"]
+    return ["cvlc", *screen, "-R", "--video-on-top", "--no-video-title-show", "--extraintf=rc",
+            f"--rc-host={RC_HOST}:{port}", "--rc-quiet"]
+
+
+def mpv_socket(port) -> str:
+    return os.path.join(tempfile.gettempdir(), f"vma-mpv-{port}.sock")
+
+
+def mpv_command(display, port) -> list:
+    '''
+    Command line of an mpv player, controlled through its JSON IPC socket mpv_socket(port).
+        - display: screen number of the display, or the Geometry of a spanning window
+    '''
+    if isinstance(display, Geometry):
+        screen = ["--no-fs", "--no-border", f"--geometry={display.width}x{display.height}+{display.x}+{display.y}"]
+    else:
+        screen = ["--fs", f"--fs-screen={display}", f"--screen={display}"]
+    return ["mpv", *screen, "--loop-file=inf", "--idle=yes",
+            "--force-window=yes", "--image-display-duration=inf", "--no-terminal", "--no-osc",
+            f"--input-ipc-server={mpv_socket(port)}"]
+
+
+def fake_command(display, port) -> list:
+    '''
+    Command line of a FakePlayer process, see FakePlayer.
+    '''
+    screen = f"--geometry={','.join(map(str, display))}" if isinstance(display, Geometry) else f"--qt-fullscreen-screennumber={display}"
+    return [sys.executable, os.path.abspath(__file__), "--fake", f"--rc-host={RC_HOST}:{port}", screen,
+            f"--startup-delay={FAKE_STARTUP_DELAY}"]
+
+
+def rc_quote(path) -> str:
+    '''
+    Quotes path for the add and enqueue RC commands, whose argument VLC splits at spaces
+    outside quotes, e.g. in the Visual Management folder. Raises ValueError if path contains
+    a double quote, which VLC cannot read inside a quoted item.
+    '''
+    if '"' in path:
+        raise ValueError(f"double quote in RC path {path!r}")
+    return f'"{path}"'
+
+
+class RCConnection():
+    '''
+    Client of the VLC RC interface. Every command is answered by the player with its output
+    followed by the "> " prompt, which is how the end of a reply is found.
+    '''
+    def __init__(self, port, host=RC_HOST, timeout=CONNECT_TIMEOUT) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.sock = socket.create_connection((host, port), timeout=REPLY_TIMEOUT)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        self._lock = threading.Lock()
+        # welcome banner
+        self._read_reply()
+        pass
+
+    def _read_reply(self) -> str:
+        data = b""
+        while not data.endswith(PROMPT):
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("player closed the RC connection")
+            data += chunk
+
+        return data[:-len(PROMPT)].decode(errors="replace").strip()
+
+    def command(self, command) -> str:
+        '''
+        Sends one RC command and returns the reply without the prompt. Raises ValueError if the
+        command spans lines, e.g. a path with a line break, which would send further commands.
+        '''
+        if "\r" in command or "\n" in command:
+            raise ValueError(f"line break in RC command {command!r}")
+        with self._lock:
+            self.sock.sendall(command.encode() + b"\n")
+            return self._read_reply()
+
+    def load(self, file) -> None:
+        self.command("clear")
+        self.command(f"add {rc_quote(file)}")
+        self.command("repeat on")
+        pass
+
+    def load_playlist(self, items) -> None:
+        '''
+        Replaces the playlist of the player with items and loops it. The dwell of an item is
+        passed as an input option: image-duration for images, stop-time for videos.
+        '''
+        self.command("clear")
+        for i, item in enumerate(items):
+            option = ""
+            if item.dwell is not None:
+                option = f" :image-duration={item.dwell}" if is_image(item.path) else f" :stop-time={item.dwell}"
+            self.command(f"{'add' if i == 0 else 'enqueue'} {rc_quote(item.path)}{option}")
+        self.command("repeat off")
+        self.command("loop on")
+        pass
+
+    def position(self):
+        try:
+            return int(self.command("get_time"))
+        except ValueError:
+            return None
+
+    def quit(self) -> None:
+        self.command("quit")
+        pass
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        pass
+
+
+class MPVConnection():
+    '''
+    Client of the mpv JSON IPC socket, with the same load/position/quit methods as
+    RCConnection. Replies are matched to their request by request_id, the events mpv sends
+    in between are skipped.
+    '''
+    def __init__(self, port, timeout=CONNECT_TIMEOUT) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(REPLY_TIMEOUT)
+                self.sock.connect(mpv_socket(port))
+                break
+            except OSError:
+                self.sock.close()
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        self.file = self.sock.makefile("rb")
+        self.requests = 0
+        self._lock = threading.Lock()
+        pass
+
+    def command(self, *command):
+        '''
+        Sends one IPC command and returns its data. Raises ValueError if mpv reports an error.
+        A single dict argument is sent as a command with named arguments.
+        '''
+        with self._lock:
+            self.requests += 1
+            arguments = command[0] if len(command) == 1 and isinstance(command[0], dict) else list(command)
+            self.sock.sendall(json.dumps({"command": arguments, "request_id": self.requests}).encode() + b"\n")
+            while True:
+                line = self.file.readline()
+                if not line:
+                    raise ConnectionError("player closed the IPC connection")
+                reply = json.loads(line)
+                if reply.get("request_id") == self.requests:
+                    break
+
+        if reply.get("error") not in ("success", None):
+            raise ValueError(f"mpv {command}: {reply['error']}")
+        return reply.get("data")
+
+    def load(self, file) -> None:
+        self.command("set_property", "loop-file", "inf")
+        self.command("loadfile", file, "replace")
+        pass
+
+    def load_playlist(self, items) -> None:
+        '''
+        Replaces the playlist of the player with items and loops it. The dwell of an item is
+        passed as per-file options.
+        '''
+        self.command("set_property", "loop-file", "no")
+        self.command("set_property", "loop-playlist", "inf")
+        for i, item in enumerate(items):
+            options = {}
+            if item.dwell is not None:
+                options = {"image-display-duration": str(item.dwell)} if is_image(item.path) else {"end": str(item.dwell)}
+            self.command({"name": "loadfile", "url": item.path, "flags": "replace" if i == 0 else "append",
+                          "options": options})
+        pass
+
+    def position(self):
+        try:
+            position = self.command("get_property", "time-pos")
+        except ValueError:
+            # nothing is loaded
+            return None
+        return None if position is None else int(position)
+
+    def quit(self) -> None:
+        self.command("quit")
+        pass
+
+    def close(self) -> None:
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+        pass
+
+
+PlayerBackend = namedtuple('PlayerBackend', ['command', 'connect'])
+PlayerBackend.__doc__ = '''
+How to start and control one kind of player.
+    - command: callable(display, port) returning the command line of a player
+    - connect: callable(port) returning the connection (RCConnection, MPVConnection) to a
+      started player
+'''
+
+BACKENDS = {"vlc": PlayerBackend(vlc_command, RCConnection),
+            "cvlc": PlayerBackend(cvlc_command, RCConnection),
+            "mpv": PlayerBackend(mpv_command, MPVConnection),
+            "fake": PlayerBackend(fake_command, RCConnection)}
+
+StopResult = namedtuple('StopResult', ['stopped', 'seconds'])
+StopResult.__doc__ = '''
+Outcome of SessionManager.stop_many().
+    - stopped (dict): key: how the player of the display ended, see PlayerSession.stop()
+    - seconds (float): wall time until the last player was gone
+'''
+
+
+class PlayerSession():
+    '''
+    One long-lived player process attached to a single display. The media is swapped inside
+    the running player through its control interface, so changing the file does not blank the screen
+    or pay the player start-up again.
+
+        - key: key of the Display the session belongs to
+        - display: Qt screen number the player is shown on
+        - port (int): RC port of the player
+        - backend (str): one of BACKENDS
+    '''
+    def __init__(self, key, display, port, backend="vlc") -> None:
+        self.key = key
+        self.display = display
+        self.port = port
+        self.backend = backend
+
+        self.process = None
+        self.control = None
+        self.file = ""
+        pass
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        '''
+        Starts the player process with an empty playlist and connects to its control interface.
+        The connection to a previous process, e.g. one that died, is closed first.
+        '''
+        if self.control:
+            self.control.close()
+            self.control = None
+        backend = BACKENDS[self.backend]
+        self.process = subprocess.Popen(backend.command(self.display, self.port),
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self.control = backend.connect(self.port)
+        except OSError:
+            self.stop()
+            raise
+        self.file = ""
+        pass
+
+    def _load(self, file) -> None:
+        if isinstance(file, Playlist):
+            self.control.load_playlist(file)
+        else:
+            self.control.load(file)
+        pass
+
+    def play(self, file, force=False) -> bool:
+        '''
+        Plays file, or loops a Playlist, in the session, starting the player first if it is
+        not running. Nothing is sent if the player is already playing it, unless force: the
+        media is then loaded again, and a player that does not answer is replaced. Returns
+        True if the media was loaded.
+        '''
+        if self.is_alive() and self.control and file == self.file and not force:
+            return False
+
+        if not self.is_alive():
+            self.start()
+
+        try:
+            self._load(file)
+        except OSError:
+            # the player died between the liveness check and the command
+            self.stop()
+            self.start()
+            self._load(file)
+
+        self.file = file
+        return True
+
+    def position(self):
+        '''
+        Returns the playback position in seconds reported by the player, or None if it is not
+        connected or plays nothing. Raises OSError if the player does not answer.
+        '''
+        control = self.control
+        if control is None:
+            return None
+        return control.position()
+
+    def stop(self) -> str:
+        '''
+        Stops the player of this session only: asks it to quit, terminates it if it does not
+        within QUIT_TIMEOUT and kills it if it still runs TERMINATE_TIMEOUT later. Returns how
+        it ended: "exited" if it was already gone, "quit", "terminated" or "killed", and "" if
+        the session had no player.
+        '''
+        control, process = self.control, self.process
+        self.control, self.process, self.file = None, None, ""
+
+        if process is None:
+            if control:
+                control.close()
+            return ""
+
+        if process.poll() is not None:
+            if control:
+                control.close()
+            return "exited"
+
+        if control:
+            try:
+                control.quit()
+            except (OSError, ValueError):
+                pass
+            control.close()
+
+        try:
+            process.wait(QUIT_TIMEOUT)
+            return "quit"
+        except subprocess.TimeoutExpired:
+            process.terminate()
+
+        try:
+            process.wait(TERMINATE_TIMEOUT)
+            return "terminated"
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            return "killed"
+
+
+class SessionManager():
+    '''
+    Keeps one PlayerSession per display key.
+    '''
+    def __init__(self, backend="vlc", base_port=RC_BASE_PORT) -> None:
+        self.backend = backend
+        self.base_port = base_port
+        self.sessions = {}
+        self._lock = threading.Lock()
+        pass
+
+    def configure(self, backend, base_port=RC_BASE_PORT) -> None:
+        self.backend = backend
+        self.base_port = base_port
+        pass
+
+    def session(self, key, display) -> PlayerSession:
+        '''
+        Returns the session of the display key, creating it if needed. A session whose Qt screen
+        number changed is stopped and replaced.
+        '''
+        with self._lock:
+            session = self.sessions.get(key)
+            if session and (session.display != display or session.backend != self.backend):
+                session.stop()
+                session = None
+
+            if session is None:
+                session = PlayerSession(key, display, self.base_port + int(key), self.backend)
+                self.sessions[key] = session
+
+        return session
+
+    def play(self, key, display, file, force=False) -> bool:
+        '''
+        Plays file or a Playlist on the display key, loading it again if force. Returns True
+        if the display was touched.
+        '''
+        return self.session(key, display).play(file, force)
+
+    def stop(self, key) -> str:
+        '''
+        Stops the player of the display key, see PlayerSession.stop().
+        '''
+        with self._lock:
+            session = self.sessions.pop(key, None)
+        if session:
+            return session.stop()
+        return ""
+
+    def stop_many(self, keys) -> StopResult:
+        '''
+        Stops the players of the displays keys in parallel, e.g. the displays of a category, so
+        the time it takes is the time of the slowest player, at most about REPLY_TIMEOUT +
+        QUIT_TIMEOUT + TERMINATE_TIMEOUT. Players this manager did not start are not touched.
+        '''
+        start = time.monotonic()
+        keys = list(keys)
+        if not keys:
+            return StopResult({}, 0.0)
+
+        with ThreadPoolExecutor(max_workers=len(keys)) as executor:
+            stopped = dict(zip(keys, executor.map(self.stop, keys)))
+
+        return StopResult(stopped, time.monotonic() - start)
+
+    def stop_all(self) -> StopResult:
+        return self.stop_many(list(self.sessions))
+
+    def pids(self) -> dict:
+        '''
+        Returns key: process id of the displays whose player is running.
+        '''
+        return {key: session.process.pid for key, session in list(self.sessions.items()) if session.is_alive()}
+
+
+sessions = SessionManager()
+
+
+def parse_mrl(argument) -> tuple:
+    '''
+    Splits the argument of an add or enqueue RC command like VLC does: at spaces and tabs
+    outside quotes, dropping the quotes. Returns (mrl, options), options being the items
+    that start with ":".
+    '''
+    items, item, quote = [], None, None
+    for char in argument:
+        if quote:
+            if char == quote:
+                quote = None
+            else:
+                item += char
+        elif char in "\"'":
+            quote = char
+            item = item or ""
+        elif char in " \t":
+            if item is not None:
+                items.append(item)
+            item = None
+        else:
+            item = (item or "") + char
+    if item is not None:
+        items.append(item)
+
+    if not items:
+        return "", []
+    return items[0], [option for option in items[1:] if option.startswith(":")]
+
+
+class _FakeRCHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        player = self.server.player
+        self.wfile.write(b"VLC media player 3.0.0 FakePlayer\r\nCommand Line Interface initialized.\r\n" + PROMPT)
+        for line in self.rfile:
+            command, _, argument = line.decode().strip().partition(" ")
+            reply = player.execute(command, argument)
+            self.wfile.write((reply + "\r\n" if reply else "").encode() + PROMPT)
+            if command in ("quit", "shutdown"):
+                # a slow quit, so the escalation to terminate/kill can be exercised
+                time.sleep(player.quit_delay)
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+        pass
+
+
+class FakePlayer():
+    '''
+    Local stand-in for a VLC player that only speaks the subset of the RC interface used by
+    PlayerSession (add, enqueue, clear, play, stop, repeat, loop, get_time, is_playing, status, quit). It
+    records every command it receives so the behaviour can be checked without VLC.
+
+    It can run inside the current process (start()) or as its own process:
+        python PlayerSession.py --fake --rc-host=127.0.0.1:4213 [--startup-delay=0.5] [--quit-delay=5]
+    '''
+    def __init__(self, port, host=RC_HOST, startup_delay=0.0, quit_delay=0.0) -> None:
+        self.host = host
+        self.port = port
+        self.startup_delay = startup_delay
+        self.quit_delay = quit_delay
+
+        self.playlist = []
+        self.current = None
+        self.playing = False
+        self.started = None
+        self.repeat = True
+        self.loop = False
+        self.commands = []
+
+        self.server = None
+        pass
+
+    def execute(self, command, argument) -> str:
+        self.commands.append((command, argument))
+        if command == "add":
+            mrl = parse_mrl(argument)[0]
+            self.playlist = [mrl]
+            self.current = mrl
+            self.playing = True
+            self.started = time.monotonic()
+        elif command == "enqueue":
+            self.playlist.append(parse_mrl(argument)[0])
+        elif command in ("repeat", "loop"):
+            setattr(self, command, argument == "on")
+        elif command == "clear":
+            self.playlist = []
+            self.current = None
+            self.playing = False
+        elif command == "play":
+            self.playing = bool(self.playlist)
+        elif command == "stop":
+            self.playing = False
+        elif command == "get_time":
+            return str(int(time.monotonic() - self.started)) if self.playing else "0"
+        elif command == "is_playing":
+            return "1" if self.playing else "0"
+        elif command == "status":
+            state = "playing" if self.playing else "stopped"
+            return f"( new input: {self.current or ''} )\r\n( state {state} )"
+        return ""
+
+    def _server(self) -> socketserver.ThreadingTCPServer:
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        server = socketserver.ThreadingTCPServer((self.host, self.port), _FakeRCHandler)
+        server.daemon_threads = True
+        server.player = self
+        return server
+
+    def start(self) -> None:
+        '''
+        Serves the RC interface from a background thread of the current process.
+        '''
+        time.sleep(self.startup_delay)
+        self.server = self._server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        pass
+
+    def serve_forever(self) -> None:
+        time.sleep(self.startup_delay)
+        self.server = self._server()
+        self.server.serve_forever()
+        self.server.server_close()
+        pass
+
+    def stop(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        pass
+
+
+def main(argv) -> None:
+    options = dict(arg[2:].partition("=")[::2] for arg in argv if arg.startswith("--"))
+    if "fake" not in options:
+        print("usage: PlayerSession.py --fake --rc-host=HOST:PORT [--startup-delay=SECONDS] [--quit-delay=SECONDS]")
+        return
+
+    host, _, port = options.get("rc-host", f"{RC_HOST}:{RC_BASE_PORT}").rpartition(":")
+    FakePlayer(int(port), host, float(options.get("startup-delay") or 0), float(options.get("quit-delay") or 0)).serve_forever()
+    pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
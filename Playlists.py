@@ -0,0 +1,90 @@
+import os
+from collections import namedtuple
+
+SINGLE = "single" # one file per display, looped, the behaviour without playlists
+SIZE = 6 # files a playlist is built from
+DWELL = 15 # seconds an image stays on screen
+IMAGES = (".png",)
+
+PlaylistItem = namedtuple('PlaylistItem', ['path', 'dwell'])
+PlaylistItem.__doc__ = '''
+One entry of a display playlist.
+    - path (str): media file
+    - dwell (float): seconds the item stays on screen, None to play a video to its end
+'''
+
+
+class Playlist(tuple):
+    '''
+    Rotating playlist of one display, a tuple of PlaylistItem played in order and looped by
+    the player. Two playlists with the same items are equal, so the wall controller only
+    reloads a display whose playlist changed.
+    '''
+    def paths(self) -> list:
+        return [item.path for item in self]
+
+    def map(self, function):
+        '''
+        Returns the playlist with function(path) applied to every path, e.g. to use variants.
+        '''
+        return Playlist(PlaylistItem(function(item.path), item.dwell) for item in self)
+
+
+def is_image(path) -> bool:
+    return os.path.splitext(path)[1].lower() in IMAGES
+
+
+def newest_policy(files, count) -> list:
+    '''
+    Every display rotates through all the files, each starting at a different one so the
+    displays of a category do not show the same file at the same time.
+    '''
+    return [files[i % len(files):] + files[:i % len(files)] for i in range(count)]
+
+
+def round_robin_policy(files, count) -> list:
+    '''
+    The files are dealt to the displays like cards, so no two displays share a file while
+    there are enough of them.
+    '''
+    return [files[i::count] or [files[i % len(files)]] for i in range(count)]
+
+
+def weighted_policy(files, count) -> list:
+    '''
+    Newer files come back more often: the newest of n files has weight n, the oldest 1, and
+    the weighted order is interleaved with smooth weighted round robin.
+    '''
+    weights = {path: len(files) - rank for rank, path in enumerate(files)}
+    current = dict.fromkeys(files, 0)
+    total = sum(weights.values())
+
+    order = []
+    for _ in range(total):
+        for path in files:
+            current[path] += weights[path]
+        chosen = max(files, key=lambda path: current[path])
+        current[chosen] -= total
+        order.append(chosen)
+
+    return [order[i % len(order):] + order[:i % len(order)] for i in range(count)]
+
+
+POLICIES = {"newest": newest_policy, "round-robin": round_robin_policy, "weighted": weighted_policy}
+
+
+def build(policy, files, count, dwell=DWELL) -> list:
+    '''
+    Builds one Playlist per display of a category.
+        - policy (str): one of POLICIES
+        - files (list): candidate files, newest first
+        - count (int): number of displays of the category
+        - dwell (float): seconds an image stays on screen, videos play to their end
+
+    Returns count playlists, empty ones if there are no files.
+    '''
+    if not files:
+        return [Playlist() for _ in range(count)]
+
+    return [Playlist(PlaylistItem(path, dwell if is_image(path) else None) for path in paths)
+            for paths in POLICIES[policy](list(files), count)]
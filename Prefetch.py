@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RATE = 50 * 1024**2 # bytes per second read ahead, so the warm-up does not starve the players
+CHUNK = 1024**2
+REWARM_AFTER = 600 # seconds after which a file that did not change is read again
+
+
+class Prefetcher():
+    '''
+    Reads the files that are about to be shown once, in the background, so they are in the
+    OS page cache when the players open them and the first frame only waits for the decoder.
+    Files are read one at a time at no more than rate bytes per second, through one reused
+    buffer.
+
+        - rate (int): bytes per second
+        - chunk (int): bytes per read
+    '''
+    def __init__(self, rate=RATE, chunk=CHUNK) -> None:
+        self.rate = rate
+        self.chunk = chunk
+        self.warmed = 0 # bytes read since the prefetcher was created
+
+        self._done = {} # path: (size, mtime, monotonic time it was read)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        pass
+
+    def _is_warm(self, path) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+        with self._lock:
+            entry = self._done.get(path)
+        return bool(entry) and entry[:2] == (stat.st_size, stat.st_mtime) and time.monotonic() - entry[2] < REWARM_AFTER
+
+    def prefetch(self, files) -> None:
+        '''
+        Queues the files that were not read recently. Returns at once.
+        '''
+        for path in files:
+            if not path or self._is_warm(path):
+                continue
+            with self._lock:
+                if path in self._pending:
+                    continue
+                self._pending.add(path)
+            self._executor.submit(self._warm_queued, path)
+        pass
+
+    def _warm_queued(self, path) -> None:
+        try:
+            self.warm(path)
+        except OSError as e:
+            print(f"{path} not prefetched: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+        pass
+
+    def warm(self, path) -> int:
+        '''
+        Reads the whole file at no more than rate bytes per second and returns its size.
+        '''
+        stat = os.stat(path)
+        buffer = bytearray(self.chunk)
+        start = time.monotonic()
+        read = 0
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                read += count
+                ahead = read / self.rate - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        with self._lock:
+            self._done[path] = (stat.st_size, stat.st_mtime, time.monotonic())
+            self.warmed += read
+        return read
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        pass
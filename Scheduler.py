@@ -0,0 +1,270 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+MAX_WAIT = 3600 # seconds, the transition is recomputed at least this often in case the clock jumps
+RETRY = 1 # seconds, a transition already due but not reached in local time (repeated DST hour) is checked again
+APPLY_RETRY = 30 # seconds before states whose apply failed are applied again
+
+
+def parse_time(text) -> int:
+    '''
+    Converts an "H:MM" string from the AUTO options to minutes after midnight.
+    '''
+    hours, _, minutes = text.partition(':')
+    minutes = int(hours)*60 + int(minutes or 0)
+    if not 0 <= minutes <= 24*60:
+        raise ValueError(f"{text} is not a time of the day")
+
+    return minutes
+
+
+def _window(entry, default) -> tuple:
+    if entry is None:
+        return None
+    on = parse_time(entry.get("On", default[0]))
+    off = parse_time(entry.get("Off", default[1]))
+    # the same on and off time means the screens stay off the whole day
+    return None if on == off else (on, off)
+
+
+def _week(entry, default=("0:00", "0:00")) -> list:
+    '''
+    Compiles an {"On": ..., "Off": ..., "DAYS": {...}} entry to a list of 7 (on, off) windows
+    in minutes, one per weekday starting on Monday. A None window means off the whole day.
+    '''
+    default = (entry.get("On", default[0]), entry.get("Off", default[1]))
+    days = entry.get("DAYS", {})
+
+    week = []
+    for day in WEEKDAYS:
+        week.append(_window(days[day], default) if day in days else _window({}, default))
+
+    return week
+
+
+class Schedule():
+    '''
+    On/off schedule of the categories compiled once from the AUTO options:
+
+        "AUTO": {
+            "On": "7:00", "Off": "22:00",                 <- every category, every day
+            "DAYS": {"Sat": {"On": "8:00", "Off": "14:00"}, "Sun": null},
+            "CATEGORIES": {"qa": {"Off": "18:00", "DAYS": {...}}}
+        }
+
+    Weekday entries override the times of that day, a null weekday or equal On and Off times
+    keep the screens off the whole day. Category entries inherit the top level times and days.
+    An Off time earlier than the On time keeps the screens on past midnight.
+    '''
+    def __init__(self, auto_options, categories) -> None:
+        base = _week(auto_options)
+        base_days = auto_options.get("DAYS", {})
+        default = (auto_options.get("On", "0:00"), auto_options.get("Off", "0:00"))
+
+        self.weeks = {}
+        for category in categories:
+            entry = auto_options.get("CATEGORIES", {}).get(category)
+            if entry is None:
+                self.weeks[category] = base
+            else:
+                entry = dict(entry, DAYS=dict(base_days, **entry.get("DAYS", {})))
+                self.weeks[category] = _week(entry, default)
+        pass
+
+    def _is_on(self, week, moment) -> bool:
+        minute = moment.hour*60 + moment.minute
+        today = week[moment.weekday()]
+        yesterday = week[moment.weekday() - 1]
+
+        if today:
+            on, off = today
+            if on < off and on <= minute < off:
+                return True
+            if off < on and minute >= on:
+                return True
+
+        # window that started yesterday and crosses midnight
+        if yesterday:
+            on, off = yesterday
+            if off < on and minute < off:
+                return True
+
+        return False
+
+    def states(self, moment) -> dict:
+        '''
+        Returns {category: True if its screens should be on} at the datetime moment.
+        '''
+        return {category: self._is_on(week, moment) for category, week in self.weeks.items()}
+
+    def next_transition(self, moment) -> datetime:
+        '''
+        Returns the first datetime after moment at which a category switches on or off, or
+        None if the schedule never changes.
+        '''
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        candidates = set()
+        for week in self.weeks.values():
+            # from yesterday, its window can end today
+            for offset in range(-1, 8):
+                day = midnight + timedelta(days=offset)
+                window = week[day.weekday()]
+                if window:
+                    on, off = window
+                    if off < on:
+                        # ends the next day
+                        off += 24*60
+                    candidates.update((day + timedelta(minutes=on), day + timedelta(minutes=off)))
+
+        current = self.states(moment)
+        for candidate in sorted(candidates):
+            if candidate > moment and self.states(candidate) != current:
+                return candidate
+
+        return None
+
+
+class SystemClock():
+    '''
+    Local time of the machine, the clock the scheduler runs on outside of simulations.
+    '''
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def seconds_until(self, moment) -> float:
+        # mktime handles daylight saving changes between now and the moment
+        return time.mktime(moment.timetuple()) - time.time()
+
+    def wait(self, event, timeout=None) -> bool:
+        '''
+        Sleeps until the event is set or for timeout seconds. Returns True if the event is set.
+        '''
+        return event.wait(timeout)
+
+
+class VirtualClock():
+    '''
+    Clock that jumps forward instead of sleeping, so a scheduler replays days of transitions
+    in milliseconds. Time is kept as a timestamp and shown in the local time zone, so daylight
+    saving changes happen as they would on the wall PC.
+
+        - start (datetime): local time the clock starts at
+        - end (datetime): local time at which every wait sets its event, stopping the scheduler
+    '''
+    def __init__(self, start, end) -> None:
+        self.time = time.mktime(start.timetuple())
+        self.end = time.mktime(end.timetuple())
+        pass
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time)
+
+    def seconds_until(self, moment) -> float:
+        return time.mktime(moment.timetuple()) - self.time
+
+    def wait(self, event, timeout=None) -> bool:
+        if event.is_set():
+            return True
+
+        target = self.end if timeout is None else min(self.time + timeout, self.end)
+        self.time = max(self.time, target)
+        if self.time >= self.end:
+            event.set()
+        return event.is_set()
+
+
+class OnOffScheduler():
+    '''
+    Switches the categories on and off at the times of a Schedule. It computes the next
+    transition and sleeps until then on an Event, so it uses no CPU between transitions and
+    cancel() wakes it up immediately.
+
+        - schedule (Schedule): when the categories are on
+        - apply: callable(states) called with Schedule.states() when the scheduler starts and
+          at every transition. It runs on the scheduler thread.
+        - prepare: callable(states) called lead seconds before every transition with the
+          states the transition switches to, e.g. to read the media ahead
+        - lead (float): seconds before a transition prepare is called
+        - clock: SystemClock, or a VirtualClock to simulate the schedule
+    '''
+    def __init__(self, schedule, apply, prepare=None, lead=0, clock=None) -> None:
+        self.schedule = schedule
+        self.apply = apply
+        self.prepare = prepare
+        self.lead = lead
+        self.clock = clock or SystemClock()
+
+        self._cancel = threading.Event()
+        self._thread = None
+        pass
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self.run, args=(self._cancel,), daemon=True)
+        self._thread.start()
+        pass
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        self._thread = None
+        pass
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def reschedule(self, schedule) -> None:
+        '''
+        Replaces the schedule and applies it right away if the scheduler is running.
+        '''
+        running = self.is_running()
+        self.cancel()
+        self.schedule = schedule
+        if running:
+            self.start()
+        pass
+
+    def run(self, cancel) -> None:
+        '''
+        Applies the schedule on the calling thread until the threading.Event cancel is set.
+        start() runs it on a thread of its own.
+        '''
+        states = None
+        prepared = None # transition prepare was called for
+        while not cancel.is_set():
+            now = self.clock.now()
+            new_states = self.schedule.states(now)
+            if new_states != states:
+                try:
+                    self.apply(new_states)
+                except Exception as e:
+                    # states stays as it was, so the next round applies them again
+                    print(f"applying the schedule failed, retrying in {APPLY_RETRY} s: {e!r}")
+                    self.clock.wait(cancel, APPLY_RETRY)
+                    continue
+                states = new_states
+
+            transition = self.schedule.next_transition(now)
+            if transition is None:
+                self.clock.wait(cancel)
+                return
+
+            wait = self.clock.seconds_until(transition)
+            if self.prepare and prepared != transition:
+                if wait <= self.lead:
+                    prepared = transition
+                    try:
+                        self.prepare(self.schedule.states(transition))
+                    except Exception as e:
+                        # a failed warm-up must not cost the transition
+                        print(f"preparing the {transition:%H:%M} transition failed: {e!r}")
+                    continue
+                wait -= self.lead
+            self.clock.wait(cancel, min(wait if wait > 0 else RETRY, MAX_WAIT))
+        pass
@@ -0,0 +1,166 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import Scheduler
+import HotReload
+import Daemon
+from ConfigStore import ConfigStore, write_json_atomic
+from Layout import compile_layout
+
+DAYS = 7
+BASE_PORT = 16400
+DAEMON_PORT = 18950
+
+Action = namedtuple('Action', ['time', 'action', 'categories'])
+Action.__doc__ = '''
+What the wall service does at one moment of a simulated schedule.
+    - time (datetime): local time of the action
+    - action (str): "on", "off", "refresh" for the categories that stay on and get their newest
+      files, or "prepare" for the media read ahead of a transition
+    - categories (tuple): categories the action applies to
+'''
+
+
+class ActionRecorder():
+    '''
+    Stands in for WallService.apply_schedule and prepare_schedule in a simulation and records
+    the actions the service takes for every change of states. The calls are also passed on to
+    apply and prepare, e.g. the methods of a WallService playing on fake players.
+
+        - clock (Scheduler.VirtualClock): clock of the simulation
+    '''
+    def __init__(self, clock, apply=None, prepare=None) -> None:
+        self.clock = clock
+        self.actions = []
+        self._apply = apply
+        self._prepare = prepare
+        self._states = None
+        pass
+
+    def _record(self, action, categories) -> None:
+        if categories:
+            self.actions.append(Action(self.clock.now(), action, tuple(categories)))
+        pass
+
+    def apply(self, states) -> None:
+        # off the first time: the service stops the players it may have left running
+        was_on = self._states or dict.fromkeys(states, True)
+        if not any(states.values()):
+            self._record("off", [category for category in states if was_on.get(category)])
+        else:
+            self._record("off", [category for category, on in states.items() if not on and was_on.get(category)])
+            self._record("on", [category for category, on in states.items() if on and not (self._states or {}).get(category)])
+            self._record("refresh", [category for category, on in states.items() if on and (self._states or {}).get(category)])
+        self._states = dict(states)
+
+        if self._apply:
+            self._apply(states)
+        pass
+
+    def prepare(self, states) -> None:
+        self._record("prepare", [category for category, on in states.items() if on])
+        if self._prepare:
+            self._prepare(states)
+        pass
+
+
+def simulate(schedule, start, end, lead=0, apply=None, prepare=None) -> list:
+    '''
+    Replays a Schedule from start to end on a virtual clock with the OnOffScheduler the wall
+    service runs, and returns the list of Action it takes.
+        - schedule (Scheduler.Schedule): schedule to replay
+        - start, end (datetime): local times of the simulation
+        - lead (float): seconds the media is prepared before a transition, 0 not to prepare
+        - apply, prepare: also called like WallService.apply_schedule and prepare_schedule
+    '''
+    clock = Scheduler.VirtualClock(start, end)
+    recorder = ActionRecorder(clock, apply, prepare)
+    scheduler = Scheduler.OnOffScheduler(schedule, recorder.apply, recorder.prepare if lead else None, lead, clock)
+    scheduler.run(threading.Event())
+
+    return recorder.actions
+
+
+def _service(options, wall, root) -> Daemon.WallService:
+    '''
+    Returns a WallService of the wall on fake players, whose options file is a copy in root.
+    '''
+    options = json.loads(json.dumps(options))
+    wall_options = options["WALLS"][wall] if wall and "WALLS" in options else options
+    wall_options["PLAYER"] = {"BACKEND": "fake", "RC_BASE_PORT": BASE_PORT}
+    wall_options["DAEMON"] = {"EMBEDDED": False, "PORT": DAEMON_PORT, "RELOAD": False, "SNAPSHOT": ""}
+    for name in ("WATCHDOG", "VARIANTS"):
+        wall_options[name] = {"ENABLED": False}
+    wall_options["METRICS"] = {"PLAY_LOG": ""}
+
+    path = os.path.join(root, "simulator_options.json")
+    write_json_atomic(path, options)
+    return Daemon.WallService(ConfigStore(path), wall)
+
+
+def main(argv) -> None:
+    '''
+    Prints what a wall does over days of its AUTO schedule, in milliseconds:
+        python Simulator.py [options.json] [--wall=NAME] [--start=2026-03-23] [--days=7]
+                            [--lead=MINUTES] [--tz=Europe/London] [--players]
+
+    --tz simulates the schedule in another time zone, e.g. to check a daylight saving change.
+    --players also plays the actions on fake players, which takes real seconds per action.
+    '''
+    options = dict(arg[2:].partition("=")[::2] for arg in argv if arg.startswith("--"))
+    paths = [arg for arg in argv if not arg.startswith("--")]
+
+    if options.get("tz"):
+        os.environ["TZ"] = options["tz"]
+        if hasattr(time, "tzset"):
+            time.tzset()
+
+    with open(paths[0] if paths else "options.json") as f:
+        wall_options = json.load(f)
+    errors = HotReload.validate(wall_options, list(Daemon.SELECTORS))
+    if errors:
+        print(*errors, sep="\n")
+        sys.exit(1)
+
+    wall = compile_layout(wall_options).wall(options.get("wall") or None)
+    schedule = Scheduler.Schedule(wall.options["AUTO"], list(wall.by_category))
+    if options.get("start"):
+        start = datetime.strptime(options["start"], "%Y-%m-%d")
+    else:
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=float(options.get("days") or DAYS))
+
+    prefetch = wall.options.get("PREFETCH", {})
+    lead = float(options.get("lead") or (prefetch.get("LEAD_MINUTES", 10) if prefetch.get("ENABLED", True) else 0)) * 60
+
+    service = folder = None
+    apply = prepare = None
+    if "players" in options:
+        folder = tempfile.mkdtemp(prefix="vma-simulator-")
+        service = _service(wall_options, wall.name if "WALLS" in wall_options else None, folder)
+        apply, prepare = service.apply_schedule, service.prepare_schedule
+
+    started = time.perf_counter()
+    try:
+        actions = simulate(schedule, start, end, lead, apply, prepare)
+    finally:
+        if service:
+            service.turn_off()
+            shutil.rmtree(folder, ignore_errors=True)
+
+    for action in actions:
+        print(f"{action.time:%a %Y-%m-%d %H:%M:%S}  {action.action:<8} {', '.join(action.categories)}")
+    print(f"{len(actions)} actions from {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} "
+          f"simulated in {(time.perf_counter() - started)*1000:.0f} ms")
+    pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from json import load
+
+import Playlists
+from ConfigStore import write_json_atomic
+
+FILE_NAME = "wall_state.json" # relative to the options file, the wall name is inserted before .json
+VERSION = 1
+
+
+def snapshot_path(options_path, name, wall) -> str:
+    '''
+    Returns the snapshot file of the wall: name next to the options file, e.g.
+    wall_state.main.json.
+    '''
+    stem, extension = os.path.splitext(name)
+    return os.path.join(os.path.dirname(os.path.abspath(options_path)), f"{stem}.{wall}{extension}")
+
+
+def encode(playlist) -> list:
+    return [[item.path, item.dwell] for item in playlist]
+
+
+def decode(items):
+    '''
+    Returns the Playlist of encoded items, without the files that are gone since.
+    '''
+    return Playlists.Playlist(Playlists.PlaylistItem(path, dwell) for path, dwell in items if os.path.exists(path))
+
+
+class WallSnapshot():
+    '''
+    Compact record of what a wall shows, read at start so the wall service can relaunch it
+    before it scans a single folder: after a power cut or a reboot the screens light up in
+    the time the players take to start. It is rewritten after every change of what plays,
+    atomically and only if something changed, so a refresh that changes nothing costs a dict
+    comparison.
+
+    A state is a dict:
+        - screens_on (bool): whether the wall was on
+        - on (list): categories with a display playing
+        - auto (bool): whether the on/off scheduler ran
+        - modes (dict): category: "auto" or "manual"
+        - files (dict): display key: file
+        - playlists (dict): display key: [[path, dwell], ...]
+
+        - path (str): json file of the snapshot
+    '''
+    def __init__(self, path) -> None:
+        self.path = path
+        self._saved = None
+        self._lock = threading.Lock()
+        pass
+
+    def load(self):
+        '''
+        Returns the state of the snapshot, or None if there is no readable snapshot.
+        '''
+        try:
+            with open(self.path, 'r') as f:
+                snapshot = load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get("version") != VERSION:
+            return None
+
+        state = snapshot.get("state")
+        with self._lock:
+            self._saved = state
+        return state
+
+    def save(self, state) -> None:
+        '''
+        Writes the state if it differs from the last one written. A failed write is reported
+        and does not fail the operation that changed the wall.
+        '''
+        with self._lock:
+            if state == self._saved:
+                return
+            try:
+                write_json_atomic(self.path, {"version": VERSION, "saved": time.time(), "state": state})
+            except OSError as e:
+                print(f"wall snapshot {self.path} not written: {e}")
+                return
+            self._saved = state
+        pass
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from json import load
+
+from ConfigStore import write_json_atomic
+
+MP4 = '*.mp4'
+PNG = '*.png'
+
+WORKERS = 4
+MANIFEST = ".vma_sync_manifest.json"
+TEMP_SUFFIX = ".vma-part" # does not match any media pattern, so a half copied file is never selected
+HASH_CHUNK = 1024*1024
+
+SyncResult = namedtuple('SyncResult', ['files', 'bytes', 'unchanged', 'failed', 'seconds', 'deduplicated'])
+SyncResult.__doc__ = '''
+Outcome of SyncEngine.run().
+    - files (int): number of files copied
+    - bytes (int): number of bytes copied
+    - unchanged (int): number of files that did not need a copy
+    - failed (list): (relative path, exception) of the files that could not be copied
+    - seconds (float): wall time of the sync
+    - deduplicated (int): copied files whose content the content store already had, so no
+      new blob was stored for them
+'''
+
+
+def file_hash(path) -> str:
+    '''
+    Returns the sha256 hex digest of the file, read in HASH_CHUNK chunks.
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class SyncEngine():
+    '''
+    Copies new and changed media from source to destination, one level deep in every folder of
+    folders. A manifest in the destination remembers the size, mtime and, with use_hash, the
+    hash of every source file that was copied, so unchanged files are skipped without reading
+    them. Files are copied to a temporary name and renamed when complete, so a player never
+    opens a half copied file, and keep the mtime of the source like xcopy does.
+
+        - source (str): root folder to copy from, e.g. a network share
+        - destination (str): root folder to copy to, usually VisualManagementArea.ROOT
+        - folders (list): category folders relative to both roots
+        - patterns (tuple): glob-style patterns of the media files that are copied
+        - workers (int): number of parallel transfers
+        - use_hash (bool): compare the content hash before copying a file whose size or mtime
+          changed, so a file that was only touched is not copied again
+        - store (ContentStore): stores each content once and links the files to it, None to
+          copy every file on its own. The manifest then has the hash of every file.
+    '''
+    def __init__(self, source, destination, folders, patterns=(MP4, PNG), workers=WORKERS, use_hash=False, store=None) -> None:
+        self.source = source
+        self.destination = destination
+        self.folders = folders
+        self.patterns = patterns
+        self.workers = workers
+        self.use_hash = use_hash
+        self.store = store
+
+        self.manifest_path = os.path.join(destination, MANIFEST)
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+        self._deduplicated = 0
+        pass
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _source_files(self):
+        for folder in self.folders:
+            try:
+                with os.scandir(os.path.join(self.source, folder)) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.') or not any(fnmatch(entry.name, p) for p in self.patterns):
+                            continue
+                        try:
+                            if entry.is_file():
+                                stat = entry.stat()
+                                yield os.path.join(folder, entry.name), stat.st_size, stat.st_mtime
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def plan(self) -> tuple:
+        '''
+        Returns (changed, unchanged): the (relative path, size, mtime) of the source files that
+        differ from the manifest or are missing in the destination, and the number of files
+        that do not.
+        '''
+        changed, unchanged = [], 0
+        for relative, size, mtime in self._source_files():
+            entry = self.manifest.get(relative)
+            if entry and entry["size"] == size and entry["mtime"] == mtime \
+                    and os.path.exists(os.path.join(self.destination, relative)):
+                unchanged += 1
+                continue
+            changed.append((relative, size, mtime))
+
+        return changed, unchanged
+
+    def _copy(self, relative, size, mtime):
+        '''
+        Copies one file and returns the number of bytes written, or None if its hash shows it
+        did not change.
+        '''
+        source = os.path.join(self.source, relative)
+        destination = os.path.join(self.destination, relative)
+
+        digest = None
+        if self.use_hash:
+            digest = file_hash(source)
+            entry = self.manifest.get(relative)
+            if entry and entry.get("hash") == digest and os.path.exists(destination):
+                with self._lock:
+                    self.manifest[relative] = {"size": size, "mtime": mtime, "hash": digest}
+                return None
+
+        if self.store is not None:
+            digest, written = self.store.put(source, destination, digest)
+            with self._lock:
+                self.manifest[relative] = {"size": size, "mtime": mtime, "hash": digest}
+                if not written:
+                    self._deduplicated += 1
+            return written
+
+        folder, name = os.path.split(destination)
+        os.makedirs(folder, exist_ok=True)
+        temp = os.path.join(folder, "." + name + TEMP_SUFFIX)
+        try:
+            shutil.copyfile(source, temp)
+            shutil.copystat(source, temp)
+            os.replace(temp, destination)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.manifest[relative] = {"size": size, "mtime": mtime, "hash": digest}
+
+        return size
+
+    def run(self, on_change=None) -> SyncResult:
+        '''
+        Copies every changed file with workers parallel transfers and saves the manifest.
+            - on_change: callable(folder, path) called with the destination folder and path of
+              every copied file, e.g. to update the media index
+
+        Returns a SyncResult.
+        '''
+        start = time.monotonic()
+        self._deduplicated = 0
+        changed, unchanged = self.plan()
+        files, copied, failed = 0, 0, []
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = {executor.submit(self._copy, *item): item[0] for item in changed}
+            for future, relative in futures.items():
+                try:
+                    size = future.result()
+                except Exception as e:
+                    failed.append((relative, e))
+                    continue
+
+                if size is None:
+                    unchanged += 1
+                    continue
+
+                files += 1
+                copied += size
+                if on_change:
+                    folder, name = os.path.split(relative)
+                    on_change(os.path.join(self.destination, folder + os.sep), os.path.join(self.destination, relative))
+
+        if changed:
+            write_json_atomic(self.manifest_path, self.manifest)
+            if self.store is not None:
+                self.store.collect()
+
+        return SyncResult(files, copied, unchanged, failed, time.monotonic() - start, self._deduplicated)
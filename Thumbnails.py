@@ -0,0 +1,160 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+try:
+    # optional: renders the image thumbnails, ffmpeg does it otherwise
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CACHE_NAME = ".vma_thumbnails.sqlite"
+WIDTH, HEIGHT = 160, 90
+MEMORY_BYTES = 16 * 1024**2
+FFMPEG_TIMEOUT = 30
+
+IMAGES = (".png",)
+
+
+class ThumbnailCache():
+    '''
+    Small PNG previews of media files: the first frame of a video, a downscaled image. They
+    are rendered on one background thread, so the caller never waits for a decoder, and kept
+    in a memory LRU of at most max_bytes backed by a sqlite file keyed by (path, size, mtime)
+    like the probe cache, so an unchanged file is decoded once, across runs too.
+
+    Images are rendered with Pillow and videos, and images without Pillow, with a local
+    ffmpeg. A file no installed renderer can read has no thumbnail.
+
+        - path (str): sqlite file of the cache, memory only if it cannot be opened
+        - width, height (int): box the thumbnails fit in
+        - max_bytes (int): memory the thumbnails kept in memory may take
+        - ffmpeg (str): ffmpeg executable, looked up on PATH if None
+    '''
+    def __init__(self, path, width=WIDTH, height=HEIGHT, max_bytes=MEMORY_BYTES, ffmpeg=None) -> None:
+        self.path = path
+        self.width = width
+        self.height = height
+        self.max_bytes = max_bytes
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.rendered = 0 # files decoded since the cache was opened
+
+        self._memory = OrderedDict() # (path, size, mtime): PNG bytes, b"" if the file has none
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS thumbnails (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, data BLOB)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"thumbnail cache {path} not available, keeping thumbnails in memory only: {e}")
+            self._db = None
+        pass
+
+    def can_render(self, path) -> bool:
+        return self.ffmpeg is not None or (os.path.splitext(path)[1].lower() in IMAGES and Image is not None)
+
+    def request(self, path, callback) -> None:
+        '''
+        Queues the thumbnail of the file and returns at once. callback(path, data) is called
+        on the background thread with the PNG bytes, or None if the file has no thumbnail.
+        '''
+        if path and self.can_render(path):
+            self._executor.submit(self._deliver, path, callback)
+        pass
+
+    def _deliver(self, path, callback) -> None:
+        try:
+            data = self.get(path)
+        except Exception as e:
+            print(f"no thumbnail of {path}: {e!r}")
+            data = None
+        callback(path, data)
+        pass
+
+    def _remember(self, key, data) -> None:
+        self._memory[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._bytes -= len(old)
+        pass
+
+    def _lookup(self, key):
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            return data
+
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT size, mtime, data FROM thumbnails WHERE path = ?", (key[0],)).fetchone()
+        if row is None or tuple(row[:2]) != key[1:]:
+            return None
+
+        self._remember(key, row[2])
+        return row[2]
+
+    def get(self, path):
+        '''
+        Returns the thumbnail of the file as PNG bytes, rendering it if it is not cached for
+        its current size and mtime, or None if it has none. Blocks while it renders.
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (path, stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            data = self._lookup(key)
+        if data is not None:
+            return data or None
+
+        data = self.render(path) or b""
+        with self._lock:
+            self.rendered += 1
+            self._remember(key, data)
+            if self._db is not None and data:
+                # a file without a thumbnail is tried again next run, a renderer may be installed by then
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?)", (*key, data))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"thumbnail cache {self.path} not updated: {e}")
+
+        return data or None
+
+    def render(self, path):
+        '''
+        Decodes the file and returns its thumbnail as PNG bytes, or None if no installed
+        renderer can read it.
+        '''
+        if os.path.splitext(path)[1].lower() in IMAGES and Image is not None:
+            with Image.open(path) as image:
+                image.thumbnail((self.width, self.height))
+                buffer = BytesIO()
+                image.convert("RGB").save(buffer, "PNG")
+            return buffer.getvalue()
+
+        if self.ffmpeg is None:
+            return None
+        scale = f"scale={self.width}:{self.height}:force_original_aspect_ratio=decrease"
+        result = subprocess.run([self.ffmpeg, "-nostdin", "-loglevel", "error", "-i", path, "-frames:v", "1", "-vf", scale,
+                                 "-f", "image2pipe", "-vcodec", "png", "-"],
+                                check=True, timeout=FFMPEG_TIMEOUT, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return result.stdout or None
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        pass
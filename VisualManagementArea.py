@@ -1,7 +1,9 @@
-import os
-import glob
 import subprocess
 import time
+from MediaIndex import get_index
+from MediaProbe import get_cache
+from SyncEngine import SyncEngine
+from ContentStore import ContentStore
 
 ROOT = "C:\\Users\\Admin\\Documents\\Visual Management\\"
 SAFETY = "H&S\\"
@@ -14,37 +16,59 @@ PNG = '*.png'
 DISPLAYS = ['\\\\.\\DISPLAY10', '\\\\.\\DISPLAY11', '\\\\.\\DISPLAY4', '\\\\.\\DISPLAY9', \
             '\\\\.\\DISPLAY5', '\\\\.\\DISPLAY6', '\\\\.\\DISPLAY7', '\\\\.\\DISPLAY8']
 
+def playable(path) -> bool:
+    '''
+    True if the headers of the media file are sound, see MediaProbe.probe. Every file is
+    probed once, the result is cached in ROOT by path, size and mtime.
+    '''
+    return get_cache(ROOT).is_valid(path)
+
+
 def safety_files(n=3):
-    files = glob.glob(ROOT+SAFETY+MP4)
-    files.extend(glob.glob(ROOT+SAFETY+PNG))
-    return sorted(files, key=os.path.getmtime)[-1*n:]
+    return get_index(ROOT+SAFETY).newest(n, (MP4, PNG), playable)
 
 
 def quality_files(n=1):
-    files = glob.glob(ROOT+QUALITY+MP4)
-    return sorted(files, key=os.path.getmtime)[-1*n:]
+    return get_index(ROOT+QUALITY).newest(n, (MP4,), playable)
 
 
 def oe_files(n=1):
-    files = glob.glob(ROOT+OE+PNG)
-    return sorted(files, key=os.path.getmtime)[-1*n:]
+    return get_index(ROOT+OE).newest(n, (PNG,), playable)
 
 
 def projects_files(n=3):
-    files = glob.glob(ROOT+PROJECTS+MP4)
-    return sorted(files, key=os.path.getmtime)[-1*n:]
+    return get_index(ROOT+PROJECTS).newest(n, (MP4,), playable)
 
 def sync_files(script_location):
     subprocess.run([script_location], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     pass
 
+def sync_media(source, workers=4, use_hash=False, store=False):
+    '''
+    Copies new and changed media of every category from source to ROOT with the built-in
+    SyncEngine and updates the media indexes with the copied files. With store, a content
+    found in several categories is stored once, see ContentStore, unless ROOT does not
+    support hard links. Returns the SyncResult.
+    '''
+    def on_change(folder, path):
+        get_index(folder).update(path)
+        pass
+
+    store = ContentStore(ROOT) if store else None
+    engine = SyncEngine(source, ROOT, [SAFETY, QUALITY, PROJECTS, OE], (MP4, PNG), workers, use_hash,
+                        store if store and store.enabled else None)
+    return engine.run(on_change)
+
 def turnoff_screens():
     subprocess.run(["VLC Screens Off.bat"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     pass
 
 
-def turnon_screen(file, display):
+def turnon_screen(file, display) -> bool:
     '''
+    Starts VLC playing file on display through the batch file. Returns True if the batch
+    file ran successfully.
+
     directx-draw
     ____________________________________
  	|DISPLAY |DISPLAY |DISPLAY |DISPLAY |
@@ -62,8 +86,7 @@ def turnon_screen(file, display):
     
     '''
 
-    subprocess.run(['VLC Screen Arrangement.bat', file, str(display)])
-    pass
+    return subprocess.run(['VLC Screen Arrangement.bat', file, str(display)]).returncode == 0
 
 
 def turnon_screens(mode = 'normal'):
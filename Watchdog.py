@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import Playlists
+from Metrics import metrics
+
+INTERVAL = 2 # seconds between two health checks of the wall
+STALL_TIMEOUT = 15 # seconds a playing player may keep the same position before it counts as frozen
+BACKOFF = 2 # seconds before the second respawn of a display, doubled at every further one
+MAX_BACKOFF = 60
+BACKOFF_RESET = 60 # seconds a respawned player must stay healthy before the backoff starts over
+CRASH_LIMIT = 5 # respawns within CRASH_WINDOW after which a display is given up
+CRASH_WINDOW = 300
+
+
+def _moves(file) -> bool:
+    '''
+    True if the position of a player showing file keeps moving: a video, or a playlist of
+    videos. A still image, a composite included, stays at one position for as long as it
+    is shown.
+    '''
+    if isinstance(file, Playlists.Playlist):
+        return bool(file) and not any(Playlists.is_image(path) for path in file.paths())
+    return bool(file) and not Playlists.is_image(file)
+
+
+class DisplayHealth():
+    '''
+    What the watchdog knows about the player of one display.
+        - key: display key
+        - pid (int): process id of the player, None if it has none
+        - position: last playback position reported by the player
+        - moved (float): monotonic time the position last changed, or the player was (re)started
+        - failures (int): respawns since the player was last healthy for BACKOFF_RESET
+        - next_attempt (float): monotonic time before which the display is not respawned again
+        - respawns (deque): monotonic times of the respawns within CRASH_WINDOW
+        - given_up (bool): the display is in a crash loop and is left alone until it is launched again
+        - error (str): why the player was last respawned
+    '''
+    __slots__ = ("key", "pid", "position", "moved", "failures", "next_attempt", "respawns", "given_up", "error")
+
+    def __init__(self, key, now) -> None:
+        self.key = key
+        self.pid = None
+        self.position = None
+        self.moved = now
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.respawns = deque()
+        self.given_up = False
+        self.error = None
+        pass
+
+    def state(self) -> str:
+        if self.given_up:
+            return "given up"
+        return "recovering" if self.failures else "ok"
+
+
+class Watchdog():
+    '''
+    Watches the player process of every display that should be playing and respawns a player
+    that exited, stopped answering its RC interface or froze (its position did not move for
+    stall_timeout while it plays a video), on its own display only. A display that keeps failing is respawned with an
+    exponential backoff and given up after crash_limit respawns within crash_window seconds.
+
+        - sessions (PlayerSession.SessionManager): registry of the player processes by display key
+        - watched: callable() returning the keys of the displays that should be playing
+        - respawn: callable(key) that restarts the player of one display
+        - name (str): name of the wall in the metrics
+    '''
+    def __init__(self, sessions, watched, respawn, name="", interval=INTERVAL, stall_timeout=STALL_TIMEOUT,
+                 backoff=BACKOFF, max_backoff=MAX_BACKOFF, crash_limit=CRASH_LIMIT, crash_window=CRASH_WINDOW) -> None:
+        self.sessions = sessions
+        self.watched = watched
+        self.respawn = respawn
+        self.name = name
+        self.interval = interval
+        self.stall_timeout = stall_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.crash_limit = crash_limit
+        self.crash_window = crash_window
+
+        self.health = {}
+        self._stopping = [] # keys of the stops in progress, None for every display
+        self._lock = threading.Lock()
+        self._stop = None
+        pass
+
+    def _problem(self, key, health, now) -> str:
+        '''
+        Returns why the player of the display key needs a respawn, or None if it is healthy.
+        '''
+        session = self.sessions.sessions.get(key)
+        if session is None or not session.is_alive():
+            health.pid = None
+            return "exited"
+
+        if health.pid != session.process.pid:
+            # a new process, started by a launch or a respawn
+            health.pid, health.position, health.moved = session.process.pid, None, now
+
+        try:
+            position = session.position()
+        except OSError as e:
+            return f"unresponsive ({e})"
+
+        if position is None or position != health.position or not _moves(session.file):
+            health.position, health.moved = position, now
+            return None
+
+        if now - health.moved > self.stall_timeout:
+            return f"frozen at {position}"
+        return None
+
+    def check(self, now=None) -> list:
+        '''
+        Checks every watched display once and respawns the failed ones whose backoff elapsed.
+        Returns the keys of the respawned displays.
+        '''
+        now = time.monotonic() if now is None else now
+        watched = set(self.watched())
+        with self._lock:
+            for key in list(self.health):
+                if key not in watched:
+                    del self.health[key]
+            displays = [self.health.setdefault(key, DisplayHealth(key, now)) for key in watched]
+
+        # no lock from here on: the RC replies and the respawns take time and a launch must
+        # still be able to reset() its display meanwhile
+        respawned = []
+        for health in displays:
+            if health.given_up or self._is_stopping(health.key):
+                continue
+
+            problem = self._problem(health.key, health, now)
+            if problem is None:
+                if health.failures and now - health.respawns[-1] > BACKOFF_RESET:
+                    health.failures = 0
+                continue
+
+            # stopped on purpose since the check started, not a crash
+            if now < health.next_attempt or self._is_stopping(health.key):
+                continue
+
+            while health.respawns and now - health.respawns[0] > self.crash_window:
+                health.respawns.popleft()
+            if len(health.respawns) >= self.crash_limit:
+                health.given_up = True
+                print(f"display {health.key} given up after {len(health.respawns)} respawns in {self.crash_window}s: {problem}")
+                continue
+
+            health.error = problem
+            health.respawns.append(now)
+            health.failures += 1
+            health.next_attempt = now + min(self.max_backoff, self.backoff * 2 ** (health.failures - 1))
+            health.position, health.moved = None, now
+            metrics.inc("vma_player_respawns_total", wall=self.name, display=health.key, reason=problem.split()[0])
+            print(f"display {health.key} {problem}, respawning")
+            try:
+                self.respawn(health.key)
+            except Exception as e:
+                print(f"display {health.key} respawn failed: {e!r}")
+                continue
+            respawned.append(health.key)
+
+        metrics.set("vma_displays_given_up", sum(health.given_up for health in displays), wall=self.name)
+        return respawned
+
+    def _is_stopping(self, key) -> bool:
+        with self._lock:
+            return any(keys is None or key in keys for keys in self._stopping)
+
+    @contextmanager
+    def stopping(self, keys=None):
+        '''
+        Marks the displays keys, or every display if None, as stopped on purpose while the
+        block runs, so their players are not taken for crashed ones until the caller stopped
+        watching them.
+        '''
+        entry = None if keys is None else set(keys)
+        with self._lock:
+            self._stopping.append(entry)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stopping.remove(entry)
+
+    def reset(self, key) -> None:
+        '''
+        Forgets the failures of a display, e.g. when it is launched again by a restart, which
+        also gives a given up display another chance.
+        '''
+        with self._lock:
+            self.health.pop(key, None)
+        pass
+
+    def status(self) -> dict:
+        '''
+        Returns key: {"pid", "state", "respawns", "error"} of the watched displays.
+        '''
+        with self._lock:
+            return {key: {"pid": health.pid, "state": health.state(), "respawns": len(health.respawns), "error": health.error}
+                    for key, health in self.health.items()}
+
+    def is_running(self) -> bool:
+        return self._stop is not None and not self._stop.is_set()
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, args=(self._stop,), daemon=True).start()
+        pass
+
+    def _run(self, stop) -> None:
+        while not stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # the watchdog must outlive a failing check
+                print(f"watchdog check failed: {e!r}")
+        pass
+
+    def stop(self) -> None:
+        if self._stop:
+            self._stop.set()
+        pass
@@ -0,0 +1,108 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL = 50 # ms between two drains of the result queue
+
+
+class Worker():
+    '''
+    Runs blocking jobs (subprocess, folder scans, file copies) away from the Tkinter main loop.
+    Jobs run on background threads and their results are put on a queue that the Tk thread
+    drains every POLL_INTERVAL ms with root.after, so the on_done/on_error callbacks always run
+    on the Tk thread and may update widgets and Tk variables.
+
+    Jobs of the same lane run one after the other in submission order, jobs of different lanes
+    run in parallel.
+
+        - root (tk.Tk): the Tk root window
+        - on_busy: callable(name, busy) called on the Tk thread when the first job of a name
+          starts and when the last one finishes, e.g. to show a busy indicator
+        - on_error: callable(name, exception) called on the Tk thread when a job without its
+          own on_error raises
+    '''
+    def __init__(self, root, on_busy=None, on_error=None, poll_interval=POLL_INTERVAL) -> None:
+        self.root = root
+        self.on_busy = on_busy
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+
+        self.results = queue.Queue()
+        self.lanes = {}
+        self.running = {} # name: number of unfinished jobs
+
+        self.root.after(self.poll_interval, self._drain)
+        pass
+
+    def submit(self, name, job, *args, lane="wall", on_done=None, on_error=None):
+        '''
+        Runs job(*args) on the lane's thread. Must be called from the Tk thread.
+            - name (str): name of the action, passed to on_busy
+            - on_done: callable(result) called on the Tk thread when job returns
+            - on_error: callable(exception) called on the Tk thread when job raises. The
+              worker's on_error is used if it is None.
+
+        Returns the concurrent.futures.Future of the job.
+        '''
+        if lane not in self.lanes:
+            self.lanes[lane] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"worker-{lane}")
+
+        self.running[name] = self.running.get(name, 0) + 1
+        if self.running[name] == 1 and self.on_busy:
+            self.on_busy(name, True)
+
+        def run():
+            try:
+                self.results.put((name, on_done, on_error, job(*args), None))
+            except Exception as e:
+                self.results.put((name, on_done, on_error, None, e))
+            pass
+
+        return self.lanes[lane].submit(run)
+
+    def call_in_ui(self, callback, *args) -> None:
+        '''
+        Queues callback(*args) to run on the Tk thread. Safe to call from any thread, it is how
+        background threads (e.g. the on/off scheduler) hand work to the UI.
+        '''
+        self.results.put((None, lambda result: callback(*args), None, None, None))
+        pass
+
+    def is_busy(self, name=None) -> bool:
+        if name is None:
+            return bool(self.running)
+        return name in self.running
+
+    def _drain(self) -> None:
+        try:
+            while True:
+                name, on_done, on_error, result, error = self.results.get_nowait()
+                try:
+                    if error is None:
+                        if on_done:
+                            on_done(result)
+                    elif on_error:
+                        on_error(error)
+                    elif self.on_error:
+                        self.on_error(name, error)
+                    else:
+                        print(f"{name} failed: {error!r}")
+                except Exception as e:
+                    # a failing callback must not stop the drain loop
+                    print(f"{name} callback failed: {e!r}")
+                finally:
+                    if name is not None:
+                        self.running[name] -= 1
+                        if not self.running[name]:
+                            del self.running[name]
+                            if self.on_busy:
+                                self.on_busy(name, False)
+        except queue.Empty:
+            pass
+
+        self.root.after(self.poll_interval, self._drain)
+        pass
+
+    def shutdown(self) -> None:
+        for executor in self.lanes.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        pass
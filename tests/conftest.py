@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+import pytest
+
+# the modules of the application live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import VisualManagementArea as vma
+import Benchmark
+import PlayerSession
+
+OPTIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "options.json")
+
+
+@pytest.fixture
+def media_root(tmp_path, monkeypatch):
+    '''
+    Synthetic media tree in the category folders of a temporary VisualManagementArea.ROOT.
+    '''
+    root = str(tmp_path / "media") + os.sep
+    monkeypatch.setattr(vma, "ROOT", root)
+    Benchmark.make_tree(root, 40)
+    yield root
+    Benchmark._reset_indexes()
+
+
+@pytest.fixture
+def options():
+    '''
+    The shipped options with fake players and every background service off, so a test only
+    runs what it starts itself.
+    '''
+    with open(OPTIONS_PATH) as f:
+        options = json.load(f)
+
+    options["PLAYER"] = {"BACKEND": "fake", "RC_BASE_PORT": PlayerSession.RC_BASE_PORT}
+    options["DAEMON"] = {"EMBEDDED": False, "RELOAD": False, "SNAPSHOT": ""}
+    for name in ("WATCHDOG", "VARIANTS", "PREFETCH"):
+        options[name] = {"ENABLED": False}
+    options["METRICS"] = {"PLAY_LOG": ""}
+    return options
+
+
+@pytest.fixture
+def sessions():
+    '''
+    Returns a factory of SessionManager running `PlayerSession.py --fake` players, all of
+    them stopped after the test.
+    '''
+    managers = []
+
+    def factory(base_port):
+        manager = PlayerSession.SessionManager("fake", base_port)
+        managers.append(manager)
+        return manager
+
+    yield factory
+    for manager in managers:
+        manager.stop_all()
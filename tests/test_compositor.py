@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+import Compositor
+import Daemon
+import HotReload
+import Layout
+from ConfigStore import ConfigStore
+
+
+def _slots(*tiles):
+    return [Layout.Slot("main", "opex", str(index), str(index), row, column, index, ())
+            for index, (row, column) in enumerate(tiles)]
+
+
+def test_grid_places_a_rectangle_from_its_top_left_tile():
+    assert Compositor.grid(_slots((0, 2), (0, 3), (1, 2), (1, 3))) == {"0": (0, 0), "1": (0, 1), "2": (1, 0), "3": (1, 1)}
+
+
+def test_grid_refuses_displays_that_do_not_fill_a_rectangle():
+    with pytest.raises(ValueError):
+        Compositor.grid(_slots((0, 2), (1, 2), (1, 3)))
+
+
+def test_the_options_check_refuses_a_group_that_is_not_a_rectangle(options):
+    options["COMPOSITOR"] = {"opex": {}, "qa": {}}
+
+    assert HotReload.validate(options, list(Daemon.SELECTORS)) == [
+        "wall main: COMPOSITOR.opex: displays 5, 1, 2 do not fill a rectangle of the layout"]
+
+
+def test_a_group_that_is_not_a_rectangle_keeps_a_player_per_display(options, media_root, tmp_path, monkeypatch):
+    # Pillow is not needed to set the compositors up
+    monkeypatch.setattr(Compositor, "Image", object())
+    options["COMPOSITOR"] = {"opex": {}, "qa": {}}
+    path = str(tmp_path / "options.json")
+    with open(path, "w") as f:
+        json.dump(options, f)
+
+    service = Daemon.WallService(ConfigStore(path), "main")
+
+    assert list(service.compositors) == ["qa"]
@@ -0,0 +1,48 @@
+import os
+
+import ContentStore
+
+
+def _source(folder, name, data, mtime):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_copies_with_the_same_mtime_share_one_blob(tmp_path):
+    store = ContentStore.ContentStore(str(tmp_path / "media"))
+    first = _source(tmp_path, "a.mp4", b"clip", 1_700_000_000)
+    copy = _source(tmp_path, "b.mp4", b"clip", 1_700_000_000)
+
+    digest, written = store.put(first, str(tmp_path / "media" / "hss" / "a.mp4"))
+    assert store.put(copy, str(tmp_path / "media" / "qa" / "b.mp4"), digest) == (digest, 0)
+
+    assert written == 4
+    assert os.path.samefile(tmp_path / "media" / "hss" / "a.mp4", tmp_path / "media" / "qa" / "b.mp4")
+
+
+def test_a_copy_saved_later_keeps_its_own_mtime(tmp_path):
+    store = ContentStore.ContentStore(str(tmp_path / "media"))
+    old = _source(tmp_path, "a.mp4", b"clip", 1_700_000_000)
+    new = _source(tmp_path, "b.mp4", b"clip", 1_700_086_400)
+
+    store.put(old, str(tmp_path / "media" / "hss" / "a.mp4"))
+    digest, written = store.put(new, str(tmp_path / "media" / "qa" / "b.mp4"))
+
+    assert written == 4
+    assert os.path.getmtime(tmp_path / "media" / "hss" / "a.mp4") == 1_700_000_000
+    assert os.path.getmtime(tmp_path / "media" / "qa" / "b.mp4") == 1_700_086_400
+
+
+def test_collect_removes_the_blobs_no_file_links_to(tmp_path):
+    store = ContentStore.ContentStore(str(tmp_path / "media"))
+    path = str(tmp_path / "media" / "hss" / "a.mp4")
+    store.put(_source(tmp_path, "a.mp4", b"clip", 1_700_000_000), path)
+    store.put(_source(tmp_path, "a.mp4", b"clip v2", 1_700_086_400), path)
+
+    assert store.collect() == 4
+    assert store.collect() == 0
+    with open(path, "rb") as f:
+        assert f.read() == b"clip v2"
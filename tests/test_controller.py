@@ -0,0 +1,115 @@
+import Controller
+import Playlists
+from Launcher import LaunchResult
+
+
+def _playlist(*paths):
+    return Playlists.Playlist(Playlists.PlaylistItem(path, None) for path in paths)
+
+
+def test_diff_launches_the_changed_displays_and_stops_the_emptied_ones():
+    playing = {"1": "a.mp4", "2": "b.mp4", "3": "c.mp4"}
+    selection = {"1": "a.mp4", "2": "x.mp4", "3": "", "4": "d.mp4", "5": ""}
+
+    launch, stop = Controller.diff(playing, selection)
+
+    assert launch == {"2": "x.mp4", "4": "d.mp4"}
+    assert stop == ["3"]
+
+
+def test_diff_of_the_same_selection_is_empty():
+    playing = {"1": "a.mp4", "2": _playlist("b.mp4", "c.png")}
+
+    assert Controller.diff(playing, dict(playing)) == ({}, [])
+
+
+def test_diff_compares_playlists_by_their_items():
+    playing = {"1": _playlist("a.mp4", "b.mp4")}
+
+    assert Controller.diff(playing, {"1": _playlist("a.mp4", "b.mp4")}) == ({}, [])
+    assert Controller.diff(playing, {"1": _playlist("b.mp4", "a.mp4")})[0] == {"1": _playlist("b.mp4", "a.mp4")}
+
+
+def test_refresh_launches_only_what_changed():
+    controller = Controller.WallController()
+    started, stopped = [], []
+
+    def start(key):
+        started.append(key)
+        return True
+
+    controller.refresh({"1": "a.mp4", "2": "b.mp4"}, start, stopped.append, stagger=0)
+    assert sorted(started) == ["1", "2"]
+
+    started.clear()
+    controller.refresh({"1": "a.mp4", "2": "c.mp4", "3": ""}, start, stopped.append, stagger=0)
+    assert started == ["2"]
+    assert stopped == []
+
+    controller.refresh({"1": "", "2": "c.mp4"}, start, stopped.append, stagger=0)
+    assert started == ["2"]
+    assert stopped == ["1"]
+    assert controller.playing == {"2": "c.mp4"}
+
+
+def test_refresh_with_force_launches_every_display():
+    controller = Controller.WallController()
+    started = []
+    controller.refresh({"1": "a.mp4", "2": "b.mp4"}, lambda key: True, stagger=0)
+
+    controller.refresh({"1": "a.mp4", "2": "b.mp4"}, lambda key: started.append(key) or True, force=True, stagger=0)
+
+    assert sorted(started) == ["1", "2"]
+
+
+def test_a_failed_launch_is_tried_again_by_the_next_refresh():
+    controller = Controller.WallController()
+
+    def start(key):
+        if key == "2":
+            raise OSError("no player")
+        return True
+
+    results = controller.refresh({"1": "a.mp4", "2": "b.mp4"}, start, stagger=0)
+    assert {result.key: result.launched for result in results} == {"1": True, "2": False}
+    assert controller.playing == {"1": "a.mp4"}
+
+    results = controller.refresh({"1": "a.mp4", "2": "b.mp4"}, lambda key: True, stagger=0)
+    assert [result.key for result in results] == ["2"]
+
+
+def test_refresh_batch_sends_every_change_at_once():
+    controller = Controller.WallController()
+    controller.refresh({"1": "a.mp4", "2": "b.mp4"}, lambda key: True, stagger=0)
+    batches = []
+
+    def send(launch, stopped):
+        batches.append((dict(launch), list(stopped)))
+        return [LaunchResult(key, True, 0.0, None) for key in launch]
+
+    controller.refresh_batch({"1": "x.mp4", "2": ""}, send)
+    controller.refresh_batch({"1": "x.mp4", "2": ""}, send)
+
+    assert batches == [({"1": "x.mp4"}, ["2"]), ({}, [])]
+    assert controller.playing == {"1": "x.mp4"}
+
+
+def test_refresh_touches_only_the_fake_player_whose_file_changed(sessions):
+    manager = sessions(27110)
+    controller = Controller.WallController()
+
+    def start(key, file):
+        manager.play(key, 0, file)
+        return True
+
+    selection = {"1": "a.mp4", "2": "b.mp4"}
+    controller.refresh(selection, lambda key: start(key, selection[key]), manager.stop, stagger=0)
+    pids = manager.pids()
+
+    selection = {"1": "a.mp4", "2": "c.mp4"}
+    results = controller.refresh(selection, lambda key: start(key, selection[key]), manager.stop, stagger=0)
+
+    assert [result.key for result in results] == ["2"]
+    # the players were kept, the new file was sent to the running one
+    assert manager.pids() == pids
+    assert manager.sessions["2"].file == "c.mp4"
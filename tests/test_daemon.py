@@ -0,0 +1,85 @@
+import asyncio
+import http.client
+import json
+
+import pytest
+
+import Daemon
+from ConfigStore import ConfigStore
+
+PORT = 27500
+
+
+@pytest.fixture
+def api(options, media_root, tmp_path):
+    '''
+    Returns a factory of a WallService serving its API on PORT with the given DAEMON options,
+    stopped after the test.
+    '''
+    services = []
+
+    def factory(**daemon_options):
+        options["DAEMON"].update(daemon_options, PORT=PORT)
+        path = str(tmp_path / "options.json")
+        with open(path, "w") as f:
+            json.dump(options, f)
+        services.append(Daemon.start_in_thread(ConfigStore(path), auto=False))
+        return services[-1]
+
+    yield factory
+    for service in services:
+        loop = service._server.get_loop()
+        asyncio.run_coroutine_threadsafe(service.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        service.sessions.stop_all()
+
+
+def _request(method, path, body=None, **headers):
+    connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+    try:
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        return response.status, json.load(response)
+    finally:
+        connection.close()
+
+
+def test_the_client_is_answered(api):
+    api()
+    client = Daemon.DaemonClient("127.0.0.1", PORT)
+
+    assert client.set_auto(False)["auto"] is False
+    assert client.status()["auto"] is False
+
+
+def test_a_post_that_is_not_json_is_refused(api):
+    api()
+
+    status, reply = _request("POST", "/auto", '{"enabled": true}', **{"Content-Type": "text/plain"})
+
+    assert status == 415
+    assert Daemon.DaemonClient("127.0.0.1", PORT).status()["auto"] is False
+
+
+def test_a_request_to_another_host_name_is_refused(api):
+    api()
+
+    assert _request("GET", "/status", Host="rebound.example:8765")[0] == 403
+    assert _request("POST", "/auto", '{"enabled": true}', Host="rebound.example",
+                    **{"Content-Type": "application/json"})[0] == 403
+    assert _request("GET", "/status", Host=f"localhost:{PORT}")[0] == 200
+
+
+def test_a_service_with_a_token_needs_it_on_every_request(api):
+    api(TOKEN="secret")
+
+    with pytest.raises(RuntimeError, match="token"):
+        Daemon.DaemonClient("127.0.0.1", PORT).status()
+    with pytest.raises(RuntimeError, match="token"):
+        Daemon.DaemonClient("127.0.0.1", PORT, token="wrong").set_auto(True)
+
+    client = Daemon.DaemonClient("127.0.0.1", PORT, token="secret")
+    assert client.set_auto(False)["auto"] is False
+    assert "vma_" in client.metrics()
+    # the token, not the host name, decides on a service that serves the network
+    assert _request("GET", "/status", Host="signage-pc", Authorization="Bearer secret")[0] == 200
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+import VisualManagementArea as vma
+import Daemon
+import Fleet
+import PlayerSession
+from ConfigStore import ConfigStore
+
+TOKEN = "test-token"
+OPTIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "options.json")
+AGENTS = {"north": (27390, 27300), "south": (27391, 27350)} # wall: (agent port, RC base port)
+
+
+class RunningAgent():
+    '''
+    FleetAgent served on 127.0.0.1 from an event loop of its own, which restart() replaces
+    with a new agent on the same port, as after a reboot of its PC.
+    '''
+    def __init__(self, port, base_port, root, options=None) -> None:
+        self.options = options or {"PLAYER": {"BACKEND": "fake", "RC_BASE_PORT": base_port},
+                                   "WATCHDOG": {"ENABLED": False}, "FLEET": {"TOKEN": TOKEN}}
+        self.port = port
+        self.root = root
+        self.start()
+
+    def start(self) -> None:
+        self.agent = Fleet.FleetAgent(self.options, "127.0.0.1", self.port, self.root)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.agent.serve(), self.loop)
+
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), 1).close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def stop(self) -> None:
+        async def cancel():
+            # the connection handlers too, so the coordinator sees its connection drop
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+
+        asyncio.run_coroutine_threadsafe(cancel(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.agent.sessions.stop_all()
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+
+@pytest.fixture
+def agents(media_root):
+    running = {wall: RunningAgent(port, base_port, media_root) for wall, (port, base_port) in AGENTS.items()}
+    yield running
+    for agent in running.values():
+        agent.stop()
+
+
+def _client(wall, token=TOKEN) -> Fleet.AgentClient:
+    return Fleet.AgentClient("127.0.0.1", AGENTS[wall][0], token, timeout=30)
+
+
+def _media(count) -> list:
+    folder = vma.ROOT + vma.QUALITY
+    return [os.path.join(folder, name) for name in sorted(os.listdir(folder))[:count]]
+
+
+def test_each_agent_runs_its_own_batch(agents):
+    north, south = _client("north"), _client("south")
+    files = _media(3)
+
+    results = north.play({"1": ("0", files[0]), "2": ("1", files[1])}, [], stagger=0)
+    assert sorted((result.key, result.launched) for result in results) == [("1", True), ("2", True)]
+    results = south.play({"1": ("0", files[2])}, [], stagger=0)
+    assert [(result.key, result.launched) for result in results] == [("1", True)]
+
+    assert north.health()["playing"] == {"1": files[0], "2": files[1]}
+    assert south.health()["playing"] == {"1": files[2]}
+    assert sorted(agents["north"].agent.sessions.pids()) == ["1", "2"]
+    assert sorted(agents["south"].agent.sessions.pids()) == ["1"]
+
+    # a stop and a health check in one batch
+    off, health = north.call({"op": "play", "launch": {}, "stop": ["2"], "stagger": 0}, {"op": "health"})
+    assert off == []
+    assert health["playing"] == {"1": files[0]}
+    assert sorted(agents["north"].agent.sessions.pids()) == ["1"]
+    assert south.health()["playing"] == {"1": files[2]}
+
+
+def test_an_agent_refuses_a_request_without_its_token(agents):
+    with pytest.raises(RuntimeError, match="unauthorized"):
+        _client("north", "wrong").health()
+    with pytest.raises(RuntimeError, match="unauthorized"):
+        _client("north", "").health()
+
+
+def test_a_restarted_agent_is_reported_once(agents):
+    north, south = _client("north"), _client("south")
+    files = _media(2)
+    north.play({"1": ("0", files[0])}, [], stagger=0)
+    south.play({"1": ("0", files[1])}, [], stagger=0)
+
+    agents["north"].restart()
+
+    with pytest.raises(Fleet.AgentReset):
+        north.health()
+    assert north.health()["playing"] == {}
+    assert south.health()["playing"] == {"1": files[1]}
+
+
+def test_the_coordinator_sends_the_whole_selection_again_after_a_reset(agents, options, tmp_path):
+    options["FLEET"] = {"TOKEN": TOKEN}
+    options["LAUNCH"] = {"STAGGER": 0}
+    options["WALLS"] = {wall: {"AGENT": {"HOST": "127.0.0.1", "PORT": port}} for wall, (port, base_port) in AGENTS.items()}
+    path = str(tmp_path / "options.json")
+    with open(path, "w") as f:
+        json.dump(options, f)
+    config = ConfigStore(path)
+    walls = {wall: Daemon.WallService(config, wall) for wall in AGENTS}
+
+    for service in walls.values():
+        service.list_files()
+        results = service.restart()
+        assert results and all(result["launched"] for result in results)
+    displays = len(results)
+    assert len(agents["north"].agent.sessions.pids()) == displays
+
+    # nothing changed, the batch is empty
+    assert walls["north"].restart() == []
+
+    agents["north"].restart()
+    results = walls["north"].restart()
+
+    assert len(results) == displays and all(result["launched"] for result in results)
+    assert len(agents["north"].agent.sessions.pids()) == displays
+    assert len(agents["south"].agent.sessions.pids()) == displays
+
+
+def test_an_agent_on_the_shipped_options_falls_back_to_vlc(media_root, monkeypatch):
+    # vlc is not installed here, the fake player stands in for it
+    monkeypatch.setitem(PlayerSession.BACKENDS, "vlc", PlayerSession.BACKENDS["fake"])
+    with open(OPTIONS_PATH) as f:
+        options = json.load(f)
+    assert options["PLAYER"]["BACKEND"] == "batch"
+    options["PLAYER"]["RC_BASE_PORT"] = 27400
+    options["WATCHDOG"] = {"ENABLED": False}
+    options["FLEET"] = {"TOKEN": TOKEN}
+    agent = RunningAgent(27392, 27400, media_root, options)
+
+    try:
+        client = Fleet.AgentClient("127.0.0.1", 27392, TOKEN, timeout=30)
+        results = client.play({"1": ("0", _media(1)[0])}, [], stagger=0)
+
+        assert agent.agent.sessions.backend == "vlc"
+        assert [(result.key, result.launched, result.error) for result in results] == [("1", True, None)]
+    finally:
+        agent.stop()
@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+
+import pytest
+
+import Daemon
+import HotReload
+from ConfigStore import ConfigStore
+
+CATEGORIES = list(Daemon.SELECTORS)
+
+
+def _write(path, options):
+    with open(path, "w") as f:
+        json.dump(options, f)
+
+
+def test_the_shipped_options_are_valid(options):
+    assert HotReload.validate(options, CATEGORIES) == []
+
+
+@pytest.mark.parametrize("key, value", [("PLAYLISTS", []), ("LAUNCH", [1, 2]), ("AGENT", "10.0.0.2"),
+                                        ("PLAYER", "vlc"), ("COMPOSITOR", "hss")])
+def test_a_section_of_the_wrong_type_is_reported(options, key, value):
+    options[key] = value
+
+    assert HotReload.validate(options, CATEGORIES) == [f"wall main: {key} must be a dict"]
+
+
+def test_a_section_of_the_wrong_type_in_a_wall_is_reported(options):
+    layout = options.pop("DISPLAY_LAYOUT")
+    options["WALLS"] = {"north": {"DISPLAY_LAYOUT": layout, "PLAYER": ["vlc"]},
+                        "south": {"DISPLAY_LAYOUT": layout, "PLAYER": {"RC_BASE_PORT": "4300"}}}
+
+    assert HotReload.validate(options, CATEGORIES) == ["wall north: PLAYER must be a dict",
+                                                       "wall south: PLAYER.RC_BASE_PORT must be an int"]
+
+
+def test_a_malformed_edit_is_rejected_and_the_next_one_applied(options, tmp_path):
+    path = str(tmp_path / "options.json")
+    _write(path, options)
+    config = ConfigStore(path)
+    watcher = HotReload.ConfigWatcher(config, [], CATEGORIES)
+
+    _write(path, dict(options, PLAYLISTS=["hss"]))
+    assert not watcher.check()
+    assert watcher.rejected == config.file_stamp()
+
+    _write(path, dict(options, LAUNCH={"STAGGER": 2}))
+    assert watcher.check()
+    assert config["LAUNCH"] == {"STAGGER": 2}
+
+
+def test_a_failing_check_does_not_stop_the_watcher(options, tmp_path, monkeypatch):
+    path = str(tmp_path / "options.json")
+    _write(path, options)
+    config = ConfigStore(path)
+    watcher = HotReload.ConfigWatcher(config, [], CATEGORIES, interval=0.05)
+    validate = HotReload.validate
+    monkeypatch.setattr(HotReload, "validate", lambda options, categories: 1 / 0)
+    thread = threading.Thread(target=watcher._run, daemon=True)
+    thread.start()
+
+    try:
+        _write(path, dict(options, LAUNCH={"STAGGER": 1}))
+        deadline = time.monotonic() + 5
+        while watcher.rejected != config.file_stamp() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert watcher.rejected == config.file_stamp()
+
+        monkeypatch.setattr(HotReload, "validate", validate)
+        _write(path, dict(options, LAUNCH={"STAGGER": 3}))
+        while config.get("LAUNCH") != {"STAGGER": 3} and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert config["LAUNCH"] == {"STAGGER": 3}
+        assert thread.is_alive()
+    finally:
+        watcher.stop()
@@ -0,0 +1,26 @@
+import os
+
+import MediaVariants
+
+
+def _variant(folder, name, size, mtime):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_eviction_counts_the_playing_variants_but_keeps_them(tmp_path):
+    folder = str(tmp_path)
+    playing = _variant(folder, "playing.png", 600, 100)
+    old = _variant(folder, "old.png", 300, 200)
+    recent = _variant(folder, "recent.png", 300, 300)
+    cache = MediaVariants.VariantCache(folder, None, max_bytes=1000, playing=lambda: [playing])
+
+    cache._evict()
+    cache.shutdown()
+
+    # 1200 bytes with the playing variant: the oldest variant that is not playing goes
+    assert sorted(os.listdir(folder)) == ["playing.png", "recent.png"]
+    assert not os.path.exists(old) and os.path.exists(recent)
@@ -0,0 +1,60 @@
+import pytest
+
+import PlayerSession
+import Playlists
+
+PORT = 27150
+FOLDER = "C:\\Users\\Admin\\Documents\\Visual Management\\hss\\"
+
+
+@pytest.fixture
+def player():
+    player = PlayerSession.FakePlayer(PORT, "127.0.0.1")
+    player.start()
+    control = PlayerSession.RCConnection(PORT, "127.0.0.1")
+    yield player, control
+    control.close()
+    player.stop()
+
+
+def test_a_path_with_spaces_is_loaded_whole(player):
+    player, control = player
+
+    control.load(FOLDER + "line 1.mp4")
+
+    assert player.current == FOLDER + "line 1.mp4"
+    assert player.playlist == [FOLDER + "line 1.mp4"]
+
+
+def test_playlist_items_keep_their_spaces_and_dwell_options(player):
+    player, control = player
+    playlist = Playlists.Playlist([Playlists.PlaylistItem(FOLDER + "shift plan.png", 8),
+                                   Playlists.PlaylistItem(FOLDER + "O'Brien's line.mp4", None)])
+
+    control.load_playlist(playlist)
+
+    assert player.playlist == [FOLDER + "shift plan.png", FOLDER + "O'Brien's line.mp4"]
+    assert PlayerSession.parse_mrl(player.commands[1][1]) == (FOLDER + "shift plan.png", [":image-duration=8"])
+
+
+def test_a_path_that_cannot_be_quoted_is_refused(player):
+    player, control = player
+
+    with pytest.raises(ValueError):
+        control.load(FOLDER + 'the "best" line.mp4')
+    assert player.current is None
+
+
+def test_replacing_a_dead_player_closes_its_connection(sessions):
+    manager = sessions(27160)
+    manager.play("1", 0, "a b.mp4")
+    session = manager.sessions["1"]
+    control = session.control
+    session.process.kill()
+    session.process.wait()
+
+    manager.play("1", 0, "a b.mp4")
+
+    assert control.sock.fileno() == -1
+    assert session.control is not control
+    assert session.is_alive()
@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime, timedelta
+
+import Scheduler
+
+MONDAY = datetime(2026, 3, 23)
+
+
+def _run(auto, start, end, categories=("hss", "qa"), lead=0, apply=None, prepare=None):
+    '''
+    Replays the schedule on a VirtualClock from start to end. Returns the (time, states) of
+    every apply.
+    '''
+    clock = Scheduler.VirtualClock(start, end)
+    applied = []
+
+    def record(states):
+        if apply:
+            apply(states)
+        applied.append((clock.now(), dict(states)))
+
+    scheduler = Scheduler.OnOffScheduler(Scheduler.Schedule(auto, list(categories)), record,
+                                         prepare and (lambda states: prepare(clock.now(), states)), lead, clock)
+    scheduler.run(threading.Event())
+    return applied
+
+
+def _all(on):
+    return {"hss": on, "qa": on}
+
+
+def test_switches_on_and_off_at_the_daily_times():
+    applied = _run({"On": "7:00", "Off": "22:00"}, MONDAY, MONDAY + timedelta(days=1))
+
+    assert applied == [(MONDAY, _all(False)),
+                       (MONDAY.replace(hour=7), _all(True)),
+                       (MONDAY.replace(hour=22), _all(False))]
+
+
+def test_weekday_entries_override_the_times_and_null_keeps_the_day_off():
+    friday = MONDAY + timedelta(days=4)
+    auto = {"On": "7:00", "Off": "22:00", "DAYS": {"Sat": {"On": "8:00", "Off": "14:00"}, "Sun": None}}
+
+    applied = _run(auto, friday.replace(hour=12), MONDAY + timedelta(days=7))
+
+    assert [(moment, states["hss"]) for moment, states in applied] == [
+        (friday.replace(hour=12), True),
+        (friday.replace(hour=22), False),
+        (friday + timedelta(days=1, hours=8), True),
+        (friday + timedelta(days=1, hours=14), False)]
+
+
+def test_a_window_crossing_midnight_stays_on_until_the_next_day():
+    applied = _run({"On": "20:00", "Off": "2:00"}, MONDAY.replace(hour=12), MONDAY + timedelta(days=1, hours=12))
+
+    assert [(moment, states["hss"]) for moment, states in applied] == [
+        (MONDAY.replace(hour=12), False),
+        (MONDAY.replace(hour=20), True),
+        (MONDAY + timedelta(days=1, hours=2), False)]
+
+
+def test_a_category_entry_overrides_its_own_times_only():
+    auto = {"On": "7:00", "Off": "22:00", "CATEGORIES": {"qa": {"Off": "18:00"}}}
+
+    applied = _run(auto, MONDAY.replace(hour=12), MONDAY + timedelta(days=1))
+
+    assert applied == [(MONDAY.replace(hour=12), _all(True)),
+                       (MONDAY.replace(hour=18), {"hss": True, "qa": False}),
+                       (MONDAY.replace(hour=22), _all(False))]
+
+
+def test_prepare_runs_lead_seconds_before_every_transition():
+    prepared = []
+
+    _run({"On": "7:00", "Off": "22:00"}, MONDAY, MONDAY + timedelta(days=1), lead=600,
+         prepare=lambda moment, states: prepared.append((moment, dict(states))))
+
+    assert prepared == [(MONDAY.replace(hour=6, minute=50), _all(True)),
+                        (MONDAY.replace(hour=21, minute=50), _all(False))]
+
+
+def test_a_failed_apply_is_retried_and_the_scheduler_keeps_running():
+    failures = [OSError("player busy")] * 2
+
+    def apply(states):
+        if failures:
+            raise failures.pop()
+
+    applied = _run({"On": "7:00", "Off": "22:00"}, MONDAY.replace(hour=7), MONDAY + timedelta(days=1), apply=apply)
+
+    assert applied == [(MONDAY.replace(hour=7) + timedelta(seconds=2 * Scheduler.APPLY_RETRY), _all(True)),
+                       (MONDAY.replace(hour=22), _all(False))]
@@ -0,0 +1,124 @@
+import pytest
+
+import Watchdog
+
+
+@pytest.fixture
+def wall(sessions):
+    '''
+    Two displays on `PlayerSession.py --fake` players, watched by a Watchdog that respawns
+    them like the wall service does. Returns (manager, playing, respawned, watchdog).
+    '''
+    manager = sessions(27200)
+    playing = {"1": "a.mp4", "2": "b.mp4"}
+    for key, file in playing.items():
+        manager.play(key, 0, file)
+    respawned = []
+
+    def respawn(key):
+        respawned.append(key)
+        manager.stop(key)
+        manager.play(key, 0, playing[key])
+
+    # the fake players report whole seconds of real time, far less than the test clock moves
+    watchdog = Watchdog.Watchdog(manager, lambda: list(playing), respawn, "test", stall_timeout=3600,
+                                 backoff=2, max_backoff=60, crash_limit=3, crash_window=300)
+    return manager, playing, respawned, watchdog
+
+
+def _kill(manager, key):
+    process = manager.sessions[key].process
+    process.kill()
+    process.wait()
+
+
+def test_healthy_players_are_left_alone(wall):
+    manager, playing, respawned, watchdog = wall
+
+    assert watchdog.check(now=100) == []
+    assert watchdog.check(now=101) == []
+    assert respawned == []
+
+
+def test_a_crashed_player_is_respawned_on_its_own_display(wall):
+    manager, playing, respawned, watchdog = wall
+    watchdog.check(now=100)
+    pids = manager.pids()
+
+    _kill(manager, "1")
+
+    assert watchdog.check(now=101) == ["1"]
+    assert manager.sessions["1"].is_alive()
+    assert manager.pids()["1"] != pids["1"]
+    assert manager.pids()["2"] == pids["2"]
+    assert watchdog.status()["1"]["state"] == "recovering"
+
+
+def test_respawns_back_off(wall):
+    manager, playing, respawned, watchdog = wall
+    watchdog.check(now=100)
+
+    _kill(manager, "1")
+    assert watchdog.check(now=101) == ["1"]
+
+    _kill(manager, "1")
+    # the second respawn waits BACKOFF seconds after the first
+    assert watchdog.check(now=102) == []
+    assert watchdog.check(now=103.5) == ["1"]
+
+    _kill(manager, "1")
+    # then twice as long
+    assert watchdog.check(now=106) == []
+    assert watchdog.check(now=107.5) == ["1"]
+
+
+def test_a_crash_loop_is_given_up_until_the_display_is_launched_again(wall):
+    manager, playing, respawned, watchdog = wall
+    watchdog.check(now=100)
+
+    now = 100
+    for _ in range(3):
+        _kill(manager, "1")
+        now += 61
+        assert watchdog.check(now=now) == ["1"]
+
+    _kill(manager, "1")
+    now += 61
+    assert watchdog.check(now=now) == []
+    assert watchdog.status()["1"]["state"] == "given up"
+    assert watchdog.check(now=now + 61) == []
+    assert respawned == ["1"] * 3
+
+    # a launch resets the display and it is watched again
+    watchdog.reset("1")
+    assert watchdog.check(now=now + 62) == ["1"]
+
+
+def test_a_frozen_video_is_respawned_but_a_still_image_is_not(wall):
+    manager, playing, respawned, watchdog = wall
+    playing["2"] = "b.png"
+    manager.play("2", 0, "b.png")
+    for key in playing:
+        manager.sessions[key].position = lambda: 7.0
+    watchdog.stall_timeout = 5
+
+    watchdog.check(now=100)
+    assert watchdog.check(now=104) == []
+    assert watchdog.check(now=106) == ["1"]
+    assert watchdog.status()["1"]["error"] == "frozen at 7.0"
+
+
+def test_players_stopped_on_purpose_are_not_crashes(wall):
+    manager, playing, respawned, watchdog = wall
+    watchdog.check(now=100)
+
+    with watchdog.stopping(["1"]):
+        manager.stop("1")
+        assert watchdog.check(now=101) == []
+        del playing["1"]
+
+    with watchdog.stopping():
+        manager.stop("2")
+        assert watchdog.check(now=102) == []
+
+    assert respawned == []